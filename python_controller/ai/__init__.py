@@ -1,4 +1,6 @@
 """Módulo de inteligencia artificial"""
 from .mineral_detector import MineralDetector
+from .model_bundle import ModelBundle
+from .detection_store import DetectionStore
 
-__all__ = ['MineralDetector']
\ No newline at end of file
+__all__ = ['MineralDetector', 'ModelBundle', 'DetectionStore']
\ No newline at end of file
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Compresión del modelo: poda estructurada + cuantización int8 post-entrenamiento
+
+Genera las variantes baseline, pruned, int8 y pruned_int8 a partir de un
+bundle, mide tamaño, latencia y exactitud sobre la partición de validación y
+solo exporta las variantes cuya caída de exactitud no supera --max-drop.
+
+Uso:
+    python ai/compress.py --model models/mineral_bundle \\
+        --output models/compressed --sparsity 0.5 --max-drop 0.02
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import tensorflow as tf
+from tensorflow.keras import layers, models
+
+from config.settings import Config
+from ai.distillation import evaluate_accuracy, measure_latency
+from ai.mineral_detector import MineralDetector
+from ai.model_bundle import ModelBundle, TFLiteModel
+from ai.preprocessing import FramePreprocessor, NORMALIZATION_SCALES
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _filter_norms(layer):
+    """Norma L1 de cada filtro (Conv2D) o neurona (Dense) de salida"""
+    kernel = layer.get_weights()[0]
+    return np.abs(kernel).reshape(-1, kernel.shape[-1]).sum(axis=0)
+
+
+def prune_sequential(model, sparsity):
+    """
+    Poda estructurada de filtros por magnitud L1
+
+    Elimina la fracción `sparsity` de filtros de cada Conv2D y de neuronas de
+    cada Dense oculta, reconstruyendo un modelo Sequential más pequeño (la
+    capa de salida se conserva). Solo soporta modelos Sequential como el
+    de MineralDetector.build_model.
+
+    Returns:
+        nuevo modelo Keras sin compilar
+    """
+    if not isinstance(model, models.Sequential):
+        raise ValueError("La poda estructurada solo soporta modelos Sequential")
+
+    dense_layers = [l for l in model.layers if isinstance(l, layers.Dense)]
+    output_layer = dense_layers[-1] if dense_layers else None
+
+    # Índices conservados para cada capa podable
+    keep = {}
+    for layer in model.layers:
+        if isinstance(layer, (layers.Conv2D, layers.Dense)) and layer is not output_layer:
+            norms = _filter_norms(layer)
+            n_keep = max(1, int(round(len(norms) * (1 - sparsity))))
+            keep[layer.name] = np.sort(np.argsort(norms)[::-1][:n_keep])
+
+    new_layers = []
+    for layer in model.layers:
+        config = layer.get_config()
+        if layer.name in keep:
+            key = "filters" if isinstance(layer, layers.Conv2D) else "units"
+            config[key] = len(keep[layer.name])
+        new_layers.append(layer.__class__.from_config(config))
+
+    pruned = models.Sequential(new_layers, name=f"{model.name}_pruned")
+    pruned.build(model.input_shape)
+
+    # Copiar pesos recortando canales de entrada y salida
+    prev_keep = None
+    flatten_shape = None
+    for old, new in zip(model.layers, pruned.layers):
+        weights = old.get_weights()
+
+        if isinstance(old, layers.Conv2D):
+            kernel, *bias = weights
+            if prev_keep is not None:
+                kernel = kernel[:, :, prev_keep, :]
+            out_keep = keep.get(old.name)
+            if out_keep is not None:
+                kernel = kernel[..., out_keep]
+                bias = [b[out_keep] for b in bias]
+            new.set_weights([kernel, *bias])
+            prev_keep = out_keep
+
+        elif isinstance(old, layers.Dense):
+            kernel, *bias = weights
+            if prev_keep is not None:
+                if flatten_shape is not None:
+                    h, w, c = flatten_shape
+                    kernel = kernel.reshape(h, w, c, -1)[:, :, prev_keep, :]
+                    kernel = kernel.reshape(-1, kernel.shape[-1])
+                else:
+                    kernel = kernel[prev_keep]
+            out_keep = keep.get(old.name)
+            if out_keep is not None:
+                kernel = kernel[:, out_keep]
+                bias = [b[out_keep] for b in bias]
+            new.set_weights([kernel, *bias])
+            prev_keep = out_keep
+            flatten_shape = None
+
+        elif isinstance(old, layers.BatchNormalization):
+            if prev_keep is not None:
+                weights = [w[prev_keep] for w in weights]
+            new.set_weights(weights)
+
+        elif isinstance(old, layers.Flatten):
+            flatten_shape = old.input_shape[1:]
+
+        elif weights:
+            new.set_weights(weights)
+
+    return pruned
+
+
+def representative_images(dataset_path, preprocessor, samples=100, seed=0):
+    """Generador de lotes (1, alto, ancho, 3) tomados de las carpetas de clases"""
+    paths = []
+    for root, _, files in os.walk(dataset_path):
+        paths.extend(os.path.join(root, f) for f in files
+                     if f.lower().endswith(IMAGE_EXTENSIONS))
+    random.Random(seed).shuffle(paths)
+
+    def generator():
+        for path in paths[:samples]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield [preprocessor.single(frame).copy()]
+
+    return generator
+
+
+def quantize_int8(model, representative_dataset):
+    """
+    Cuantización entera completa (pesos y activaciones int8, E/S uint8)
+
+    Returns:
+        bytes del modelo TFLite
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+
+def _bundle_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def compress(model_path, output_dir, dataset_path=None, sparsity=0.5,
+             finetune_epochs=2, max_drop=0.02, batch_size=32,
+             calibration_samples=100):
+    """
+    Generar, evaluar y exportar las variantes comprimidas
+
+    Returns:
+        informe {variante: métricas}
+    """
+    dataset_path = dataset_path or Config.DATASET_PATH
+    baseline = ModelBundle.load(model_path)
+    baseline.require_keras("La compresión")
+    scale = NORMALIZATION_SCALES[baseline.normalization]
+
+    # Validación con píxeles en [0, 255]; cada modelo aplica su escala
+    detector = MineralDetector()
+    detector.normalization = "efficientnet"
+    _, val_gen = detector.create_generators(
+        dataset_path, batch_size=batch_size, augmentation=0.0, seed=0,
+        image_size=baseline.image_size,
+    )
+
+    preprocessor = FramePreprocessor(baseline.image_size, baseline.normalization)
+    calibration = representative_images(dataset_path, preprocessor,
+                                        calibration_samples)
+
+    variants = {"baseline": baseline.model}
+
+    try:
+        pruned = prune_sequential(baseline.model, sparsity)
+        if finetune_epochs:
+            detector.normalization = baseline.normalization
+            ft_train, ft_val = detector.create_generators(
+                dataset_path, batch_size=batch_size, seed=0,
+                image_size=baseline.image_size,
+            )
+            pruned.compile(optimizer=tf.keras.optimizers.Adam(1e-4),
+                           loss='categorical_crossentropy',
+                           metrics=['accuracy'])
+            pruned.fit(ft_train, epochs=finetune_epochs,
+                       validation_data=ft_val, verbose=1)
+        variants["pruned"] = pruned
+    except ValueError as e:
+        print(f"⚠️  Poda omitida: {e}")
+
+    # Cuantización entera de cada variante Keras
+    for name, source in list(variants.items()):
+        print(f"🔢 Cuantizando {name} a int8...")
+        tflite_model = quantize_int8(source, calibration)
+        int8_name = "int8" if name == "baseline" else f"{name}_int8"
+        variants[int8_name] = (TFLiteModel(model_content=tflite_model),
+                               tflite_model)
+
+    os.makedirs(output_dir, exist_ok=True)
+    report = {"model": model_path, "max_drop": max_drop, "sparsity": sparsity,
+              "variants": {}}
+    baseline_accuracy = None
+
+    for name, variant in variants.items():
+        model, tflite_model = variant if isinstance(variant, tuple) else (variant, None)
+        accuracy = evaluate_accuracy(model, val_gen, scale, baseline.image_size)
+        if baseline_accuracy is None:
+            baseline_accuracy = accuracy
+
+        drop = baseline_accuracy - accuracy
+        entry = {
+            "accuracy": accuracy,
+            "accuracy_drop": drop,
+            **measure_latency(model, baseline.image_size, baseline.normalization),
+        }
+
+        if name == "baseline":
+            entry["status"] = "reference"
+            entry["size_bytes"] = baseline.manifest["weights"]["nbytes"]
+        elif drop > max_drop:
+            entry["status"] = "rejected"
+            entry["size_bytes"] = (len(tflite_model) if tflite_model
+                                   else sum(w.nbytes for w in model.get_weights()))
+            print(f"🚫 {name}: caída {drop:.4f} > {max_drop:.4f}, no se exporta")
+        else:
+            path = os.path.join(output_dir, name)
+            extra = {"compression": {"variant": name, "source": model_path,
+                                     "source_version": baseline.model_version,
+                                     "accuracy": accuracy, "accuracy_drop": drop}}
+            if tflite_model:
+                ModelBundle.save_tflite(path, tflite_model, baseline.class_names,
+                                        baseline.image_size,
+                                        baseline.normalization, extra=extra)
+            else:
+                ModelBundle.save(path, model, baseline.class_names,
+                                 baseline.image_size, baseline.normalization,
+                                 extra=extra)
+            entry["status"] = "exported"
+            entry["bundle"] = path
+            entry["size_bytes"] = _bundle_size(path)
+            print(f"✅ {name}: exportado en {path}")
+
+        report["variants"][name] = entry
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Podar y cuantizar el modelo")
+    parser.add_argument("--model", default=Config.MODEL_BUNDLE_PATH,
+                        help="bundle de entrada")
+    parser.add_argument("--output", default="models/compressed")
+    parser.add_argument("--dataset", default=Config.DATASET_PATH)
+    parser.add_argument("--sparsity", type=float, default=0.5,
+                        help="fracción de filtros a eliminar por capa")
+    parser.add_argument("--finetune-epochs", type=int, default=2)
+    parser.add_argument("--max-drop", type=float, default=0.02,
+                        help="caída máxima de exactitud permitida")
+    parser.add_argument("--calibration-samples", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    try:
+        report = compress(args.model, args.output, args.dataset, args.sparsity,
+                          args.finetune_epochs, args.max_drop, args.batch_size,
+                          args.calibration_samples)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 70)
+    print(f"{'Variante':<12} {'tamaño (KB)':>12} {'p50 (ms)':>10} "
+          f"{'exactitud':>10} {'caída':>8}  estado")
+    print("=" * 70)
+    for name, r in report["variants"].items():
+        print(f"{name:<12} {r['size_bytes'] / 1024:>12.1f} "
+              f"{r['latency_ms_p50']:>10.2f} {r['accuracy']:>10.4f} "
+              f"{r['accuracy_drop']:>+8.4f}  {r['status']}")
+
+    report_path = os.path.join(args.output, "compression_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nInforme guardado en: {report_path}")
+
+    if not any(r["status"] == "exported" for r in report["variants"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
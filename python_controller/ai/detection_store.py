@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+Registro de detecciones de minerales (append-only, columnar)
+
+Cada evento guarda clase, confianza, bbox (x, y, w, h), referencia de
+frame, modo del robot, ángulos de los servos, instante y ejecución. En
+disco hay un fichero binario por columna al que solo se añaden filas:
+
+    detections/
+        schema.json        columnas, clases y ejecuciones
+        timestamp.bin      float64
+        class_id.bin       int16
+        ...
+
+En memoria se mantienen las columnas como arrays NumPy más índices por
+clase y por tiempo, de modo que consultas como "cuarzo > 0.8 en la última
+ejecución" no recorren el registro completo. Las detecciones repetidas del
+mismo objeto en frames consecutivos se descartan (dedup) y
+map_entries() agrupa las que quedan en una entrada por objeto.
+
+    python ai/detection_store.py --class cuarzo --min-confidence 0.8 --run last
+    python ai/detection_store.py --map
+    python ai/detection_store.py --self-check
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+from shared_state import MODES, NUM_SERVOS
+
+SCHEMA_FILE = "schema.json"
+
+COLUMNS = {
+    "timestamp": (np.float64, ()),
+    "run": (np.int32, ()),
+    "class_id": (np.int16, ()),
+    "confidence": (np.float32, ()),
+    "bbox": (np.int32, (4,)),
+    "frame_ref": (np.int64, ()),
+    "mode": (np.int8, ()),
+    "servos": (np.float32, (NUM_SERVOS,)),
+}
+
+
+def iou(a, b):
+    """IoU entre cajas (..., 4) en formato x, y, w, h"""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    x1 = np.maximum(a[..., 0], b[..., 0])
+    y1 = np.maximum(a[..., 1], b[..., 1])
+    x2 = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2])
+    y2 = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+class _Column:
+    """Array NumPy con capacidad que se duplica al crecer"""
+
+    def __init__(self, dtype, shape, data=None):
+        self.dtype = dtype
+        self.shape = shape
+        self.size = 0 if data is None else len(data)
+        self.data = np.empty((max(1024, self.size * 2),) + shape, dtype=dtype)
+        if data is not None:
+            self.data[:self.size] = data
+
+    def append(self, value):
+        if self.size == len(self.data):
+            grown = np.empty((len(self.data) * 2,) + self.shape, dtype=self.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size] = value
+        self.size += 1
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class DetectionStore:
+    """
+    Registro de detecciones con índices por clase y tiempo
+
+    Cada instancia abierta para escritura empieza una ejecución nueva, salvo
+    que reciba la `session` de una ejecución ya registrada: así una etapa que
+    el supervisor reinicia sigue escribiendo en la misma ejecución.
+
+    Args:
+        path: directorio del registro
+        session: identificador de sesión asignado por quien lanza el proceso
+            (None = ejecución nueva)
+        dedup_window: segundos en los que una detección de la misma clase con
+            IoU >= dedup_iou se considera repetida
+        dedup_iou: solape mínimo para considerar repetida una detección
+        min_confidence: confianza mínima para registrar
+        flush_every: filas entre vaciados del buffer a disco (1 = cada fila)
+    """
+
+    def __init__(self, path=Config.DETECTIONS_PATH, session=None, dedup_window=0.5,
+                 dedup_iou=0.7, min_confidence=Config.CONFIDENCE_THRESHOLD,
+                 flush_every=32):
+        self.path = path
+        self.dedup_window = dedup_window
+        self.dedup_iou = dedup_iou
+        self.min_confidence = min_confidence
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.duplicates = 0
+        self._pending = 0
+        self._files = None
+
+        os.makedirs(path, exist_ok=True)
+        schema = self._read_schema()
+        self.class_names = schema["class_names"]
+        self._class_ids = {name: i for i, name in enumerate(self.class_names)}
+        self.runs = schema["runs"]
+
+        self.columns = {name: _Column(dtype, shape, data)
+                        for (name, (dtype, shape)), data
+                        in zip(COLUMNS.items(), self._load_columns())}
+        self._by_class = {}
+        classes = self.columns["class_id"].view()
+        for class_id in range(len(self.class_names)):
+            rows = np.flatnonzero(classes == class_id)
+            self._by_class[class_id] = _Column(np.int64, (), rows)
+        # Última fila de cada clase, para el dedup
+        self._last = {class_id: int(index.view()[-1])
+                      for class_id, index in self._by_class.items() if index.size}
+        # Índice temporal: mientras las filas lleguen en orden basta con la
+        # columna de tiempo; si no, se ordena bajo demanda
+        times = self.columns["timestamp"].view()
+        self._in_order = bool(np.all(times[1:] >= times[:-1]))
+        self._time_order = None
+
+        self.session = session
+        resumed = next((r for r in self.runs
+                        if session is not None and r.get("session") == session), None)
+        self._registered = resumed is not None
+        self.run = (resumed["id"] if resumed
+                    else max((r["id"] for r in self.runs), default=0) + 1)
+
+    # ------------------------------------------------------------ disco
+
+    def _read_schema(self):
+        schema_path = os.path.join(self.path, SCHEMA_FILE)
+        if not os.path.exists(schema_path):
+            return {"class_names": [], "runs": []}
+        with open(schema_path, "r") as f:
+            return json.load(f)
+
+    def _write_schema(self):
+        schema = {
+            "columns": {name: {"dtype": np.dtype(dtype).str, "shape": list(shape)}
+                        for name, (dtype, shape) in COLUMNS.items()},
+            "class_names": self.class_names,
+            "runs": self.runs,
+            "modes": list(MODES),
+        }
+        tmp_path = os.path.join(self.path, SCHEMA_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(schema, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, SCHEMA_FILE))
+
+    def _load_columns(self):
+        """Leer columnas; si una escritura quedó a medias se recorta al mínimo"""
+        arrays = []
+        for name, (dtype, shape) in COLUMNS.items():
+            column_path = os.path.join(self.path, f"{name}.bin")
+            if os.path.exists(column_path):
+                data = np.fromfile(column_path, dtype=dtype)
+                width = int(np.prod(shape)) if shape else 1
+                data = data[:len(data) // width * width].reshape((-1,) + shape)
+            else:
+                data = np.empty((0,) + shape, dtype=dtype)
+            arrays.append(data)
+        rows = min(len(a) for a in arrays)
+        return [a[:rows] for a in arrays]
+
+    def _open_files(self):
+        if self._files is None:
+            rows = self.columns["timestamp"].size
+            self._files = {}
+            for name, (dtype, shape) in COLUMNS.items():
+                f = open(os.path.join(self.path, f"{name}.bin"), "ab")
+                # Descartar filas incompletas de un cierre brusco
+                f.truncate(rows * np.dtype(dtype).itemsize * int(np.prod(shape)))
+                self._files[name] = f
+            if not self._registered:
+                entry = {"id": self.run, "started": time.time()}
+                if self.session is not None:
+                    entry["session"] = self.session
+                self.runs.append(entry)
+                self._registered = True
+            self._write_schema()
+        return self._files
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self._files:
+            for f in self._files.values():
+                f.flush()
+        self._pending = 0
+
+    def close(self):
+        with self.lock:
+            if self._files:
+                self._flush()
+                for f in self._files.values():
+                    f.close()
+                self._files = None
+
+    # ------------------------------------------------------------ escritura
+
+    def _class_id(self, name):
+        class_id = self._class_ids.get(name)
+        if class_id is None:
+            class_id = len(self.class_names)
+            self.class_names.append(name)
+            self._class_ids[name] = class_id
+            self._by_class[class_id] = _Column(np.int64, ())
+            if self._files is not None:
+                self._write_schema()
+        return class_id
+
+    def record(self, detection, frame_ref=-1, mode="idle", servos=None,
+               timestamp=None, bbox_format="xywh"):
+        """
+        Registrar el resultado de MineralDetector.predict() o
+        MineralLocalizer.predict_single() (bbox_format="xyxy")
+
+        Returns:
+            índice de la fila, o None si se descartó (sin detección,
+            confianza baja o duplicada)
+        """
+        if not detection.get("detected", True) or detection.get("class") is None:
+            return None
+        confidence = float(detection["confidence"])
+        if confidence < self.min_confidence:
+            return None
+
+        bbox = detection.get("bbox")
+        if bbox is None:
+            bbox = (0, 0, 0, 0)
+        elif bbox_format == "xyxy":
+            x1, y1, x2, y2 = bbox
+            bbox = (x1, y1, x2 - x1, y2 - y1)
+        timestamp = time.time() if timestamp is None else timestamp
+        row = {
+            "timestamp": timestamp,
+            "run": self.run,
+            "confidence": confidence,
+            "bbox": bbox,
+            "frame_ref": frame_ref,
+            "mode": MODES.index(mode) if mode in MODES else -1,
+            "servos": servos if servos is not None else [np.nan] * NUM_SERVOS,
+        }
+
+        with self.lock:
+            class_id = self._class_id(detection["class"])
+            row["class_id"] = class_id
+            if self._is_duplicate(class_id, timestamp, bbox):
+                self.duplicates += 1
+                return None
+
+            files = self._open_files()
+            size = self.columns["timestamp"].size
+            if size and timestamp < self.columns["timestamp"].data[size - 1]:
+                self._in_order = False
+            self._time_order = None
+            for name, column in self.columns.items():
+                column.append(row[name])
+                files[name].write(column.view()[-1].tobytes())
+            index = self.columns["timestamp"].size - 1
+            self._by_class[class_id].append(index)
+            self._last[class_id] = index
+
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush()
+            return index
+
+    def _is_duplicate(self, class_id, timestamp, bbox):
+        last = self._last.get(class_id)
+        if last is None or self.columns["run"].data[last] != self.run:
+            return False
+        if abs(timestamp - self.columns["timestamp"].data[last]) > self.dedup_window:
+            return False
+        return iou(self.columns["bbox"].data[last], bbox) >= self.dedup_iou
+
+    # ------------------------------------------------------------ consultas
+
+    def __len__(self):
+        return self.columns["timestamp"].size
+
+    def _resolve_run(self, run):
+        if run == "last":
+            if self._files is not None:
+                return self.run
+            return self.runs[-1]["id"] if self.runs else None
+        return run
+
+    def _sorted_times(self):
+        """(orden, tiempos ordenados) para registros con filas fuera de orden"""
+        if self._time_order is None:
+            times = self.columns["timestamp"].view()
+            order = np.argsort(times, kind="stable")
+            self._time_order = (order, times[order])
+        return self._time_order
+
+    def select(self, class_name=None, min_confidence=None, start=None, end=None,
+               run=None):
+        """
+        Índices de filas que cumplen los filtros, en orden temporal
+
+        Args:
+            class_name: clase o None para todas
+            min_confidence: confianza mínima
+            start, end: rango de tiempo (segundos epoch)
+            run: id de ejecución, "last" o None para todas
+        """
+        with self.lock:
+            if class_name is not None:
+                class_id = self._class_ids.get(class_name)
+                if class_id is None:
+                    return np.empty(0, dtype=np.int64)
+                rows = self._by_class[class_id].view().copy()
+            else:
+                rows = np.arange(len(self))
+
+            # El rango es una búsqueda binaria sobre los tiempos ordenados:
+            # la propia columna si las filas llegaron en orden, o el índice
+            # ordenado si alguna llegó con un instante anterior
+            times = self.columns["timestamp"].view()
+            if self._in_order:
+                order, sorted_times = None, times
+            else:
+                order, sorted_times = self._sorted_times()
+            if start is not None or end is not None:
+                lo = (np.searchsorted(sorted_times, start, "left")
+                      if start is not None else 0)
+                hi = (np.searchsorted(sorted_times, end, "right")
+                      if end is not None else len(times))
+                if order is None:
+                    rows = rows[(rows >= lo) & (rows < hi)]
+                else:
+                    in_range = np.zeros(len(times), dtype=bool)
+                    in_range[order[lo:hi]] = True
+                    rows = rows[in_range[rows]]
+            if order is not None:
+                rows = rows[np.argsort(times[rows], kind="stable")]
+
+            run = self._resolve_run(run)
+            if run is not None:
+                rows = rows[self.columns["run"].view()[rows] == run]
+            if min_confidence is not None:
+                rows = rows[self.columns["confidence"].view()[rows] >= min_confidence]
+            return rows
+
+    def rows(self, indices):
+        """Filas como lista de dicts"""
+        with self.lock:
+            cols = {name: column.view()[indices] for name, column in self.columns.items()}
+        return [{
+            "timestamp": float(cols["timestamp"][i]),
+            "run": int(cols["run"][i]),
+            "class": self.class_names[cols["class_id"][i]],
+            "confidence": float(cols["confidence"][i]),
+            "bbox": tuple(int(v) for v in cols["bbox"][i]),
+            "frame_ref": int(cols["frame_ref"][i]),
+            "mode": MODES[cols["mode"][i]] if 0 <= cols["mode"][i] < len(MODES) else None,
+            "servos": [float(v) for v in cols["servos"][i]],
+        } for i in range(len(indices))]
+
+    def query(self, **filters):
+        """select() + rows(): query(class_name="cuarzo", min_confidence=0.8, run="last")"""
+        return self.rows(self.select(**filters))
+
+    def map_entries(self, gap=2.0, min_iou=0.1, **filters):
+        """
+        Agrupar detecciones consecutivas del mismo objeto
+
+        Dos detecciones seguidas de la misma clase y ejecución pertenecen al
+        mismo objeto si las separa menos de `gap` segundos y sus cajas se
+        solapan al menos `min_iou` (las cajas vacías solo usan el tiempo).
+
+        Returns:
+            lista de entradas con clase, primer/último instante, número de
+            detecciones, confianza máxima/media, caja media y el frame, modo
+            y servos de la detección más confiable
+        """
+        indices = self.select(**filters)
+        with self.lock:
+            cols = {name: column.view()[indices] for name, column in self.columns.items()}
+        if not len(indices):
+            return []
+
+        # Orden por (ejecución, clase, tiempo) para que los grupos sean contiguos
+        order = np.lexsort((cols["timestamp"], cols["class_id"], cols["run"]))
+        cols = {name: values[order] for name, values in cols.items()}
+
+        boxes = cols["bbox"].astype(np.float64)
+        same = ((cols["run"][1:] == cols["run"][:-1])
+                & (cols["class_id"][1:] == cols["class_id"][:-1])
+                & (np.diff(cols["timestamp"]) <= gap))
+        empty = (boxes[1:, 2] * boxes[1:, 3] == 0) | (boxes[:-1, 2] * boxes[:-1, 3] == 0)
+        same &= empty | (iou(boxes[1:], boxes[:-1]) >= min_iou)
+
+        starts = np.flatnonzero(np.r_[True, ~same])
+        counts = np.diff(np.r_[starts, len(order)])
+        group = np.repeat(np.arange(len(starts)), counts)
+        # Mejor detección de cada grupo: máxima confianza
+        best = np.lexsort((-cols["confidence"], group))[np.r_[0, np.cumsum(counts)[:-1]]]
+
+        conf_sum = np.add.reduceat(cols["confidence"].astype(np.float64), starts)
+        box_sum = np.add.reduceat(boxes, starts, axis=0)
+        ends = starts + counts - 1
+
+        return [{
+            "class": self.class_names[cols["class_id"][s]],
+            "run": int(cols["run"][s]),
+            "first_seen": float(cols["timestamp"][s]),
+            "last_seen": float(cols["timestamp"][e]),
+            "detections": int(n),
+            "max_confidence": float(cols["confidence"][b]),
+            "mean_confidence": float(c / n),
+            "bbox": tuple(int(round(v)) for v in box / n),
+            "frame_ref": int(cols["frame_ref"][b]),
+            "mode": MODES[cols["mode"][b]] if 0 <= cols["mode"][b] < len(MODES) else None,
+            "servos": [float(v) for v in cols["servos"][b]],
+        } for s, e, n, b, c, box in zip(starts, ends, counts, best, conf_sum, box_sum)]
+
+
+def self_check():
+    """
+    Comprobar el registro sobre un directorio temporal
+
+    Returns:
+        lista de (comprobación, correcto)
+    """
+    import tempfile
+
+    checks = []
+    box = {"class": "cuarzo", "confidence": 0.9, "bbox": (10, 10, 50, 50)}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Instantes fuera de orden
+        path = os.path.join(tmp, "order")
+        store = DetectionStore(path, min_confidence=0)
+        for t in (1000.0, 1001.0, 1002.0, 900.0):
+            store.record(dict(box, bbox=(int(t), 0, 10, 10)), timestamp=t)
+        checks.append(("rango con fila tardía",
+                       store.select(start=950).tolist() == [0, 1, 2]
+                       and store.select(end=950).tolist() == [3]))
+        checks.append(("orden temporal", store.select().tolist() == [3, 0, 1, 2]))
+        store.close()
+        reopened = DetectionStore(path, min_confidence=0)
+        checks.append(("rango tras reabrir",
+                       reopened.select(start=950, end=1001).tolist() == [0, 1]))
+
+        # Dedup por ventana de tiempo e IoU
+        store = DetectionStore(os.path.join(tmp, "dedup"), dedup_window=0.5,
+                               dedup_iou=0.7, min_confidence=0)
+        kept = [store.record(box, timestamp=0.0),
+                store.record(dict(box, bbox=(12, 10, 50, 50)), timestamp=0.2),
+                store.record(dict(box, bbox=(200, 200, 50, 50)), timestamp=0.3),
+                store.record(box, timestamp=1.0)]
+        checks.append(("dedup ventana/IoU",
+                       [k is not None for k in kept] == [True, False, True, True]
+                       and store.duplicates == 1))
+        store.close()
+
+        # Escritura a medias: una columna con una fila completa de más y
+        # otra con bytes sueltos
+        path = os.path.join(tmp, "torn")
+        store = DetectionStore(path, min_confidence=0)
+        store.record(box, timestamp=10.0)
+        store.record(box, timestamp=20.0)
+        store.close()
+        with open(os.path.join(path, "class_id.bin"), "ab") as f:
+            f.write(np.int16(0).tobytes())
+        with open(os.path.join(path, "timestamp.bin"), "ab") as f:
+            f.write(b"\x00\x01\x02")
+        store = DetectionStore(path, min_confidence=0)
+        intact = len(store) == 2
+        store.record(box, timestamp=30.0)
+        store.close()
+        store = DetectionStore(path, min_confidence=0)
+        checks.append(("reabrir tras escritura a medias",
+                       intact and len(store) == 3
+                       and [r["timestamp"] for r in store.query()] == [10.0, 20.0, 30.0]))
+
+        # run="last" y sesión del supervisor
+        path = os.path.join(tmp, "runs")
+        first = DetectionStore(path, min_confidence=0)
+        first.record(box, timestamp=1.0)
+        first.close()
+        second = DetectionStore(path, session="s", min_confidence=0)
+        second.record(box, timestamp=2.0)
+        last_open = second.select(run="last").tolist() == [1]
+        second.close()
+        resumed = DetectionStore(path, session="s", min_confidence=0)
+        resumed.record(box, timestamp=5.0)
+        resumed.close()
+        reader = DetectionStore(path)
+        checks.append(('run="last"',
+                       last_open and reader.select(run="last").tolist() == [1, 2]))
+        checks.append(("sesión reanudada", resumed.run == second.run
+                       and [r["id"] for r in reader.runs] == [1, 2]))
+
+        # Agrupación en entradas de mapa
+        entries = reader.map_entries(gap=2.0)
+        checks.append(("map_entries", [e["detections"] for e in entries] == [1, 1, 1]
+                       and reader.map_entries(gap=5.0, run=2)[0]["detections"] == 2))
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultar el registro de detecciones")
+    parser.add_argument("--path", default=Config.DETECTIONS_PATH)
+    parser.add_argument("--class", dest="class_name", default=None)
+    parser.add_argument("--min-confidence", type=float, default=None)
+    parser.add_argument("--run", default=None,
+                        help='id de ejecución o "last"')
+    parser.add_argument("--since", type=float, default=None,
+                        help="solo los últimos N segundos")
+    parser.add_argument("--map", action="store_true",
+                        help="agrupar en entradas de mapa por objeto")
+    parser.add_argument("--self-check", action="store_true",
+                        help="comprobar el registro en un directorio temporal")
+    args = parser.parse_args()
+
+    if args.self_check:
+        checks = self_check()
+        for name, ok in checks:
+            print(f"{'✅' if ok else '❌'} {name}")
+        if not all(ok for _, ok in checks):
+            sys.exit(1)
+        return
+
+    store = DetectionStore(args.path)
+    run = args.run if args.run in (None, "last") else int(args.run)
+    filters = {
+        "class_name": args.class_name,
+        "min_confidence": args.min_confidence,
+        "start": time.time() - args.since if args.since else None,
+        "run": run,
+    }
+
+    results = store.map_entries(**filters) if args.map else store.query(**filters)
+    print(f"📍 {len(results)} {'objetos' if args.map else 'detecciones'} "
+          f"de {len(store)} registradas")
+    for item in results:
+        print(json.dumps(item, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Destilación de conocimiento a un detector ligero
+
+Entrena un estudiante tipo MobileNet (convoluciones separables en
+profundidad + GlobalAveragePooling2D) a partir de las probabilidades del
+modelo actual (CNN de MineralDetector o EfficientNet de Train.ipynb) y lo
+exporta como ModelBundle.
+
+Uso:
+    python ai/distillation.py --teacher models/mineral_bundle \\
+        --output models/mineral_student --epochs 20 --image-size 128 128
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tensorflow as tf
+from tensorflow.keras import layers, models
+
+from config.settings import Config
+from ai.mineral_detector import MineralDetector
+from ai.model_bundle import ModelBundle
+from ai.preprocessing import FramePreprocessor, NORMALIZATION_SCALES
+
+
+def _separable_block(x, filters, stride, name):
+    """Bloque MobileNet: depthwise 3x3 + pointwise 1x1, con BN y ReLU6"""
+    x = layers.DepthwiseConv2D(3, strides=stride, padding="same",
+                               use_bias=False, name=f"{name}_dw")(x)
+    x = layers.BatchNormalization(name=f"{name}_dw_bn")(x)
+    x = layers.ReLU(6.0, name=f"{name}_dw_relu")(x)
+    x = layers.Conv2D(filters, 1, use_bias=False, name=f"{name}_pw")(x)
+    x = layers.BatchNormalization(name=f"{name}_pw_bn")(x)
+    return layers.ReLU(6.0, name=f"{name}_pw_relu")(x)
+
+
+def build_student(num_classes, image_size=(128, 128), width=1.0, dropout=0.2):
+    """
+    Construir estudiante ligero que devuelve logits
+
+    Args:
+        num_classes: número de clases
+        image_size: (alto, ancho) de entrada
+        width: multiplicador de canales (alpha de MobileNet)
+        dropout: dropout antes de la capa de salida
+    """
+    def channels(n):
+        return max(8, int(n * width))
+
+    inputs = layers.Input(shape=(*image_size, 3))
+    x = layers.Conv2D(channels(16), 3, strides=2, padding="same",
+                      use_bias=False, name="stem")(inputs)
+    x = layers.BatchNormalization(name="stem_bn")(x)
+    x = layers.ReLU(6.0, name="stem_relu")(x)
+
+    for i, (filters, stride) in enumerate([(32, 1), (64, 2), (64, 1),
+                                           (128, 2), (128, 1), (256, 2)]):
+        x = _separable_block(x, channels(filters), stride, f"block{i + 1}")
+
+    x = layers.GlobalAveragePooling2D(name="gap")(x)
+    x = layers.Dropout(dropout, name="dropout")(x)
+    logits = layers.Dense(num_classes, name="logits")(x)
+    return models.Model(inputs, logits, name="mineral_student")
+
+
+def export_model(student):
+    """Estudiante con softmax, con la misma salida que el resto de modelos"""
+    probs = layers.Softmax(name="predictions", dtype="float32")(student.output)
+    return models.Model(student.input, probs, name=student.name)
+
+
+class Distiller(models.Model):
+    """
+    Modelo de entrenamiento profesor -> estudiante
+
+    Recibe lotes RGB en [0, 255] al tamaño del profesor y aplica a cada
+    modelo su propia normalización y tamaño de entrada.
+    """
+
+    def __init__(self, student, teacher, teacher_scale, student_scale):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher_scale = teacher_scale
+        self.student_scale = student_scale
+        self.student_size = tuple(student.input_shape[1:3])
+
+    def compile(self, optimizer, alpha=0.1, temperature=4.0):
+        """
+        Args:
+            alpha: peso de la pérdida con etiquetas reales
+            temperature: temperatura para suavizar las probabilidades
+        """
+        super().compile(optimizer=optimizer)
+        self.alpha = alpha
+        self.temperature = temperature
+        self.loss_tracker = tf.keras.metrics.Mean(name="loss")
+        self.accuracy = tf.keras.metrics.CategoricalAccuracy(name="accuracy")
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.accuracy]
+
+    def _student_input(self, x):
+        if tuple(x.shape[1:3]) != self.student_size:
+            x = tf.image.resize(x, self.student_size)
+        return x * self.student_scale
+
+    def train_step(self, data):
+        x, y = data
+        teacher_probs = self.teacher(x * self.teacher_scale, training=False)
+        # Las salidas del profesor son probabilidades: log -> logits
+        soft_targets = tf.nn.softmax(
+            tf.math.log(tf.cast(teacher_probs, tf.float32) + 1e-8)
+            / self.temperature
+        )
+
+        with tf.GradientTape() as tape:
+            logits = self.student(self._student_input(x), training=True)
+            hard_loss = tf.keras.losses.categorical_crossentropy(
+                y, logits, from_logits=True)
+            soft_loss = tf.keras.losses.kl_divergence(
+                soft_targets, tf.nn.softmax(logits / self.temperature)
+            ) * self.temperature ** 2
+            loss = tf.reduce_mean(self.alpha * hard_loss
+                                  + (1 - self.alpha) * soft_loss)
+
+        grads = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(
+            zip(grads, self.student.trainable_variables))
+
+        self.loss_tracker.update_state(loss)
+        self.accuracy.update_state(y, tf.nn.softmax(logits))
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        x, y = data
+        logits = self.student(self._student_input(x), training=False)
+        loss = tf.keras.losses.categorical_crossentropy(y, logits,
+                                                        from_logits=True)
+        self.loss_tracker.update_state(tf.reduce_mean(loss))
+        self.accuracy.update_state(y, tf.nn.softmax(logits))
+        return {m.name: m.result() for m in self.metrics}
+
+
+def measure_latency(model, image_size, normalization, runs=50, warmup=5):
+    """
+    Latencia por frame de cámara (preprocesamiento + inferencia)
+
+    Returns:
+        dict con p50/p95 en ms y frames por segundo
+    """
+    frame = np.random.default_rng(0).integers(0, 256, size=(480, 640, 3),
+                                               dtype=np.uint8)
+    preprocessor = FramePreprocessor(image_size, normalization)
+
+    for _ in range(warmup):
+        model(preprocessor.single(frame), training=False)
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        np.asarray(model(preprocessor.single(frame), training=False))
+        times.append(time.perf_counter() - start)
+
+    times = np.array(times) * 1000
+    return {
+        "latency_ms_p50": float(np.percentile(times, 50)),
+        "latency_ms_p95": float(np.percentile(times, 95)),
+        "fps": float(1000 / times.mean()),
+    }
+
+
+def evaluate_accuracy(model, generator, scale, image_size):
+    """Exactitud top-1 sobre un generador con lotes RGB en [0, 255]"""
+    correct = total = 0
+    generator.reset()
+    for _ in range(len(generator)):
+        x, y = next(generator)
+        if tuple(x.shape[1:3]) != tuple(image_size):
+            x = tf.image.resize(x, image_size)
+        probs = np.asarray(model(x * scale, training=False))
+        correct += int((probs.argmax(axis=1) == y.argmax(axis=1)).sum())
+        total += len(y)
+    return correct / total if total else 0.0
+
+
+def distill(teacher_path, output_path, dataset_path=None, image_size=(128, 128),
+            width=1.0, epochs=20, batch_size=32, alpha=0.1, temperature=4.0,
+            learning_rate=0.001):
+    """
+    Destilar el modelo del bundle teacher_path y exportar el estudiante
+
+    Returns:
+        dict con el informe de latencia y exactitud de profesor y estudiante
+    """
+    teacher = ModelBundle.load(teacher_path)
+    teacher.require_keras("La destilación (profesor)")
+    teacher.model.trainable = False
+    print(f"👨‍🏫 Profesor: {teacher_path} ({teacher.model.count_params():,} parámetros)")
+
+    # Datos crudos [0, 255] al tamaño del profesor
+    detector = MineralDetector()
+    detector.normalization = "efficientnet"
+    train_gen, val_gen = detector.create_generators(
+        dataset_path or Config.DATASET_PATH,
+        batch_size=batch_size,
+        image_size=teacher.image_size,
+    )
+    class_names = ModelBundle.class_names_from_indices(train_gen.class_indices)
+    if class_names != teacher.class_names:
+        raise ValueError("Las clases del dataset no coinciden con las del profesor")
+
+    student = build_student(len(class_names), image_size, width)
+    print(f"🎓 Estudiante: {student.count_params():,} parámetros")
+
+    distiller = Distiller(student, teacher.model,
+                          NORMALIZATION_SCALES[teacher.normalization],
+                          NORMALIZATION_SCALES["rescale"])
+    distiller.compile(tf.keras.optimizers.Adam(learning_rate),
+                      alpha=alpha, temperature=temperature)
+    history = distiller.fit(
+        train_gen,
+        epochs=epochs,
+        validation_data=val_gen,
+        callbacks=[tf.keras.callbacks.EarlyStopping(
+            monitor="val_accuracy", mode="max", patience=5,
+            restore_best_weights=True)],
+        verbose=1,
+    )
+
+    exported = export_model(student)
+    report = {
+        "teacher": {
+            "bundle": teacher_path,
+            "model_version": teacher.model_version,
+            "params": int(teacher.model.count_params()),
+            "accuracy": evaluate_accuracy(teacher.model, val_gen,
+                                          NORMALIZATION_SCALES[teacher.normalization],
+                                          teacher.image_size),
+            **measure_latency(teacher.model, teacher.image_size,
+                              teacher.normalization),
+        },
+        "student": {
+            "bundle": output_path,
+            "params": int(exported.count_params()),
+            "image_size": list(image_size),
+            "width": width,
+            "accuracy": evaluate_accuracy(exported, val_gen,
+                                          NORMALIZATION_SCALES["rescale"], image_size),
+            **measure_latency(exported, image_size, "rescale"),
+        },
+        "distillation": {
+            "alpha": alpha,
+            "temperature": temperature,
+            "epochs_run": len(history.history.get("loss", [])),
+        },
+    }
+    report["speedup"] = (report["teacher"]["latency_ms_p50"]
+                         / report["student"]["latency_ms_p50"])
+    report["accuracy_drop"] = (report["teacher"]["accuracy"]
+                               - report["student"]["accuracy"])
+
+    bundle = ModelBundle.save(output_path, exported, class_names, image_size,
+                              "rescale", extra={"distillation": report})
+    report["student"]["model_version"] = bundle.model_version
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Destilar detector ligero")
+    parser.add_argument("--teacher", default=Config.MODEL_BUNDLE_PATH)
+    parser.add_argument("--output", default="models/mineral_student")
+    parser.add_argument("--dataset", default=Config.DATASET_PATH)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[128, 128],
+                        metavar=("ALTO", "ANCHO"))
+    parser.add_argument("--width", type=float, default=1.0)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    try:
+        report = distill(args.teacher, args.output, args.dataset,
+                         tuple(args.image_size), args.width, args.epochs,
+                         args.batch_size, args.alpha, args.temperature,
+                         args.learning_rate)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print("RESULTADO DE LA DESTILACIÓN")
+    print("=" * 60)
+    for role in ("teacher", "student"):
+        r = report[role]
+        print(f"  {role:<8} params={r['params']:>10,}  acc={r['accuracy']:.4f}  "
+              f"p50={r['latency_ms_p50']:.1f}ms  {r['fps']:.1f} fps")
+    print(f"  Aceleración: x{report['speedup']:.2f}  "
+          f"Caída de exactitud: {report['accuracy_drop']:+.4f}")
+
+    report_path = os.path.join(args.output, "distillation_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📦 Estudiante exportado en: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
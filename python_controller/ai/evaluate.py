@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Evaluación de un bundle sobre un conjunto reservado (held-out)
+
+Recorre el directorio (una subcarpeta por clase) en lotes, calcula matriz
+de confusión, precisión/recall por clase y calibración (ECE), y mide
+imágenes/seg y latencias p50/p95/p99 para varios tamaños de lote.
+
+Uso:
+    python ai/evaluate.py --model models/mineral_bundle --data datasets_test/ \\
+        --output results/eval.json --compare results/eval_prev.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from config.settings import Config
+from ai.model_bundle import ModelBundle
+from ai.preprocessing import FramePreprocessor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_samples(data_path, class_names):
+    """
+    Listar (ruta, índice de clase) del directorio held-out
+
+    Las carpetas que no corresponden a una clase del modelo se ignoran.
+    """
+    index = {name: i for i, name in enumerate(class_names)}
+    samples = []
+    for folder in sorted(os.listdir(data_path)):
+        folder_path = os.path.join(data_path, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        if folder not in index:
+            print(f"⚠️  Carpeta sin clase en el modelo: {folder}")
+            continue
+        for root, _, files in os.walk(folder_path):
+            samples.extend((os.path.join(root, f), index[folder])
+                           for f in sorted(files)
+                           if f.lower().endswith(IMAGE_EXTENSIONS))
+    return samples
+
+
+def iter_batches(samples, batch_size):
+    """Leer imágenes en lotes de frames BGR sin cargar todo el conjunto"""
+    for start in range(0, len(samples), batch_size):
+        frames, labels = [], []
+        for path, label in samples[start:start + batch_size]:
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"⚠️  No se pudo leer: {path}")
+                continue
+            frames.append(frame)
+            labels.append(label)
+        if frames:
+            yield frames, np.array(labels)
+
+
+def predict_dataset(model, preprocessor, samples, batch_size=32):
+    """
+    Inferencia en lotes sobre todo el conjunto
+
+    Returns:
+        (probabilidades (N, C), etiquetas (N,))
+    """
+    all_probs, all_labels = [], []
+    for frames, labels in iter_batches(samples, batch_size):
+        batch = preprocessor(frames)
+        all_probs.append(np.asarray(model(batch, training=False), dtype=np.float32))
+        all_labels.append(labels)
+
+    if not all_probs:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=int)
+    return np.concatenate(all_probs), np.concatenate(all_labels)
+
+
+def confusion_matrix(labels, predictions, num_classes):
+    """Matriz (real, predicha) con conteos"""
+    matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(matrix, (labels, predictions), 1)
+    return matrix
+
+
+def per_class_metrics(matrix, class_names):
+    """Precisión, recall, F1 y soporte por clase"""
+    true_positives = np.diag(matrix).astype(np.float64)
+    predicted = matrix.sum(axis=0)
+    actual = matrix.sum(axis=1)
+
+    precision = np.divide(true_positives, predicted,
+                          out=np.zeros_like(true_positives), where=predicted > 0)
+    recall = np.divide(true_positives, actual,
+                       out=np.zeros_like(true_positives), where=actual > 0)
+    denominator = precision + recall
+    f1 = np.divide(2 * precision * recall, denominator,
+                   out=np.zeros_like(true_positives), where=denominator > 0)
+
+    return {
+        name: {
+            "precision": float(precision[i]),
+            "recall": float(recall[i]),
+            "f1": float(f1[i]),
+            "support": int(actual[i]),
+        }
+        for i, name in enumerate(class_names)
+    }
+
+
+def calibration(probs, labels, bins=15):
+    """
+    Calibración de la confianza top-1
+
+    Returns:
+        dict con ECE, MCE, Brier y la curva de fiabilidad por intervalo
+    """
+    confidences = probs.max(axis=1)
+    correct = (probs.argmax(axis=1) == labels).astype(np.float64)
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    bin_ids = np.clip(np.digitize(confidences, edges[1:-1]), 0, bins - 1)
+
+    counts = np.bincount(bin_ids, minlength=bins)
+    conf_sum = np.bincount(bin_ids, weights=confidences, minlength=bins)
+    acc_sum = np.bincount(bin_ids, weights=correct, minlength=bins)
+    nonempty = counts > 0
+    mean_conf = np.divide(conf_sum, counts, out=np.zeros(bins), where=nonempty)
+    mean_acc = np.divide(acc_sum, counts, out=np.zeros(bins), where=nonempty)
+    gaps = np.abs(mean_acc - mean_conf)
+
+    one_hot = np.eye(probs.shape[1])[labels]
+    return {
+        "ece": float((counts * gaps).sum() / max(1, counts.sum())),
+        "mce": float(gaps[nonempty].max()) if nonempty.any() else 0.0,
+        "brier": float(((probs - one_hot) ** 2).sum(axis=1).mean()),
+        "bins": [
+            {"lower": float(edges[i]), "upper": float(edges[i + 1]),
+             "count": int(counts[i]), "confidence": float(mean_conf[i]),
+             "accuracy": float(mean_acc[i])}
+            for i in range(bins)
+        ],
+    }
+
+
+def benchmark_throughput(model, preprocessor, frames, batch_sizes=(1, 8, 32),
+                         iterations=30, warmup=3):
+    """
+    Medir preprocesamiento + inferencia para varios tamaños de lote
+
+    Returns:
+        {batch_size: {images_per_sec, latency_ms_p50/p95/p99}}
+    """
+    if not frames:
+        raise ValueError("No hay frames para medir el throughput")
+    results = {}
+    for batch_size in batch_sizes:
+        batch_frames = [frames[i % len(frames)] for i in range(batch_size)]
+
+        for _ in range(warmup):
+            model(preprocessor(batch_frames), training=False)
+
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            np.asarray(model(preprocessor(batch_frames), training=False))
+            times.append(time.perf_counter() - start)
+
+        times = np.array(times)
+        results[str(batch_size)] = {
+            "images_per_sec": float(batch_size / times.mean()),
+            "latency_ms_p50": float(np.percentile(times, 50) * 1000),
+            "latency_ms_p95": float(np.percentile(times, 95) * 1000),
+            "latency_ms_p99": float(np.percentile(times, 99) * 1000),
+        }
+    return results
+
+
+def evaluate(model_path, data_path, batch_sizes=(1, 8, 32), iterations=30):
+    """
+    Evaluar exactitud y velocidad de un bundle
+
+    Returns:
+        dict serializable a JSON con todas las métricas
+    """
+    if not os.path.isdir(data_path):
+        raise ValueError(f"No existe el directorio de evaluación: {data_path}")
+    bundle = ModelBundle.load(model_path)
+    preprocessor = FramePreprocessor.from_bundle(bundle, max_batch=max(batch_sizes))
+    samples = list_samples(data_path, bundle.class_names)
+    if not samples:
+        raise ValueError(f"No hay imágenes de clases conocidas en {data_path}")
+
+    print(f"🧪 Evaluando {len(samples)} imágenes con {model_path}")
+    start = time.perf_counter()
+    probs, labels = predict_dataset(bundle.model, preprocessor, samples,
+                                    max(batch_sizes))
+    elapsed = time.perf_counter() - start
+    if not len(labels):
+        raise ValueError(f"Ninguna imagen de {data_path} se pudo leer")
+
+    predictions = probs.argmax(axis=1)
+    matrix = confusion_matrix(labels, predictions, len(bundle.class_names))
+
+    # Primeras imágenes legibles (las ilegibles se saltan)
+    bench_frames = []
+    for frames, _ in iter_batches(samples, max(batch_sizes)):
+        bench_frames.extend(frames)
+        if len(bench_frames) >= max(batch_sizes):
+            break
+
+    return {
+        "model": model_path,
+        "model_version": bundle.model_version,
+        "data": data_path,
+        "timestamp": time.time(),
+        "num_samples": int(len(labels)),
+        "class_names": bundle.class_names,
+        "accuracy": float((predictions == labels).mean()),
+        "confusion_matrix": matrix.tolist(),
+        "per_class": per_class_metrics(matrix, bundle.class_names),
+        "calibration": calibration(probs, labels),
+        "stream_images_per_sec": float(len(labels) / elapsed),
+        "throughput": benchmark_throughput(bundle.model, preprocessor,
+                                           bench_frames, batch_sizes,
+                                           iterations),
+    }
+
+
+def compare(current, previous, accuracy_tolerance=0.01, speed_tolerance=0.10):
+    """
+    Comparar dos resultados de evaluate()
+
+    Returns:
+        lista de regresiones (textos); vacía si no hay
+    """
+    regressions = []
+    drop = previous["accuracy"] - current["accuracy"]
+    if drop > accuracy_tolerance:
+        regressions.append(f"exactitud {previous['accuracy']:.4f} -> "
+                           f"{current['accuracy']:.4f}")
+
+    for batch_size, prev in previous.get("throughput", {}).items():
+        curr = current["throughput"].get(batch_size)
+        if curr is None:
+            continue
+        if curr["images_per_sec"] < prev["images_per_sec"] * (1 - speed_tolerance):
+            regressions.append(
+                f"batch {batch_size}: {prev['images_per_sec']:.1f} -> "
+                f"{curr['images_per_sec']:.1f} img/s")
+        if curr["latency_ms_p95"] > prev["latency_ms_p95"] * (1 + speed_tolerance):
+            regressions.append(
+                f"batch {batch_size}: p95 {prev['latency_ms_p95']:.2f} -> "
+                f"{curr['latency_ms_p95']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluar modelo de minerales")
+    parser.add_argument("--model", default=Config.MODEL_BUNDLE_PATH)
+    parser.add_argument("--data", required=True,
+                        help="directorio held-out con una carpeta por clase")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--output", default="results/evaluation.json")
+    parser.add_argument("--compare", default=None,
+                        help="JSON de una evaluación anterior")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.01)
+    parser.add_argument("--speed-tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    try:
+        results = evaluate(args.model, args.data, tuple(args.batch_sizes),
+                           args.iterations)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print("=" * 60)
+    print(f"Exactitud: {results['accuracy']:.4f}  "
+          f"ECE: {results['calibration']['ece']:.4f}  "
+          f"({results['num_samples']} imágenes)")
+    print("=" * 60)
+    for name, m in results["per_class"].items():
+        print(f"  {name:<20} P={m['precision']:.3f} R={m['recall']:.3f} "
+              f"F1={m['f1']:.3f} n={m['support']}")
+    print()
+    for batch_size, m in results["throughput"].items():
+        print(f"  batch {batch_size:>3}: {m['images_per_sec']:>8.1f} img/s  "
+              f"p50={m['latency_ms_p50']:.2f} p95={m['latency_ms_p95']:.2f} "
+              f"p99={m['latency_ms_p99']:.2f} ms")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en: {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            previous = json.load(f)
+        regressions = compare(results, previous, args.accuracy_tolerance,
+                              args.speed_tolerance)
+        if regressions:
+            print("\n❌ REGRESIONES:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto a", args.compare)
+
+
+if __name__ == "__main__":
+    main()
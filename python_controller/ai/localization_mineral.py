@@ -9,26 +9,39 @@ from tensorflow.keras import layers, models, callbacks
 import cv2
 import json
 
+from ai.model_bundle import ModelBundle
+from ai.preprocessing import FramePreprocessor
+
 class MineralLocalizer:
   """
   Clase para detectar y localizar minerales en imágenes.
   Uso posterior al entrenamiento.
   """
   
-  def __init__(self, model_path, classes_path, img_size=(224, 224)):
+  def __init__(self, model_path, classes_path=None, img_size=(224, 224)):
       """
       Inicializa el localizador
       
       Args:
-          model_path: Ruta al modelo .h5
-          classes_path: Ruta al archivo JSON con clases
-          img_size: Tamaño de imagen para procesamiento
+          model_path: Ruta al bundle (directorio) o al modelo .h5
+          classes_path: Ruta al archivo JSON con clases (solo para .h5)
+          img_size: Tamaño de imagen para procesamiento (solo para .h5)
       """
-      self.model = models.load_model(model_path)
-      with open(classes_path, 'r') as f:
-          self.classes = json.load(f)
-      
-      self.img_size = img_size
+      if ModelBundle.is_bundle(model_path):
+          self.bundle = ModelBundle.load(model_path)
+          self.model = self.bundle.model
+          self.classes = self.bundle.class_names
+          self.img_size = self.bundle.image_size
+          self.normalization = self.bundle.normalization
+      else:
+          self.bundle = None
+          self.model = models.load_model(model_path)
+          with open(classes_path, 'r') as f:
+              self.classes = json.load(f)
+          self.img_size = img_size
+          self.normalization = "efficientnet"
+      
+      self.preprocessor = FramePreprocessor(self.img_size, self.normalization)
       self.last_conv_layer_name = self._find_last_conv_layer()
       
       print(f"✓ Localizador cargado:")
@@ -45,14 +58,19 @@ class MineralLocalizer:
   
   def preprocess_image(self, image_path):
       """Carga y preprocesa una imagen"""
-      img = keras.preprocessing.image.load_img(
-          image_path, target_size=self.img_size
-      )
-      img_array = keras.preprocessing.image.img_to_array(img)
-      img_array = np.expand_dims(img_array, axis=0)
-      img_array = tf.keras.applications.efficientnet.preprocess_input(img_array)
+      frame = cv2.imread(image_path)
+      if frame is None:
+          raise FileNotFoundError(f"No se pudo leer la imagen: {image_path}")
+      img_array = self.preprocess_frames((frame,))
+      # Imagen en el mismo espacio que get_bounding_box (self.img_size);
+      # resize() reutiliza un buffer, de ahí la conversión a un array nuevo
+      img = cv2.cvtColor(self.preprocessor.resize(frame), cv2.COLOR_BGR2RGB)
       return img_array, img
   
+  def preprocess_frames(self, frames):
+      """Preprocesa un lote de frames BGR con el kernel compartido"""
+      return self.preprocessor(frames)
+  
   def generate_gradcam(self, img_array, class_index):
       """Genera heatmap Grad-CAM"""
       grad_model = models.Model(
@@ -85,7 +103,8 @@ class MineralLocalizer:
           return None
       
       # Redimensionar heatmap
-      heatmap_resized = cv2.resize(heatmap.numpy(), self.img_size)
+      # img_size es (alto, ancho); cv2 espera (ancho, alto)
+      heatmap_resized = cv2.resize(heatmap.numpy(), self.img_size[::-1])
       heatmap_resized = np.uint8(255 * heatmap_resized)
       
       # Umbralización
@@ -4,11 +4,26 @@ Detector de minerales usando CNN
 import cv2
 import numpy as np
 import os
+from functools import partial
 from keras.models import Sequential, load_model
-from keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
+from keras.layers import (Conv2D, MaxPooling2D, Flatten, Dense, Dropout,
+                          GlobalAveragePooling2D)
+from keras.optimizers import Adam
+from tensorflow.keras import applications
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 
 from config.settings import Config
+from ai.model_bundle import ModelBundle
+from ai.preprocessing import FramePreprocessor, normalize_rgb
+from ai.training_profile import get_profile
+
+
+# Backbones soportados y la normalización de entrada que requiere cada uno
+BACKBONES = {
+    "cnn": "rescale",
+    "efficientnetb0": "efficientnet",
+    "efficientnetb3": "efficientnet",
+}
 
 
 class MineralDetector:
@@ -18,35 +33,131 @@ class MineralDetector:
         self.model = None
         self.class_names = []
         self.is_trained = False
+        self.image_size = Config.IMAGE_SIZE
+        self.normalization = "rescale"
+        self.bundle = None
+        self._preprocessor = None
         
-    def build_model(self, num_classes):
-        """Construir arquitectura de la CNN"""
-        model = Sequential([
-            Conv2D(32, (3, 3), activation='relu', 
-                   input_shape=(*Config.IMAGE_SIZE, 3)),
-            MaxPooling2D(2, 2),
-            
-            Conv2D(64, (3, 3), activation='relu'),
-            MaxPooling2D(2, 2),
-            
-            Conv2D(128, (3, 3), activation='relu'),
-            MaxPooling2D(2, 2),
-            
-            Flatten(),
-            Dense(512, activation='relu'),
-            Dropout(0.5),
-            Dense(num_classes, activation='softmax')
-        ])
+    def build_model(self, num_classes, backbone="cnn", learning_rate=0.001,
+                    jit_compile=False):
+        """
+        Construir arquitectura de la CNN
+        
+        Args:
+            num_classes: número de clases de salida
+            backbone: una de BACKBONES ('cnn' o EfficientNet preentrenada)
+            learning_rate: tasa de aprendizaje de Adam
+            jit_compile: compilar el paso de entrenamiento con XLA
+        """
+        if backbone not in BACKBONES:
+            raise ValueError(f"Backbone desconocido: {backbone}")
+        self.normalization = BACKBONES[backbone]
+        
+        if backbone == "cnn":
+            model = Sequential([
+                Conv2D(32, (3, 3), activation='relu', 
+                       input_shape=(*Config.IMAGE_SIZE, 3)),
+                MaxPooling2D(2, 2),
+                
+                Conv2D(64, (3, 3), activation='relu'),
+                MaxPooling2D(2, 2),
+                
+                Conv2D(128, (3, 3), activation='relu'),
+                MaxPooling2D(2, 2),
+                
+                Flatten(),
+                Dense(512, activation='relu'),
+                Dropout(0.5),
+                Dense(num_classes, activation='softmax', dtype='float32')
+            ])
+        else:
+            # Base congelada como en la fase 1 de Train.ipynb
+            base_cls = {
+                "efficientnetb0": applications.EfficientNetB0,
+                "efficientnetb3": applications.EfficientNetB3,
+            }[backbone]
+            base_model = base_cls(
+                weights='imagenet',
+                include_top=False,
+                input_shape=(*Config.IMAGE_SIZE, 3)
+            )
+            base_model.trainable = False
+            model = Sequential([
+                base_model,
+                GlobalAveragePooling2D(),
+                Dropout(0.5),
+                Dense(num_classes, activation='softmax', dtype='float32')
+            ])
         
         model.compile(
-            optimizer='adam',
+            optimizer=Adam(learning_rate=learning_rate),
             loss='categorical_crossentropy',
-            metrics=['accuracy']
+            metrics=['accuracy'],
+            jit_compile=jit_compile
         )
         
         return model
     
-    def train(self, dataset_path=None, epochs=20, batch_size=32):
+    def create_generators(self, dataset_path, batch_size=32, augmentation=1.0,
+                          seed=None, image_size=None):
+        """
+        Generadores de entrenamiento y validación
+        
+        Args:
+            dataset_path: carpeta con una subcarpeta por clase
+            batch_size: tamaño de lote
+            augmentation: intensidad del aumento de datos (0 = sin aumento)
+            seed: semilla para el reparto y el barajado
+            image_size: (alto, ancho); por defecto Config.IMAGE_SIZE
+            
+        Returns:
+            (train_generator, validation_generator)
+        """
+        image_size = tuple(image_size or Config.IMAGE_SIZE)
+        
+        # Data augmentation (misma normalización que en inferencia)
+        normalize = partial(normalize_rgb, normalization=self.normalization)
+        train_datagen = ImageDataGenerator(
+            preprocessing_function=normalize,
+            rotation_range=20 * augmentation,
+            width_shift_range=0.2 * augmentation,
+            height_shift_range=0.2 * augmentation,
+            horizontal_flip=augmentation > 0,
+            validation_split=0.2
+        )
+        
+        # Validación sin aumento de datos
+        valid_datagen = ImageDataGenerator(
+            preprocessing_function=normalize,
+            validation_split=0.2
+        )
+        
+        # Generadores de entrenamiento y validación
+        train_generator = train_datagen.flow_from_directory(
+            dataset_path,
+            target_size=image_size,
+            batch_size=batch_size,
+            class_mode='categorical',
+            interpolation='bilinear',
+            subset='training',
+            seed=seed
+        )
+        
+        validation_generator = valid_datagen.flow_from_directory(
+            dataset_path,
+            target_size=image_size,
+            batch_size=batch_size,
+            class_mode='categorical',
+            interpolation='bilinear',
+            subset='validation',
+            shuffle=False,
+            seed=seed
+        )
+        
+        return train_generator, validation_generator
+    
+    def train(self, dataset_path=None, epochs=20, batch_size=32, workers=1,
+              profile=None):
         """
         Entrenar el modelo con las imágenes en datasets/
         
@@ -57,7 +168,15 @@ class MineralDetector:
             │   ├── img2.jpg
             ├── mineral2/
             │   ├── img1.jpg
+        
+        Con workers > 1 el aumento de datos se ejecuta en procesos paralelos.
+        profile: nombre o TrainingProfile (hilos, oneDNN, bfloat16, XLA)
         """
+        profile = get_profile(profile)
+        if profile is not None:
+            profile.apply()
+            print(f"⚙️ Perfil de entrenamiento: {profile}")
+        
         dataset_path = dataset_path or Config.DATASET_PATH
         
         if not os.path.exists(dataset_path):
@@ -74,36 +193,22 @@ class MineralDetector:
         
         print(f"🎯 Clases detectadas: {self.class_names}")
         
-        # Data augmentation
-        datagen = ImageDataGenerator(
-            rescale=1./255,
-            rotation_range=20,
-            width_shift_range=0.2,
-            height_shift_range=0.2,
-            horizontal_flip=True,
-            validation_split=0.2
-        )
-        
-        # Generadores de entrenamiento y validación
-        train_generator = datagen.flow_from_directory(
-            dataset_path,
-            target_size=Config.IMAGE_SIZE,
-            batch_size=batch_size,
-            class_mode='categorical',
-            subset='training'
+        self.normalization = BACKBONES["cnn"]
+        train_generator, validation_generator = self.create_generators(
+            dataset_path, batch_size
         )
         
-        validation_generator = datagen.flow_from_directory(
-            dataset_path,
-            target_size=Config.IMAGE_SIZE,
-            batch_size=batch_size,
-            class_mode='categorical',
-            subset='validation'
+        # Usar el orden de índices de Keras (alfabético), no el de os.listdir
+        self.class_names = ModelBundle.class_names_from_indices(
+            train_generator.class_indices
         )
         
         # Construir modelo
         num_classes = len(self.class_names)
-        self.model = self.build_model(num_classes)
+        self.model = self.build_model(
+            num_classes,
+            jit_compile=profile.jit_compile if profile else False
+        )
         
         print(f"🏋️ Entrenando modelo con {num_classes} clases...")
         
@@ -112,6 +217,8 @@ class MineralDetector:
             train_generator,
             epochs=epochs,
             validation_data=validation_generator,
+            workers=workers,
+            use_multiprocessing=workers > 1,
             verbose=1
         )
         
@@ -120,11 +227,31 @@ class MineralDetector:
         self.model.save(Config.MODEL_PATH)
         print(f"✅ Modelo guardado en: {Config.MODEL_PATH}")
         
+        self.bundle = ModelBundle.save(
+            Config.MODEL_BUNDLE_PATH,
+            self.model,
+            self.class_names,
+            Config.IMAGE_SIZE,
+            self.normalization,
+            extra={'history': {k: [float(v) for v in vals]
+                               for k, vals in history.history.items()}}
+        )
+        print(f"📦 Bundle guardado en: {Config.MODEL_BUNDLE_PATH} "
+              f"(versión {self.bundle.model_version})")
+        
+        self.image_size = Config.IMAGE_SIZE
         self.is_trained = True
         return True
     
     def load_model(self, model_path=None):
-        """Cargar modelo previamente entrenado"""
+        """
+        Cargar modelo previamente entrenado
+        
+        Acepta un bundle (directorio con manifest.json) o un .h5 heredado.
+        Sin argumentos se prefiere Config.MODEL_BUNDLE_PATH si existe.
+        """
+        if model_path is None and ModelBundle.is_bundle(Config.MODEL_BUNDLE_PATH):
+            model_path = Config.MODEL_BUNDLE_PATH
         model_path = model_path or Config.MODEL_PATH
         
         if not os.path.exists(model_path):
@@ -132,13 +259,24 @@ class MineralDetector:
             return False
         
         try:
-            self.model = load_model(model_path)
-            
-            # Cargar nombres de clases desde dataset
-            dataset_path = Config.DATASET_PATH
-            if os.path.exists(dataset_path):
-                self.class_names = [d for d in os.listdir(dataset_path) 
-                                   if os.path.isdir(os.path.join(dataset_path, d))]
+            if ModelBundle.is_bundle(model_path):
+                self.bundle = ModelBundle.load(model_path)
+                self.model = self.bundle.model
+                self.class_names = self.bundle.class_names
+                self.image_size = self.bundle.image_size
+                self.normalization = self.bundle.normalization
+            else:
+                self.model = load_model(model_path)
+                
+                # Formato heredado: sin metadatos, se reconstruyen las clases
+                # en el mismo orden que flow_from_directory (alfabético)
+                print("⚠️  Modelo sin bundle: clases leídas del dataset")
+                dataset_path = Config.DATASET_PATH
+                if os.path.exists(dataset_path):
+                    self.class_names = sorted(
+                        d for d in os.listdir(dataset_path)
+                        if os.path.isdir(os.path.join(dataset_path, d))
+                    )
             
             self.is_trained = True
             print(f"✅ Modelo cargado: {len(self.class_names)} clases")
@@ -163,45 +301,70 @@ class MineralDetector:
                 'bbox': (x, y, w, h) o None
             }
         """
+        return self.predict_batch((frame,))[0]
+    
+    def predict_batch(self, frames):
+        """
+        Detectar minerales en un lote de frames con una sola inferencia
+        
+        Args:
+            frames: lista de imágenes BGR de OpenCV
+            
+        Returns:
+            lista de dicts con el mismo formato que predict()
+        """
         if not self.is_trained or self.model is None:
-            return {
+            return [{
                 'detected': False,
                 'class': None,
                 'confidence': 0.0,
                 'bbox': None
-            }
+            } for _ in frames]
         
-        # Preprocesar imagen
-        img = cv2.resize(frame, Config.IMAGE_SIZE)
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = img.astype('float32') / 255.0
-        img = np.expand_dims(img, axis=0)
+        # Preprocesar lote sobre el buffer reutilizable
+        batch = self._get_preprocessor()(frames)
         
         # Predicción
-        predictions = self.model.predict(img, verbose=0)[0]
-        class_idx = np.argmax(predictions)
-        confidence = float(predictions[class_idx])
+        predictions = np.asarray(self.model(batch, training=False))
+        class_indices = np.argmax(predictions, axis=1)
         
-        # Verificar umbral de confianza
-        if confidence < Config.CONFIDENCE_THRESHOLD:
-            return {
-                'detected': False,
-                'class': None,
+        results = []
+        for frame, scores, class_idx in zip(frames, predictions, class_indices):
+            confidence = float(scores[class_idx])
+            
+            # Verificar umbral de confianza
+            if confidence < Config.CONFIDENCE_THRESHOLD:
+                results.append({
+                    'detected': False,
+                    'class': None,
+                    'confidence': confidence,
+                    'bbox': None
+                })
+                continue
+            
+            detected_class = self.class_names[class_idx] if class_idx < len(self.class_names) else "Unknown"
+            
+            # Detectar región (simplificado - detección de blob de color)
+            bbox = self._find_mineral_region(frame)
+            
+            results.append({
+                'detected': True,
+                'class': detected_class,
                 'confidence': confidence,
-                'bbox': None
-            }
-        
-        detected_class = self.class_names[class_idx] if class_idx < len(self.class_names) else "Unknown"
+                'bbox': bbox
+            })
         
-        # Detectar región (simplificado - detección de blob de color)
-        bbox = self._find_mineral_region(frame)
-        
-        return {
-            'detected': True,
-            'class': detected_class,
-            'confidence': confidence,
-            'bbox': bbox
-        }
+        return results
+    
+    def _get_preprocessor(self):
+        """Preprocesador compartido, recreado si cambian tamaño o normalización"""
+        preprocessor = self._preprocessor
+        if (preprocessor is None
+                or preprocessor.image_size != tuple(self.image_size)
+                or preprocessor.normalization != self.normalization):
+            preprocessor = FramePreprocessor(self.image_size, self.normalization)
+            self._preprocessor = preprocessor
+        return preprocessor
     
     def _find_mineral_region(self, frame):
         """
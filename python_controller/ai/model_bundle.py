@@ -0,0 +1,339 @@
+"""
+Paquete versionado de modelo (pesos + clases + preprocesamiento)
+
+Estructura en disco:
+    mineral_bundle/
+        ├── manifest.json   # versión, clases, preprocesamiento, checksum
+        ├── model.json      # arquitectura Keras (model.to_json())
+        └── weights.bin     # todos los pesos contiguos, alineados a 64 bytes
+
+Los modelos comprimidos (ai/compress.py) usan format "tflite" y guardan
+model.tflite en lugar de model.json + weights.bin.
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+BUNDLE_FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+ARCHITECTURE_FILE = "model.json"
+WEIGHTS_FILE = "weights.bin"
+TFLITE_FILE = "model.tflite"
+
+# Normalizaciones soportadas
+#   rescale:      píxeles RGB / 255 -> [0, 1]  (CNN de MineralDetector)
+#   efficientnet: píxeles RGB en [0, 255]      (EfficientNet reescala internamente)
+NORMALIZATIONS = ("rescale", "efficientnet")
+
+_ALIGNMENT = 64
+
+
+def _sha256(path, chunk_size=1 << 20):
+    """Checksum SHA-256 de un archivo leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """
+    Modelo entrenado junto con todo lo necesario para usarlo en inferencia.
+
+    Compartido por MineralDetector y MineralLocalizer: evita volver a listar
+    el dataset al cargar y garantiza que el índice de clase coincide con el
+    usado por flow_from_directory durante el entrenamiento.
+    """
+
+    def __init__(self, model, class_names, image_size, normalization,
+                 manifest=None):
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"Normalización desconocida: {normalization}")
+
+        self.model = model
+        self.class_names = list(class_names)
+        self.image_size = tuple(image_size)
+        self.normalization = normalization
+        self.manifest = manifest or {}
+
+    @property
+    def checksum(self):
+        return self.manifest.get("weights", {}).get("sha256")
+
+    @property
+    def model_version(self):
+        return self.manifest.get("model_version")
+
+    @property
+    def format(self):
+        """Formato del modelo: keras o tflite"""
+        return self.manifest.get("format", "keras")
+
+    def require_keras(self, purpose):
+        """
+        Comprobar que el bundle contiene un modelo Keras
+
+        Los bundles tflite solo sirven para inferencia: no tienen capas,
+        parámetros ni grafo diferenciable.
+
+        Raises:
+            ValueError: si el bundle es tflite
+        """
+        if self.format != "keras":
+            raise ValueError(f"{purpose} necesita un bundle Keras; este bundle es "
+                             f"{self.format} (solo inferencia)")
+
+    @staticmethod
+    def is_bundle(path):
+        """True si la ruta es un directorio con manifest.json"""
+        return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+    @staticmethod
+    def class_names_from_indices(class_indices):
+        """Convierte class_indices de Keras ({nombre: índice}) en lista ordenada"""
+        return [name for name, _ in sorted(class_indices.items(),
+                                           key=lambda item: item[1])]
+
+    @classmethod
+    def save(cls, path, model, class_names, image_size, normalization,
+             extra=None):
+        """
+        Guardar modelo y metadatos como bundle versionado
+
+        Args:
+            path: directorio destino (se crea si no existe)
+            model: modelo Keras entrenado
+            class_names: lista de clases en el orden de salida del modelo
+            image_size: (alto, ancho) de entrada
+            normalization: una de NORMALIZATIONS
+            extra: dict opcional con metadatos adicionales (métricas, etc.)
+
+        Returns:
+            ModelBundle con el manifest escrito
+        """
+        bundle = cls(model, class_names, image_size, normalization)
+        os.makedirs(path, exist_ok=True)
+
+        with open(os.path.join(path, ARCHITECTURE_FILE), "w") as f:
+            f.write(model.to_json())
+
+        # Pesos contiguos en un único archivo para poder mapearlos en memoria
+        tensors = []
+        offset = 0
+        weights_path = os.path.join(path, WEIGHTS_FILE)
+        with open(weights_path, "wb") as f:
+            for weight in model.get_weights():
+                weight = np.ascontiguousarray(weight)
+                padding = (-offset) % _ALIGNMENT
+                f.write(b"\0" * padding)
+                offset += padding
+
+                tensors.append({
+                    "shape": list(weight.shape),
+                    "dtype": weight.dtype.str,
+                    "offset": offset
+                })
+                f.write(weight.tobytes())
+                offset += weight.nbytes
+
+        checksum = _sha256(weights_path)
+        bundle._write_manifest(path, "keras", {
+            "file": WEIGHTS_FILE,
+            "sha256": checksum,
+            "nbytes": offset,
+            "tensors": tensors
+        }, architecture=ARCHITECTURE_FILE, extra=extra)
+        return bundle
+
+    @classmethod
+    def save_tflite(cls, path, tflite_model, class_names, image_size,
+                    normalization, extra=None):
+        """
+        Guardar un modelo TFLite (p.ej. cuantizado a int8) como bundle
+
+        Args:
+            tflite_model: bytes devueltos por TFLiteConverter.convert()
+        """
+        os.makedirs(path, exist_ok=True)
+        tflite_path = os.path.join(path, TFLITE_FILE)
+        with open(tflite_path, "wb") as f:
+            f.write(tflite_model)
+
+        bundle = cls(TFLiteModel(tflite_path), class_names, image_size,
+                     normalization)
+        bundle._write_manifest(path, "tflite", {
+            "file": TFLITE_FILE,
+            "sha256": _sha256(tflite_path),
+            "nbytes": len(tflite_model)
+        }, extra=extra)
+        return bundle
+
+    def _write_manifest(self, path, model_format, weights, architecture=None,
+                        extra=None):
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "format": model_format,
+            "model_version": f"{time.strftime('%Y%m%d-%H%M%S')}-{weights['sha256'][:8]}",
+            "created": time.time(),
+            "class_names": self.class_names,
+            "preprocessing": {
+                "image_size": list(self.image_size),
+                "normalization": self.normalization,
+                "color_order": "RGB"
+            },
+            "architecture": architecture,
+            "weights": weights
+        }
+        if extra:
+            manifest["extra"] = extra
+
+        with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+        self.manifest = manifest
+
+    @staticmethod
+    def read_manifest(path):
+        """Leer y validar manifest.json sin cargar el modelo"""
+        with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+
+        version = manifest.get("format_version")
+        if version is None or version > BUNDLE_FORMAT_VERSION:
+            raise ValueError(
+                f"Versión de bundle no soportada: {version} "
+                f"(máxima: {BUNDLE_FORMAT_VERSION})"
+            )
+        return manifest
+
+    @classmethod
+    def load_weights(cls, path, manifest=None, verify=True):
+        """
+        Mapear en memoria los pesos del bundle
+
+        Returns:
+            lista de arrays (vistas sobre el memmap, sin copias)
+        """
+        manifest = manifest or cls.read_manifest(path)
+        weights_info = manifest["weights"]
+        weights_path = os.path.join(path, weights_info["file"])
+
+        if verify and _sha256(weights_path) != weights_info["sha256"]:
+            raise ValueError(f"Checksum inválido en {weights_path}")
+
+        if weights_info["nbytes"] == 0:
+            return []
+
+        buffer = np.memmap(weights_path, dtype=np.uint8, mode="r")
+        weights = []
+        for tensor in weights_info["tensors"]:
+            dtype = np.dtype(tensor["dtype"])
+            count = int(np.prod(tensor["shape"], dtype=np.int64))
+            start = tensor["offset"]
+            end = start + count * dtype.itemsize
+            weights.append(buffer[start:end].view(dtype).reshape(tensor["shape"]))
+        return weights
+
+    @classmethod
+    def load(cls, path, verify=True, compile=False):
+        """
+        Cargar bundle completo en una sola llamada
+
+        Args:
+            path: directorio del bundle
+            verify: comprobar checksum SHA-256 de los pesos
+            compile: compilar el modelo (solo necesario para seguir entrenando)
+        """
+        manifest = cls.read_manifest(path)
+        weights_path = os.path.join(path, manifest["weights"]["file"])
+
+        if manifest.get("format", "keras") == "tflite":
+            if verify and _sha256(weights_path) != manifest["weights"]["sha256"]:
+                raise ValueError(f"Checksum inválido en {weights_path}")
+            model = TFLiteModel(weights_path)
+        else:
+            from tensorflow.keras.models import model_from_json
+
+            with open(os.path.join(path, manifest["architecture"]), "r") as f:
+                model = model_from_json(f.read())
+
+            model.set_weights(cls.load_weights(path, manifest, verify=verify))
+
+        if compile and manifest.get("format", "keras") == "keras":
+            model.compile(
+                optimizer='adam',
+                loss='categorical_crossentropy',
+                metrics=['accuracy']
+            )
+
+        preprocessing = manifest["preprocessing"]
+        return cls(
+            model,
+            manifest["class_names"],
+            preprocessing["image_size"],
+            preprocessing["normalization"],
+            manifest=manifest
+        )
+
+
+class TFLiteModel:
+    """
+    Envoltorio de tf.lite.Interpreter con la interfaz model(x) de Keras
+
+    Cuantiza la entrada y decuantiza la salida si el modelo es entero, de
+    modo que MineralDetector lo usa igual que un modelo Keras.
+    """
+
+    def __init__(self, model_path=None, model_content=None, num_threads=None):
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path,
+                                               model_content=model_content,
+                                               num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.layers = []
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+
+    @property
+    def input_shape(self):
+        return (None, *self._input["shape"][1:])
+
+    def count_params(self):
+        return None
+
+    def _quantize(self, x):
+        dtype = self._input["dtype"]
+        if np.issubdtype(dtype, np.integer):
+            scale, zero_point = self._input["quantization"]
+            info = np.iinfo(dtype)
+            x = np.clip(np.round(x / scale + zero_point), info.min, info.max)
+        return x.astype(dtype, copy=False)
+
+    def _dequantize(self, y):
+        if np.issubdtype(y.dtype, np.integer):
+            scale, zero_point = self._output["quantization"]
+            y = (y.astype(np.float32) - zero_point) * scale
+        return y
+
+    def __call__(self, x, training=False):
+        x = np.asarray(x, dtype=np.float32)
+        if x.shape[0] != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input["index"],
+                                                 list(x.shape))
+            self.interpreter.allocate_tensors()
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = x.shape[0]
+
+        self.interpreter.set_tensor(self._input["index"], self._quantize(x))
+        self.interpreter.invoke()
+        return self._dequantize(self.interpreter.get_tensor(self._output["index"]))
+
+    def predict(self, x, verbose=0):
+        return self(x)
@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
 """
 Script para entrenar el modelo de detección de minerales
+
+Uso no interactivo:
+    python ai/model_trainer.py --yes --epochs 30 --batch-size 32 --workers 4
+
+Para barridos de hiperparámetros ver ai/sweep.py
 """
+import argparse
 import sys
 import os
 
@@ -9,10 +15,46 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from ai.mineral_detector import MineralDetector
+from ai.training_profile import PROFILES, get_profile
 from config.settings import Config
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Entrenar detector de minerales")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="no pedir confirmación")
+    parser.add_argument("--epochs", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="procesos para el aumento de datos")
+    parser.add_argument("--profile", choices=list(PROFILES), default=None,
+                        help="perfil de CPU (ver ai/training_profile.py)")
+    return parser.parse_args()
+
+
+def apply_profile_environment(profile_name):
+    """
+    Reiniciar el script con las variables de entorno del perfil
+
+    TensorFlow lee TF_ENABLE_ONEDNN_OPTS y OMP_NUM_THREADS al importarse, y
+    este script ya lo importó (ai/__init__.py); si faltan, se vuelve a
+    ejecutar el mismo comando con el entorno del perfil.
+    """
+    profile = get_profile(profile_name)
+    if profile is None:
+        return
+    env = profile.environment()
+    if all(os.environ.get(key) == value for key, value in env.items()):
+        return
+    print(f"🔁 Reiniciando con el entorno del perfil '{profile.name}': {env}")
+    sys.stdout.flush()
+    os.execve(sys.executable, [sys.executable] + sys.argv, {**os.environ, **env})
+
+
 def main():
+    args = parse_args()
+    apply_profile_environment(args.profile)
+    
     print("="*60)
     print("ENTRENAMIENTO DEL MODELO DE DETECCIÓN DE MINERALES")
     print("="*60)
@@ -60,23 +102,30 @@ def main():
     
     # Confirmar entrenamiento
     print("\n" + "="*60)
-    response = input("¿Desea iniciar el entrenamiento? (s/n): ")
-    
-    if response.lower() != 's':
-        print("Entrenamiento cancelado")
-        return
+    if not args.yes:
+        response = input("¿Desea iniciar el entrenamiento? (s/n): ")
+        
+        if response.lower() != 's':
+            print("Entrenamiento cancelado")
+            return
     
     # Parámetros de entrenamiento
     print("\n⚙️ Configuración:")
-    epochs_input = input(f"Épocas (default: 20): ")
-    epochs = int(epochs_input) if epochs_input.strip() else 20
+    epochs = args.epochs
+    if epochs is None:
+        epochs_input = input(f"Épocas (default: 20): ") if not args.yes else ""
+        epochs = int(epochs_input) if epochs_input.strip() else 20
     
-    batch_input = input(f"Batch size (default: 32): ")
-    batch_size = int(batch_input) if batch_input.strip() else 32
+    batch_size = args.batch_size
+    if batch_size is None:
+        batch_input = input(f"Batch size (default: 32): ") if not args.yes else ""
+        batch_size = int(batch_input) if batch_input.strip() else 32
     
     print(f"\n🏋️ Iniciando entrenamiento...")
     print(f"   Épocas: {epochs}")
     print(f"   Batch size: {batch_size}")
+    print(f"   Workers: {args.workers}")
+    print(f"   Perfil: {args.profile or 'default'}")
     print()
     
     # Crear detector y entrenar
@@ -85,7 +134,9 @@ def main():
     success = detector.train(
         dataset_path=Config.DATASET_PATH,
         epochs=epochs,
-        batch_size=batch_size
+        batch_size=batch_size,
+        workers=args.workers,
+        profile=args.profile
     )
     
     if success:
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Barrido de hiperparámetros no interactivo con entrenamiento en paralelo
+
+Cada trial se entrena en un proceso independiente fijado a su propio grupo
+de núcleos. Los trials malos se detienen pronto (EarlyStopping + parada por
+mediana frente al resto de trials) y cada resultado se añade como una línea
+JSON al log de resultados.
+
+Uso:
+    python ai/sweep.py sweep.json --workers 4 --cores-per-worker 4
+
+Ejemplo de especificación (sweep.json):
+    {
+        "dataset_path": "datasets/",
+        "search": "random",
+        "num_trials": 16,
+        "epochs": 15,
+        "seed": 42,
+        "space": {
+            "learning_rate": {"min": 0.0001, "max": 0.01, "log": true},
+            "batch_size": [16, 32, 64],
+            "augmentation": [0.0, 0.5, 1.0],
+            "backbone": ["cnn", "efficientnetb0"]
+        },
+        "early_stopping": {"patience": 3, "grace_epochs": 2}
+    }
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+
+HYPERPARAMETERS = ("learning_rate", "batch_size", "augmentation", "backbone")
+
+DEFAULT_SPACE = {
+    "learning_rate": [0.001],
+    "batch_size": [32],
+    "augmentation": [1.0],
+    "backbone": ["cnn"],
+}
+
+# Estado por proceso worker (inicializado en _init_worker)
+_worker = {}
+
+
+def _sample(values, rng):
+    """Muestrear un valor de una lista o de un rango {min, max, log}"""
+    if isinstance(values, list):
+        return rng.choice(values)
+
+    low, high = values["min"], values["max"]
+    if values.get("log"):
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if isinstance(low, int) and isinstance(high, int):
+        return rng.randint(low, high)
+    return rng.uniform(low, high)
+
+
+def generate_trials(spec):
+    """
+    Generar la lista de configuraciones a evaluar
+
+    Returns:
+        lista de dicts {hiperparámetro: valor}
+    """
+    space = {**DEFAULT_SPACE, **spec.get("space", {})}
+    unknown = set(space) - set(HYPERPARAMETERS)
+    if unknown:
+        raise ValueError(f"Hiperparámetros desconocidos: {sorted(unknown)}")
+
+    search = spec.get("search", "grid")
+    if search == "grid":
+        for name, values in space.items():
+            if not isinstance(values, list):
+                raise ValueError(f"La búsqueda grid requiere listas: {name}")
+        combos = itertools.product(*(space[name] for name in HYPERPARAMETERS))
+        return [dict(zip(HYPERPARAMETERS, combo)) for combo in combos]
+
+    if search == "random":
+        rng = random.Random(spec.get("seed"))
+        return [{name: _sample(space[name], rng) for name in HYPERPARAMETERS}
+                for _ in range(spec.get("num_trials", 10))]
+
+    raise ValueError(f"Tipo de búsqueda desconocido: {search}")
+
+
+def assign_cores(workers, cores_per_worker=None):
+    """Repartir los núcleos disponibles en grupos disjuntos, uno por worker"""
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+
+    cores_per_worker = cores_per_worker or max(1, len(available) // workers)
+    groups = []
+    for i in range(workers):
+        start = (i * cores_per_worker) % len(available)
+        groups.append([available[(start + j) % len(available)]
+                       for j in range(cores_per_worker)])
+    return groups
+
+
+def _init_worker(core_queue, shared_history, lock):
+    """Fijar el proceso a su grupo de núcleos y configurar TensorFlow"""
+    cores = core_queue.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    # Los hilos de TF/oneDNN deben ajustarse antes de importar tensorflow
+    os.environ["OMP_NUM_THREADS"] = str(len(cores))
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(len(cores))
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _worker.update(cores=cores, history=shared_history, lock=lock)
+
+
+def _make_callbacks(trial_id, patience, grace_epochs):
+    """Callbacks de parada temprana y medición de tiempo por época"""
+    from tensorflow.keras import callbacks
+
+    history, lock = _worker["history"], _worker["lock"]
+
+    class MedianStopping(callbacks.Callback):
+        """Detener el trial si queda por debajo de la mediana de los demás"""
+
+        def __init__(self):
+            super().__init__()
+            self.pruned = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            value = (logs or {}).get("val_accuracy")
+            if value is None:
+                return
+
+            with lock:
+                others = list(history.get(epoch, []))
+                history[epoch] = others + [value]
+
+            if epoch + 1 >= grace_epochs and len(others) >= 2:
+                ordered = sorted(others)
+                median = ordered[len(ordered) // 2]
+                if value < median:
+                    print(f"✂️  Trial {trial_id}: val_accuracy {value:.4f} "
+                          f"< mediana {median:.4f} en época {epoch + 1}")
+                    self.pruned = True
+                    self.model.stop_training = True
+
+    class EpochTimer(callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.train_seconds = 0.0
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self._start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.train_seconds += time.perf_counter() - self._start
+
+    return (
+        callbacks.EarlyStopping(monitor="val_loss", patience=patience,
+                                restore_best_weights=True),
+        MedianStopping(),
+        EpochTimer(),
+    )
+
+
+def run_trial(trial_id, params, spec, save_dir=None):
+    """
+    Entrenar una configuración dentro del proceso worker
+
+    Returns:
+        dict con parámetros, métricas, tiempo y throughput del trial
+    """
+    from ai.mineral_detector import BACKBONES, MineralDetector
+    from ai.model_bundle import ModelBundle
+
+    record = {
+        "trial_id": trial_id,
+        "params": params,
+        "pid": os.getpid(),
+        "cores": _worker.get("cores"),
+        "started": time.time(),
+    }
+    wall_start = time.perf_counter()
+
+    try:
+        early = spec.get("early_stopping", {})
+        detector = MineralDetector()
+
+        # Los generadores deben usar la normalización del backbone
+        detector.normalization = BACKBONES[params["backbone"]]
+        train_gen, val_gen = detector.create_generators(
+            spec.get("dataset_path", Config.DATASET_PATH),
+            batch_size=int(params["batch_size"]),
+            augmentation=float(params["augmentation"]),
+            seed=spec.get("seed"),
+        )
+        class_names = ModelBundle.class_names_from_indices(train_gen.class_indices)
+        model = detector.build_model(len(class_names), params["backbone"],
+                                     float(params["learning_rate"]))
+
+        early_stopping, median_stopping, timer = _make_callbacks(
+            trial_id, early.get("patience", 3), early.get("grace_epochs", 2)
+        )
+        history = model.fit(
+            train_gen,
+            epochs=spec.get("epochs", 10),
+            validation_data=val_gen,
+            callbacks=[early_stopping, median_stopping, timer],
+            verbose=0,
+        )
+
+        epochs_run = len(history.history.get("loss", []))
+        val_accuracy = history.history.get("val_accuracy", [0.0])
+        val_loss = history.history.get("val_loss", [float("inf")])
+        record.update({
+            "status": "pruned" if median_stopping.pruned else "completed",
+            "epochs_run": epochs_run,
+            "best_val_accuracy": float(max(val_accuracy)),
+            "best_val_loss": float(min(val_loss)),
+            "history": {k: [float(v) for v in vals]
+                        for k, vals in history.history.items()},
+            "train_seconds": timer.train_seconds,
+            "images_per_sec": (train_gen.samples * epochs_run / timer.train_seconds
+                               if timer.train_seconds > 0 else 0.0),
+        })
+
+        if save_dir:
+            bundle_path = os.path.join(save_dir, f"trial_{trial_id:03d}")
+            ModelBundle.save(bundle_path, model, class_names, Config.IMAGE_SIZE,
+                             detector.normalization, extra={"params": params})
+            record["bundle"] = bundle_path
+
+    except Exception as e:
+        record.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+
+    record["wall_clock_s"] = time.perf_counter() - wall_start
+    return record
+
+
+def append_result(path, record):
+    """Añadir un resultado al log JSON-lines"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def run_sweep(spec, workers=None, cores_per_worker=None,
+              results_path="results/sweep_results.jsonl", save_dir=None):
+    """
+    Ejecutar todos los trials del barrido en procesos paralelos
+
+    Returns:
+        lista de resultados ordenada por best_val_accuracy descendente
+    """
+    trials = generate_trials(spec)
+    workers = min(workers or 1, len(trials)) or 1
+    core_groups = assign_cores(workers, cores_per_worker)
+
+    print(f"🔬 Barrido: {len(trials)} trials en {workers} procesos")
+    for i, cores in enumerate(core_groups):
+        print(f"   Worker {i}: núcleos {cores}")
+
+    # spawn: TensorFlow no es seguro tras fork
+    ctx = mp.get_context("spawn")
+    manager = ctx.Manager()
+    core_queue = manager.Queue()
+    for cores in core_groups:
+        core_queue.put(cores)
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(core_queue, manager.dict(), manager.Lock()),
+    ) as pool:
+        futures = [pool.submit(run_trial, i, params, spec, save_dir)
+                   for i, params in enumerate(trials)]
+
+        for future in as_completed(futures):
+            record = future.result()
+            append_result(results_path, record)
+            results.append(record)
+
+            if record["status"] == "failed":
+                print(f"❌ Trial {record['trial_id']}: {record['error']}")
+            else:
+                print(f"✅ Trial {record['trial_id']} ({record['status']}): "
+                      f"val_acc={record['best_val_accuracy']:.4f} "
+                      f"{record['images_per_sec']:.1f} img/s "
+                      f"{record['wall_clock_s']:.1f}s {record['params']}")
+
+    manager.shutdown()
+    return sorted(results, key=lambda r: r.get("best_val_accuracy", -1),
+                  reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de hiperparámetros")
+    parser.add_argument("spec", help="archivo JSON con la especificación")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="procesos en paralelo (default: núcleos / cores-per-worker)")
+    parser.add_argument("--cores-per-worker", type=int, default=None)
+    parser.add_argument("--results", default="results/sweep_results.jsonl")
+    parser.add_argument("--save-bundles", default=None, metavar="DIR",
+                        help="guardar el bundle de cada trial en DIR")
+    args = parser.parse_args()
+
+    with open(args.spec, "r") as f:
+        spec = json.load(f)
+
+    workers = args.workers
+    if workers is None:
+        cores = os.cpu_count() or 1
+        workers = max(1, cores // (args.cores_per_worker or 4))
+
+    results = run_sweep(spec, workers, args.cores_per_worker,
+                        args.results, args.save_bundles)
+
+    print("\n" + "=" * 60)
+    print("MEJORES TRIALS")
+    print("=" * 60)
+    for record in results[:5]:
+        if record["status"] != "failed":
+            print(f"  #{record['trial_id']}: {record['best_val_accuracy']:.4f} "
+                  f"{record['params']}")
+    print(f"\nResultados en: {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Perfiles de entrenamiento en CPU (hilos, oneDNN, bfloat16, XLA)
+
+Cada perfil se mide en un proceso separado porque los pools de hilos de
+TensorFlow y la variable de oneDNN solo pueden fijarse antes de ejecutar la
+primera operación.
+
+Uso:
+    python ai/training_profile.py --profiles default threads bf16 xla bf16_xla
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from queue import Empty
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+
+
+def cpu_supports_bf16():
+    """True si la CPU tiene instrucciones bfloat16 nativas (AVX512-BF16 / AMX)"""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class TrainingProfile:
+    """
+    Configuración de ejecución de TensorFlow para entrenar en CPU
+
+    Args:
+        name: identificador del perfil
+        intra_op: hilos por operación (None = valor por defecto de TF)
+        inter_op: operaciones independientes en paralelo (None = defecto)
+        onednn: activar optimizaciones oneDNN (None = defecto)
+        mixed_precision: usar política mixed_bfloat16
+        jit_compile: compilar el paso de entrenamiento con XLA
+    """
+
+    def __init__(self, name, intra_op=None, inter_op=None, onednn=None,
+                 mixed_precision=False, jit_compile=False):
+        self.name = name
+        self.intra_op = intra_op
+        self.inter_op = inter_op
+        self.onednn = onednn
+        self.mixed_precision = mixed_precision
+        self.jit_compile = jit_compile
+
+    def __repr__(self):
+        return (f"TrainingProfile({self.name!r}, intra_op={self.intra_op}, "
+                f"inter_op={self.inter_op}, onednn={self.onednn}, "
+                f"mixed_precision={self.mixed_precision}, "
+                f"jit_compile={self.jit_compile})")
+
+    @property
+    def supported(self):
+        return not self.mixed_precision or cpu_supports_bf16()
+
+    def environment(self):
+        """Variables de entorno que deben fijarse antes de importar TF"""
+        env = {}
+        if self.onednn is not None:
+            env["TF_ENABLE_ONEDNN_OPTS"] = "1" if self.onednn else "0"
+        if self.intra_op:
+            env["OMP_NUM_THREADS"] = str(self.intra_op)
+        return env
+
+    def apply(self):
+        """
+        Aplicar el perfil al proceso actual
+
+        Debe llamarse antes de construir el modelo. Las variables de entorno
+        (oneDNN, OMP_NUM_THREADS) solo tienen efecto si se fijan antes de
+        importar tensorflow: ai/model_trainer.py reinicia el proceso con
+        ellas y benchmark_profiles() usa un proceso nuevo por perfil.
+        """
+        tf_loaded = "tensorflow" in sys.modules
+        for key, value in self.environment().items():
+            if tf_loaded and os.environ.get(key) != value:
+                print(f"⚠️  {key}={value} requiere reiniciar el proceso")
+            os.environ[key] = value
+
+        import tensorflow as tf
+
+        if self.intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(self.intra_op)
+        if self.inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(self.inter_op)
+
+        if self.mixed_precision:
+            if not cpu_supports_bf16():
+                print("⚠️  CPU sin soporte bfloat16: se mantiene float32")
+            else:
+                tf.keras.mixed_precision.set_global_policy("mixed_bfloat16")
+
+
+def _build_profiles():
+    cores = available_cores()
+    threads = dict(intra_op=cores, inter_op=2, onednn=True)
+    return {
+        "default": TrainingProfile("default"),
+        "threads": TrainingProfile("threads", **threads),
+        "bf16": TrainingProfile("bf16", mixed_precision=True, **threads),
+        "xla": TrainingProfile("xla", jit_compile=True, **threads),
+        "bf16_xla": TrainingProfile("bf16_xla", mixed_precision=True,
+                                    jit_compile=True, **threads),
+    }
+
+
+PROFILES = _build_profiles()
+
+
+def get_profile(profile):
+    """Obtener perfil por nombre (o devolver el mismo si ya es un perfil)"""
+    if profile is None or isinstance(profile, TrainingProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Perfil desconocido: {profile} "
+                         f"(disponibles: {', '.join(PROFILES)})")
+    return PROFILES[profile]
+
+
+def _benchmark_worker(profile, steps, warmup, batch_size, num_classes, queue):
+    """Medir el paso de entrenamiento con datos sintéticos (proceso hijo)"""
+    try:
+        profile.apply()
+
+        import tensorflow as tf
+        from ai.mineral_detector import MineralDetector
+
+        tf.keras.utils.set_random_seed(0)
+        model = MineralDetector().build_model(num_classes,
+                                              jit_compile=profile.jit_compile)
+
+        rng = np.random.default_rng(0)
+        x = rng.random((batch_size, *Config.IMAGE_SIZE, 3), dtype=np.float32)
+        y = np.eye(num_classes, dtype=np.float32)[
+            rng.integers(0, num_classes, batch_size)]
+
+        # Salida antes de entrenar para comparar con el perfil de referencia
+        initial = np.asarray(model(x, training=False), dtype=np.float32)
+
+        for _ in range(warmup):
+            model.train_on_batch(x, y)
+
+        step_times = []
+        loss = None
+        for _ in range(steps):
+            start = time.perf_counter()
+            loss = model.train_on_batch(x, y)
+            step_times.append(time.perf_counter() - start)
+
+        loss = float(loss[0] if isinstance(loss, (list, tuple)) else loss)
+        step_times = np.array(step_times)
+        queue.put({
+            "profile": profile.name,
+            "status": "ok",
+            "step_ms_mean": float(step_times.mean() * 1000),
+            "step_ms_p50": float(np.percentile(step_times, 50) * 1000),
+            "step_ms_p95": float(np.percentile(step_times, 95) * 1000),
+            "images_per_sec": float(batch_size / step_times.mean()),
+            "final_loss": loss,
+            "initial_output": initial.tolist(),
+        })
+    except Exception as e:
+        queue.put({"profile": profile.name, "status": "failed",
+                   "error": f"{type(e).__name__}: {e}"})
+
+
+def _wait_result(process, queue, name, timeout):
+    """Resultado del hijo, o un fallo si muere o supera `timeout` segundos"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return queue.get(timeout=1.0)
+        except Empty:
+            pass
+        if not process.is_alive():
+            # El resultado puede haber llegado justo antes de terminar
+            try:
+                return queue.get(timeout=1.0)
+            except Empty:
+                return {"profile": name, "status": "failed",
+                        "error": f"proceso terminado (exitcode {process.exitcode})"}
+        if time.monotonic() > deadline:
+            process.terminate()
+            return {"profile": name, "status": "failed",
+                    "error": f"sin resultado tras {timeout:.0f} s"}
+
+
+def benchmark_profiles(names=None, steps=30, warmup=5, batch_size=32,
+                       num_classes=4, tolerance=0.05, timeout=600.0):
+    """
+    Medir tiempo de paso y throughput de cada perfil
+
+    Un perfil es correcto si su pérdida es finita y su salida inicial no se
+    aleja más de `tolerance` de la del perfil 'default' (mismos pesos). Sin
+    un 'default' válido con el que comparar, "correct" queda en None (sin
+    verificar) salvo que la pérdida no sea finita. Un hijo que muere (import
+    de TF, OOM) o tarda más de `timeout` segundos cuenta como perfil fallido.
+
+    Returns:
+        lista de dicts con las métricas de cada perfil
+    """
+    names = names or list(PROFILES)
+    ctx = mp.get_context("spawn")
+    results = []
+
+    for name in names:
+        profile = get_profile(name)
+        if not profile.supported:
+            results.append({"profile": name, "status": "unsupported"})
+            continue
+
+        # El proceso hijo hereda el entorno vigente al arrancar
+        saved = {k: os.environ.get(k) for k in profile.environment()}
+        os.environ.update(profile.environment())
+        try:
+            queue = ctx.Queue()
+            process = ctx.Process(
+                target=_benchmark_worker,
+                args=(profile, steps, warmup, batch_size, num_classes, queue)
+            )
+            process.start()
+            result = _wait_result(process, queue, name, timeout)
+            process.join()
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        results.append(result)
+
+    reference = next((np.array(r["initial_output"]) for r in results
+                      if r["profile"] == "default" and r["status"] == "ok"), None)
+    for result in results:
+        output = result.pop("initial_output", None)
+        if result["status"] != "ok":
+            continue
+        if not np.isfinite(result["final_loss"]):
+            result["max_output_diff"] = None
+            result["correct"] = False
+        elif reference is None:
+            result["max_output_diff"] = None
+            result["correct"] = None
+        else:
+            diff = float(np.abs(np.array(output) - reference).max())
+            result["max_output_diff"] = diff
+            result["correct"] = diff <= tolerance
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar perfiles de entrenamiento")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES),
+                        default=list(PROFILES))
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", default=None, help="guardar resultados en JSON")
+    args = parser.parse_args()
+
+    print(f"🧮 CPU: {available_cores()} núcleos, "
+          f"bfloat16 nativo: {'sí' if cpu_supports_bf16() else 'no'}")
+
+    results = benchmark_profiles(args.profiles, args.steps, args.warmup,
+                                 args.batch_size)
+
+    print("=" * 60)
+    print(f"{'Perfil':<10} {'paso (ms)':>10} {'p95 (ms)':>10} "
+          f"{'img/s':>10} {'correcto':>9}")
+    print("=" * 60)
+    for r in results:
+        if r["status"] != "ok":
+            print(f"{r['profile']:<10} {r['status']}: {r.get('error', '')}")
+            continue
+        correct = {True: "sí", False: "NO", None: "sin ref."}[r["correct"]]
+        print(f"{r['profile']:<10} {r['step_ms_mean']:>10.1f} "
+              f"{r['step_ms_p95']:>10.1f} {r['images_per_sec']:>10.1f} "
+              f"{correct:>9}")
+
+    valid = [r for r in results if r.get("correct")]
+    if valid:
+        best = max(valid, key=lambda r: r["images_per_sec"])
+        print(f"\n🏆 Perfil más rápido correcto: {best['profile']}")
+    elif any(r.get("correct") is None for r in results):
+        print("\n⚠️  Sin resultado del perfil 'default': no se pudo verificar "
+              "la exactitud de los perfiles")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados guardados en: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de las rutas críticas con detección de regresiones
+
+Todo corre sin red ni robot: frames sintéticos, un modelo CNN con pesos
+aleatorios y un ESP32 simulado (MJPEG + WebSocket de control en
+127.0.0.1). Cada caso se repite varias veces (--repeats) y se guarda la
+mejor repetición: ops/seg máximo y latencias p50/p95/p99 mínimas, que son
+mucho menos sensibles a interferencias puntuales que una sola medida.
+Cada suite corre en un proceso propio, de modo que su pico de memoria
+residente no depende de las suites que se ejecutaron antes.
+
+    python benchmark_suite.py --output results/benchmarks.json
+    python benchmark_suite.py --baseline results/bench_baseline.json
+    python benchmark_suite.py --only predict find_region --iterations 50
+
+Con --baseline el proceso termina con código 1 si algún caso empeora más
+allá de la tolerancia. Los casos cuyas dependencias no están instaladas
+(TensorFlow, websocket-client) se marcan como omitidos.
+"""
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import resource
+import select
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from camera_relay import CameraRelay, _WS_GUID, _ws_frame
+
+FRAME_SHAPE = (480, 640, 3)
+
+
+def synthetic_frames(count=8, shape=FRAME_SHAPE, seed=0):
+    """Frames BGR con textura de ruido y un 'mineral' brillante"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = rng.integers(0, 80, shape, dtype=np.uint8)
+        h, w = shape[:2]
+        x, y = rng.integers(0, w // 2), rng.integers(0, h // 2)
+        cv2.ellipse(frame, (int(x + w // 4), int(y + h // 4)), (60, 40), 0, 0, 360,
+                    tuple(int(c) for c in rng.integers(150, 255, 3)), -1)
+        frames.append(frame)
+    return frames
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso (MB); nunca disminuye"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(latencies, elapsed, operations):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "ops_per_sec": float(operations / elapsed),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_p99": float(np.percentile(latencies, 99)),
+    }
+
+
+def _spread(values):
+    """Dispersión relativa (máx - mín) / máx entre repeticiones"""
+    return float((max(values) - min(values)) / max(values)) if max(values) else 0.0
+
+
+def best_of(rounds):
+    """
+    Mejor valor de cada métrica entre repeticiones de un caso
+
+    También guarda la dispersión entre repeticiones de ops/seg y p95, que
+    compare() usa como margen de ruido propio de cada caso.
+    """
+    ops = [r["ops_per_sec"] for r in rounds]
+    p95 = [r["latency_ms_p95"] for r in rounds]
+    result = {
+        "ops_per_sec": max(ops),
+        "latency_ms_p50": min(r["latency_ms_p50"] for r in rounds),
+        "latency_ms_p95": min(p95),
+        "latency_ms_p99": min(r["latency_ms_p99"] for r in rounds),
+        "repeats": len(rounds),
+        "ops_noise": _spread(ops),
+        "p95_noise": _spread(p95),
+    }
+    if "errors" in rounds[0]:
+        result["errors"] = sum(r["errors"] for r in rounds)
+    return result
+
+
+def measure(fn, iterations=200, warmup=10, repeats=5):
+    """Ejecutar fn() en bucle `repeats` veces y quedarse con la mejor"""
+    for _ in range(warmup):
+        fn()
+    rounds = []
+    for _ in range(repeats):
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - t0)
+        rounds.append(summarize(latencies, time.perf_counter() - start, iterations))
+    return best_of(rounds)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("conexión cerrada")
+        data += chunk
+    return data
+
+
+def _read_ws_frame(sock):
+    """Leer una trama WebSocket cliente -> servidor (enmascarada)"""
+    first, second = _recv_exact(sock, 2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", _recv_exact(sock, 8))[0]
+    mask = _recv_exact(sock, 4) if second & 0x80 else None
+    payload = _recv_exact(sock, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return first & 0x0F, payload
+
+
+class _SyntheticCamera(CameraRelay):
+    """Relay de cámara cuyo 'upstream' son frames sintéticos a fps fijos"""
+
+    def __init__(self, frames, fps, port):
+        super().__init__("synthetic", host="127.0.0.1", port=port)
+        self.jpegs = [cv2.imencode(".jpg", f)[1].tobytes() for f in frames]
+        self.fps = fps
+
+    def _upstream_loop(self):
+        self.upstream_connected = True
+        i = 0
+        while self.running:
+            self.hub.publish(self.jpegs[i % len(self.jpegs)])
+            self.upstream_meter.tick()
+            i += 1
+            time.sleep(1.0 / self.fps)
+
+
+class MockESP32:
+    """
+    ESP32 simulado en 127.0.0.1
+
+    Sirve MJPEG igual que el firmware de la cámara y un WebSocket de control
+    que responde con mensajes de estado como el del robot y aplica
+    set_all_servos/set_mode.
+    """
+
+    def __init__(self, frames, fps=30, status_hz=20):
+        self.camera = _SyntheticCamera(frames, fps, _free_port())
+        self.ws_port = _free_port()
+        self.status_period = 1.0 / status_hz
+        self.servos = [90] * 6
+        self.mode = "idle"
+        self.commands = 0
+        self.running = False
+        self._server = None
+
+    @property
+    def stream_url(self):
+        return self.camera.mjpeg_url
+
+    def start(self):
+        self.running = True
+        self.camera.start()
+        self._server = socket.create_server(("127.0.0.1", self.ws_port))
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.camera.stop()
+        if self._server:
+            self._server.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            request = b""
+            while b"\r\n\r\n" not in request:
+                request += conn.recv(1024)
+            key = next(line.split(":", 1)[1].strip()
+                       for line in request.decode("latin-1").split("\r\n")
+                       if line.lower().startswith("sec-websocket-key"))
+            accept = base64.b64encode(
+                hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+            conn.sendall(("HTTP/1.1 101 Switching Protocols\r\n"
+                          "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+            next_status = 0.0
+            while self.running:
+                now = time.monotonic()
+                if now >= next_status:
+                    status = json.dumps({"mode": self.mode, "servos": self.servos,
+                                         "servos_enabled": True})
+                    conn.sendall(_ws_frame(status.encode(), opcode=0x1))
+                    next_status = now + self.status_period
+
+                readable, _, _ = select.select([conn], [], [], self.status_period)
+                if not readable:
+                    continue
+                opcode, payload = _read_ws_frame(conn)
+                if opcode == 0x8:
+                    return
+                if opcode == 0x1:
+                    self._handle(json.loads(payload))
+        except (ConnectionError, OSError, StopIteration):
+            pass
+        finally:
+            conn.close()
+
+    def _handle(self, message):
+        self.commands += 1
+        if message.get("cmd") == "set_all_servos":
+            self.servos = list(message["angles"])
+        elif message.get("cmd") == "set_mode":
+            self.mode = message["mode"]
+
+
+# ---------------------------------------------------------------- casos
+
+def bench_controller(frames, iterations, repeats):
+    """BipedController.get_frame y create_control_panel contra el ESP32 simulado"""
+    from biped_controller import BipedController, create_control_panel
+
+    esp32 = MockESP32(frames).start()
+    controller = BipedController("127.0.0.1", esp32.stream_url, ws_port=esp32.ws_port)
+    try:
+        deadline = time.time() + 15
+        while (controller.frame is None or not controller.connected) \
+                and time.time() < deadline:
+            time.sleep(0.1)
+        if controller.frame is None:
+            raise RuntimeError("el ESP32 simulado no entregó frames")
+
+        return {
+            "get_frame": measure(controller.get_frame, iterations * 50,
+                                 repeats=repeats),
+            "create_control_panel": measure(lambda: create_control_panel(controller),
+                                            iterations * 5, repeats=repeats),
+        }
+    finally:
+        controller.running = False
+        esp32.stop()
+
+
+def _random_detector():
+    from ai.mineral_detector import MineralDetector
+
+    detector = MineralDetector()
+    detector.class_names = ["calcita", "cuarzo", "magnetita", "pirita"]
+    detector.model = detector.build_model(len(detector.class_names))
+    detector.is_trained = True
+    return detector
+
+
+def bench_detector(frames, iterations, repeats):
+    """MineralDetector.predict y _find_mineral_region con un modelo aleatorio"""
+    detector = _random_detector()
+    cycle = itertools.cycle(frames)
+    return {
+        "predict": measure(lambda: detector.predict(next(cycle)), iterations,
+                           repeats=repeats),
+        "find_region": measure(
+            lambda: detector._find_mineral_region(next(cycle)), iterations * 5,
+            repeats=repeats),
+    }
+
+
+def bench_gradcam(frames, iterations, repeats):
+    """MineralLocalizer.generate_gradcam sobre un bundle con pesos aleatorios"""
+    from ai.localization_mineral import MineralLocalizer
+    from ai.model_bundle import ModelBundle
+
+    detector = _random_detector()
+    with tempfile.TemporaryDirectory() as tmp:
+        ModelBundle.save(tmp, detector.model, detector.class_names,
+                         detector.image_size, detector.normalization)
+        localizer = MineralLocalizer(tmp)
+        batch = localizer.preprocess_frames(frames[:1])
+        return {"generate_gradcam": measure(
+            lambda: localizer.generate_gradcam(batch, 0), max(10, iterations // 4),
+            repeats=repeats)}
+
+
+def _load(url, requests, concurrency, method="GET", body=None, headers=None,
+          repeats=5):
+    """Lanzar `requests` peticiones HTTP `repeats` veces y quedarse con la mejor"""
+    _load_round(url, concurrency * 4, concurrency, method, body, headers)  # calentamiento
+    return best_of([_load_round(url, requests, concurrency, method, body, headers)
+                    for _ in range(repeats)])
+
+
+def _load_round(url, requests, concurrency, method="GET", body=None, headers=None):
+    """Lanzar `requests` peticiones HTTP repartidas en `concurrency` hilos"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_thread = requests // concurrency
+
+    def worker():
+        local = []
+        for _ in range(per_thread):
+            req = urllib.request.Request(url, data=body, method=method,
+                                         headers=headers or {})
+            t0 = time.perf_counter()
+            try:
+                urllib.request.urlopen(req, timeout=10).read()
+            except urllib.error.HTTPError as e:
+                if e.code != 304:
+                    errors.append(e.code)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    result = summarize(latencies, time.perf_counter() - start, len(latencies))
+    result["errors"] = len(errors)
+    return result
+
+
+def bench_endpoints(frames, iterations, repeats, concurrency=8):
+    """Endpoints de main.py bajo carga concurrente por HTTP real"""
+    from werkzeug.serving import make_server
+    import main
+
+    # Diez minutos de telemetría para las consultas por rango
+    now = time.time()
+    samples = main.Config.TELEMETRY_RATE_HZ * main.Config.TELEMETRY_SECONDS
+    times = now - np.arange(samples)[::-1] / main.Config.TELEMETRY_RATE_HZ
+    for channel in ("angles", "errors", "pwm"):
+        main.telemetry.buffers[channel].extend(
+            times, np.random.default_rng(0).uniform(0, 180, (samples, 6)))
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = _free_port()
+    server = make_server("127.0.0.1", port, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{port}/api"
+    requests = iterations * 20
+    try:
+        version, _ = main.servo_state.snapshot_json()
+        return {
+            "GET /api/servos": _load(f"{base}/servos", requests, concurrency,
+                                     repeats=repeats),
+            "GET /api/servos (304)": _load(
+                f"{base}/servos", requests, concurrency,
+                headers={"If-None-Match": main.etag(main.servo_state.token(version))},
+                repeats=repeats),
+            "POST /api/servo": _load(
+                f"{base}/servo/servo1", requests, concurrency, "POST",
+                json.dumps({"angle": 100}).encode(),
+                {"Content-Type": "application/json"}, repeats=repeats),
+            "GET /api/telemetry/range": _load(
+                f"{base}/telemetry/range?channel=angles&seconds=600&points=300",
+                requests // 5, concurrency, repeats=repeats),
+        }
+    finally:
+        server.shutdown()
+
+
+SUITES = {
+    "controller": bench_controller,
+    "detector": bench_detector,
+    "gradcam": bench_gradcam,
+    "endpoints": bench_endpoints,
+}
+
+
+def _run_suite(name, iterations, repeats, seed):
+    """Ejecutar una suite (en un proceso nuevo) y medir su pico de memoria"""
+    cases = SUITES[name](synthetic_frames(seed=seed), iterations, repeats)
+    return cases, peak_rss_mb()
+
+
+def run(suites=None, iterations=100, repeats=5, seed=0):
+    """
+    Ejecutar las suites indicadas (todas por defecto)
+
+    Cada suite corre en un proceso "spawn" separado: ru_maxrss es el pico
+    de ese proceso y no arrastra el de las suites anteriores.
+
+    Returns:
+        dict serializable a JSON con entorno, casos, pico de memoria por
+        suite y suites omitidas
+    """
+    results = {
+        "timestamp": time.time(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+        },
+        "iterations": iterations,
+        "repeats": repeats,
+        "cases": {},
+        "suites": {},
+        "skipped": {},
+    }
+    ctx = mp.get_context("spawn")
+    for name in suites or SUITES:
+        print(f"⏱️  {name}...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            try:
+                cases, rss = pool.submit(_run_suite, name, iterations, repeats, seed).result()
+            except ImportError as e:
+                print(f"⚠️  {name} omitido: {e}")
+                results["skipped"][name] = str(e)
+                continue
+        results["cases"].update(cases)
+        results["suites"][name] = {"peak_rss_mb": float(rss), "cases": list(cases)}
+    return results
+
+
+def compare(current, baseline, tolerance=0.15, rss_tolerance=0.25):
+    """
+    Comparar con un resultado anterior de run()
+
+    El margen de cada caso es `tolerance` más la mayor dispersión entre
+    repeticiones medida en cualquiera de las dos ejecuciones: un caso que
+    varía un 20 % entre repeticiones no puede señalar una caída del 15 %.
+
+    Returns:
+        lista de regresiones (textos); vacía si no hay
+    """
+    regressions = []
+    for case, prev in baseline.get("cases", {}).items():
+        curr = current["cases"].get(case)
+        if curr is None:
+            continue
+        ops_margin = tolerance + max(prev.get("ops_noise", 0), curr.get("ops_noise", 0))
+        p95_margin = tolerance + max(prev.get("p95_noise", 0), curr.get("p95_noise", 0))
+        if curr["ops_per_sec"] < prev["ops_per_sec"] * (1 - ops_margin):
+            regressions.append(f"{case}: {prev['ops_per_sec']:.1f} -> "
+                               f"{curr['ops_per_sec']:.1f} ops/s")
+        if curr["latency_ms_p95"] > prev["latency_ms_p95"] * (1 + p95_margin):
+            regressions.append(f"{case}: p95 {prev['latency_ms_p95']:.3f} -> "
+                               f"{curr['latency_ms_p95']:.3f} ms")
+        if curr.get("errors"):
+            regressions.append(f"{case}: {curr['errors']} respuestas con error")
+    # Memoria por suite (proceso propio), no el máximo acumulado
+    for suite, prev in baseline.get("suites", {}).items():
+        curr = current.get("suites", {}).get(suite)
+        if curr is None:
+            continue
+        if curr["peak_rss_mb"] > prev["peak_rss_mb"] * (1 + rss_tolerance):
+            regressions.append(f"{suite}: RSS {prev['peak_rss_mb']:.0f} -> "
+                               f"{curr['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de rutas críticas")
+    parser.add_argument("--only", nargs="+", choices=list(SUITES), default=None)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="repeticiones por caso (se guarda la mejor)")
+    parser.add_argument("--output", default="results/benchmarks.json")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON de referencia para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--rss-tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run(args.only, args.iterations, max(1, args.repeats))
+
+    print("=" * 72)
+    print(f"{'caso':<28} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'RSS MB':>7}")
+    print("=" * 72)
+    for suite in results["suites"].values():
+        for case in suite["cases"]:
+            m = results["cases"][case]
+            print(f"{case:<28} {m['ops_per_sec']:>10.1f} {m['latency_ms_p50']:>9.3f} "
+                  f"{m['latency_ms_p95']:>9.3f} {m['latency_ms_p99']:>9.3f} "
+                  f"{suite['peak_rss_mb']:>7.0f}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+        if regressions:
+            print("\n❌ REGRESIONES:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto a", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,23 @@ import threading
 import time
 import json
 import os
+import argparse
 from websocket import create_connection, WebSocketConnectionClosedException
 
+from pipeline import Pipeline
+from shared_state import SharedStateBackend
+from config.settings import Config
+
 # Solución Wayland
 os.environ['QT_QPA_PLATFORM'] = 'xcb'
 
 class BipedController:
-    def __init__(self, esp32_ip):
+    def __init__(self, esp32_ip, stream_url=None, state=None, start_video=True,
+                 ws_port=82):
         self.ip = esp32_ip
+        self.ws_port = ws_port
+        # URL de video; usar el relay (camera_relay.py) para compartir la cámara
+        self.stream_url = stream_url or f"http://{esp32_ip}/"
         self.ws = None
         self.connected = False
         self.frame = None
@@ -23,14 +32,20 @@ class BipedController:
         self.servo_angles = [90, 90, 90, 90, 90, 90]
         self.servos_enabled = True
         self.last_slider_values = [90] * 6
+        # Backend compartido con main.py (shared_state.py): consignas de la
+        # UI web hacia el ESP32 y realimentación de vuelta
+        self.state = state
         
         print(f"🤖 Controlador iniciado - IP: {esp32_ip}")
-        self.start_video_thread()
+        if start_video:
+            self.start_video_thread()
         self.start_websocket_thread()
+        if state is not None:
+            self.start_state_bridge()
         
     def start_video_thread(self):
         def video_loop():
-            stream_url = f"http://{self.ip}/"
+            stream_url = self.stream_url
             print(f"📹 Intentando video: {stream_url}")
             
             retry_delay = 2
@@ -65,12 +80,12 @@ class BipedController:
     
     def start_websocket_thread(self):
         def ws_loop():
-            print(f"📡 Intentando WebSocket: ws://{self.ip}:82")
+            print(f"📡 Intentando WebSocket: ws://{self.ip}:{self.ws_port}")
             retry_delay = 2
             
             while self.running:
                 try:
-                    self.ws = create_connection(f"ws://{self.ip}:82", timeout=5)
+                    self.ws = create_connection(f"ws://{self.ip}:{self.ws_port}", timeout=5)
                     self.connected = True
                     print("✅ WebSocket CONECTADO")
                     
@@ -85,6 +100,7 @@ class BipedController:
                                 self.mode = data.get("mode", "idle")
                                 self.servo_angles = data.get("servos", [90]*6)
                                 self.servos_enabled = data.get("servos_enabled", True)
+                                self.publish_feedback()
                         except WebSocketConnectionClosedException:
                             self.connected = False
                             print("❌ WebSocket cerrado por el servidor")
@@ -98,10 +114,33 @@ class BipedController:
                         print(f"❌ WebSocket error: {e}")
                     self.connected = False
                     self.ws = None
+                self.publish_feedback()
                 time.sleep(retry_delay)
         
         threading.Thread(target=ws_loop, daemon=True).start()
     
+    def start_state_bridge(self):
+        """Reenviar al ESP32 cada nueva versión de consignas de la UI web"""
+        def bridge_loop():
+            last_version, _ = self.state.read_setpoints()
+            while self.running:
+                version, angles = self.state.wait_setpoints(last_version)
+                if version == last_version:
+                    continue
+                if not self.connected:
+                    time.sleep(0.1)
+                    continue
+                if self.set_all_servos([int(round(a)) for a in angles]):
+                    last_version = version
+        
+        threading.Thread(target=bridge_loop, daemon=True).start()
+    
+    def publish_feedback(self):
+        """Publicar el estado recibido del ESP32 en el backend compartido"""
+        if self.state is not None:
+            self.state.write_feedback(self.servo_angles, self.mode,
+                                      self.servos_enabled, self.connected)
+    
     def get_frame(self):
         with self.lock:
             return self.frame.copy() if self.frame is not None else None
@@ -185,8 +224,22 @@ def create_control_panel(controller):
     return panel
 
 def main():
+    parser = argparse.ArgumentParser(description="Controlador del robot bípedo")
     # ✅ ACTUALIZA ESTA IP con la que muestra el Monitor Serial
-    ESP32_IP = "10.181.145.31"
+    parser.add_argument("--ip", default="10.181.145.31")
+    parser.add_argument("--stream-url", default=None,
+                        help="URL del relay de cámara (camera_relay.py)")
+    parser.add_argument("--shared-state", default=None, metavar="NOMBRE",
+                        help="bloque de memoria compartida creado por main.py")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="captura, inferencia y visualización en procesos "
+                             "separados (pipeline.py)")
+    parser.add_argument("--model", default=None,
+                        help="modelo para la etapa de inferencia del pipeline")
+    parser.add_argument("--detections", default=Config.DETECTIONS_PATH,
+                        help="directorio del registro de detecciones del pipeline")
+    args = parser.parse_args()
+    ESP32_IP = args.ip
     
     print("\n" + "="*60)
     print("ROBOT BIPED - CONTROLADOR MEJORADO CON SYNC")
@@ -208,7 +261,21 @@ def main():
     except Exception as e:
         print(f"⚠️  No se pudo verificar ping: {e}")
     
-    controller = BipedController(ESP32_IP)
+    state = SharedStateBackend(args.shared_state) if args.shared_state else None
+    
+    if args.pipeline:
+        # Este proceso solo mantiene el WebSocket y supervisa las etapas
+        controller = BipedController(ESP32_IP, args.stream_url, state=state,
+                                     start_video=False)
+        Pipeline(controller.stream_url, args.model,
+                 detections_path=args.detections,
+                 state_name=args.shared_state).start().supervise()
+        controller.running = False
+        if state is not None:
+            state.close()
+        return
+    
+    controller = BipedController(ESP32_IP, args.stream_url, state=state)
     
     # Esperar conexiones
     print("\n⏳ Esperando conexiones (10s máximo)...")
@@ -355,6 +422,8 @@ def main():
         cv2.imshow(window_name, combined)
     
     controller.running = False
+    if state is not None:
+        state.close()
     cv2.destroyAllWindows()
     print("\n✅ Sistema detenido correctamente")
     print("👋 ¡Hasta pronto!\n")
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Relay de cámara: una sola conexión al ESP32-CAM, N consumidores locales
+
+El firmware del ESP32-CAM atiende un único cliente MJPEG a la vez. Este
+servicio mantiene esa conexión y reenvía los mismos bytes JPEG (sin
+recodificar) a cada suscriptor:
+
+    GET /stream.mjpg   MJPEG sobre HTTP (multipart/x-mixed-replace)
+    GET /ws            WebSocket, un mensaje binario por JPEG
+    GET /snapshot.jpg  último frame
+    GET /stats         JSON con fps de entrada y de cada cliente
+
+Los clientes lentos siempre reciben el frame más reciente: los intermedios
+se descartan en lugar de encolarse.
+"""
+import base64
+import hashlib
+import itertools
+import json
+import socket
+import struct
+import threading
+import time
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOUNDARY = "frame"
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class FrameHub:
+    """Último frame JPEG publicado, con número de secuencia"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.jpeg = None
+        self.timestamp = 0.0
+
+    def publish(self, jpeg):
+        with self.condition:
+            self.seq += 1
+            self.jpeg = jpeg
+            self.timestamp = time.time()
+            self.condition.notify_all()
+
+    def wait_newer(self, last_seq, timeout=1.0):
+        """
+        Esperar un frame posterior a last_seq
+
+        Returns:
+            (seq, jpeg) del frame más reciente, o (last_seq, None) si expira
+        """
+        with self.condition:
+            if self.seq <= last_seq:
+                self.condition.wait(timeout)
+            if self.seq <= last_seq:
+                return last_seq, None
+            return self.seq, self.jpeg
+
+
+class RateMeter:
+    """Frecuencia en una ventana deslizante de 1 segundo"""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.times = deque()
+
+    def tick(self, now=None):
+        now = now or time.monotonic()
+        self.times.append(now)
+        cutoff = now - self.window
+        while self.times and self.times[0] < cutoff:
+            self.times.popleft()
+
+    @property
+    def rate(self):
+        if not self.times:
+            return 0.0
+        if time.monotonic() - self.times[-1] > self.window:
+            return 0.0
+        return len(self.times) / self.window
+
+
+class ClientStats:
+    def __init__(self, client_id, kind, address):
+        self.id = client_id
+        self.kind = kind
+        self.address = address
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.meter = RateMeter()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "address": self.address,
+            "fps": round(self.meter.rate, 1),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "connected_s": round(time.time() - self.connected_at, 1),
+        }
+
+
+def iter_mjpeg(stream, chunk_size=4096):
+    """
+    Extraer JPEGs de un stream multipart/x-mixed-replace
+
+    Usa Content-Length si está presente (firmware del ESP32-CAM) y, si no,
+    busca los marcadores SOI/EOI de JPEG.
+    """
+    # read1 devuelve lo disponible sin esperar a llenar chunk_size
+    read = getattr(stream, "read1", stream.read)
+    buffer = b""
+    while True:
+        header_end = buffer.find(b"\r\n\r\n")
+        if header_end < 0:
+            chunk = read(chunk_size)
+            if not chunk:
+                return
+            buffer += chunk
+            continue
+
+        headers = buffer[:header_end].decode("latin-1", "replace").lower()
+        buffer = buffer[header_end + 4:]
+
+        length = None
+        for line in headers.split("\r\n"):
+            if line.startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+
+        if length is not None:
+            while len(buffer) < length:
+                chunk = read(max(chunk_size, length - len(buffer)))
+                if not chunk:
+                    return
+                buffer += chunk
+            yield buffer[:length]
+            buffer = buffer[length:]
+        else:
+            start = buffer.find(b"\xff\xd8")
+            end = buffer.find(b"\xff\xd9", max(start, 0))
+            while start < 0 or end < 0:
+                chunk = read(chunk_size)
+                if not chunk:
+                    return
+                buffer += chunk
+                start = buffer.find(b"\xff\xd8")
+                end = buffer.find(b"\xff\xd9", max(start, 0))
+            yield buffer[start:end + 2]
+            buffer = buffer[end + 2:]
+
+
+def _ws_frame(payload, opcode=0x2):
+    """Trama WebSocket servidor -> cliente (sin máscara)"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class CameraRelay:
+    """
+    Relay MJPEG/WebSocket para el stream del ESP32-CAM
+
+    Args:
+        upstream_url: URL MJPEG del ESP32 (http://<ip>/)
+        host: interfaz donde escuchar
+        port: puerto HTTP del relay
+    """
+
+    def __init__(self, upstream_url, host="0.0.0.0", port=8081):
+        self.upstream_url = upstream_url
+        self.host = host
+        self.port = port
+        self.hub = FrameHub()
+        self.running = False
+        self.upstream_connected = False
+        self.upstream_meter = RateMeter()
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._server = None
+
+    @property
+    def mjpeg_url(self):
+        return f"http://{self._public_host()}:{self.port}/stream.mjpg"
+
+    @property
+    def ws_url(self):
+        return f"ws://{self._public_host()}:{self.port}/ws"
+
+    def _public_host(self):
+        return "localhost" if self.host in ("0.0.0.0", "") else self.host
+
+    def start(self):
+        """Arrancar lector del ESP32 y servidor HTTP en hilos daemon"""
+        self.running = True
+        threading.Thread(target=self._upstream_loop, daemon=True).start()
+
+        handler = type("Handler", (_RelayHandler,), {"relay": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📡 Relay de cámara en {self.mjpeg_url} y {self.ws_url}")
+        return self
+
+    def stop(self):
+        self.running = False
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _upstream_loop(self):
+        retry_delay = 2
+        while self.running:
+            try:
+                print(f"📹 Relay conectando a {self.upstream_url}")
+                with urllib.request.urlopen(self.upstream_url, timeout=10) as stream:
+                    self.upstream_connected = True
+                    print("✅ Relay: stream del ESP32 abierto")
+                    for jpeg in iter_mjpeg(stream):
+                        if not self.running:
+                            break
+                        self.hub.publish(jpeg)
+                        self.upstream_meter.tick()
+            except Exception as e:
+                print(f"❌ Relay: error en stream del ESP32: {e}")
+            self.upstream_connected = False
+            time.sleep(retry_delay)
+
+    def register(self, kind, address):
+        stats = ClientStats(next(self._ids), kind, address)
+        with self.clients_lock:
+            self.clients[stats.id] = stats
+        return stats
+
+    def unregister(self, stats):
+        with self.clients_lock:
+            self.clients.pop(stats.id, None)
+
+    def serve_frames(self, stats, send):
+        """
+        Enviar frames a un cliente hasta que se desconecte
+
+        Args:
+            send: función que recibe los bytes JPEG y los escribe al socket
+        """
+        last_seq = self.hub.seq
+        try:
+            while self.running:
+                seq, jpeg = self.hub.wait_newer(last_seq)
+                if jpeg is None:
+                    continue
+                if last_seq and seq > last_seq + 1:
+                    stats.dropped += seq - last_seq - 1
+                last_seq = seq
+                send(jpeg)
+                stats.sent += 1
+                stats.meter.tick()
+        except (BrokenPipeError, ConnectionResetError, socket.timeout, OSError):
+            pass
+        finally:
+            self.unregister(stats)
+
+    def status(self):
+        """Estado del relay para /api/camera/status y /stats"""
+        with self.clients_lock:
+            clients = [c.to_dict() for c in self.clients.values()]
+        return {
+            "upstream": self.upstream_url,
+            "upstream_connected": self.upstream_connected,
+            "upstream_fps": round(self.upstream_meter.rate, 1),
+            "frame_seq": self.hub.seq,
+            "mjpeg_url": self.mjpeg_url,
+            "ws_url": self.ws_url,
+            "clients": clients,
+        }
+
+
+class _RelayHandler(BaseHTTPRequestHandler):
+    relay = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/stream.mjpg":
+            self._serve_mjpeg()
+        elif path == "/ws":
+            self._serve_websocket()
+        elif path == "/snapshot.jpg":
+            self._serve_snapshot()
+        elif path == "/stats":
+            self._send_json(self.relay.status())
+        else:
+            self._send_json({"error": "Ruta no encontrada"}, 404)
+
+    def _send_json(self, data, code=200):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve_snapshot(self):
+        jpeg = self.relay.hub.jpeg
+        if jpeg is None:
+            self._send_json({"error": "Sin frames"}, 503)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(jpeg)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(jpeg)
+
+    def _serve_mjpeg(self):
+        self.send_response(200)
+        self.send_header("Content-Type",
+                         f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(jpeg):
+            self.wfile.write(
+                f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+            )
+            self.wfile.write(jpeg)
+            self.wfile.write(b"\r\n")
+            self.wfile.flush()
+
+        stats = self.relay.register("mjpeg", self.client_address[0])
+        self.relay.serve_frames(stats, send)
+
+    def _serve_websocket(self):
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key or self.headers.get("Upgrade", "").lower() != "websocket":
+            self._send_json({"error": "Se esperaba WebSocket"}, 400)
+            return
+
+        accept = base64.b64encode(
+            hashlib.sha1((key + _WS_GUID).encode()).digest()
+        ).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.close_connection = True
+
+        def send(jpeg):
+            self.wfile.write(_ws_frame(jpeg))
+            self.wfile.flush()
+
+        stats = self.relay.register("websocket", self.client_address[0])
+        self.relay.serve_frames(stats, send)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Relay de cámara ESP32-CAM")
+    parser.add_argument("esp32_ip")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    relay = CameraRelay(f"http://{args.esp32_ip}/", port=args.port).start()
+    try:
+        while True:
+            time.sleep(5)
+            status = relay.status()
+            print(f"📊 Entrada: {status['upstream_fps']} fps | "
+                  f"Clientes: {len(status['clients'])}")
+    except KeyboardInterrupt:
+        relay.stop()
+
+
+if __name__ == "__main__":
+    main()
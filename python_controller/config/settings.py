@@ -4,6 +4,7 @@ class Config:
     ESP32_IP = "192.168.1.100"
     ESP32_PORT = 80
     WEBSOCKET_PORT = 8080
+    CAMERA_RELAY_PORT = 8081
     
     # Mapeo de servos
     SERVO_MAP = {
@@ -23,4 +24,40 @@ class Config:
         3: (-45, 45),
         4: (-60, 60),
         5: (-30, 30)
-    }
\ No newline at end of file
+    }
+    
+    # Dimensiones del bípedo (esp32_biped_cam/constants.h), en mm
+    LEG_L1 = 45.0  # Cadera-Rodilla
+    LEG_L2 = 55.0  # Rodilla-Tobillo
+    
+    # Parámetros de marcha (esp32_biped_cam/constants.h)
+    STEP_CLEARANCE = 20   # Altura levanta pie (mm)
+    STEP_HEIGHT = 85      # Altura cadera desde suelo (mm)
+    STEP_LENGTH = 30      # Longitud del paso (mm)
+    STEP_DURATION = 800   # Milisegundos por paso
+    
+    # Detección de minerales
+    DATASET_PATH = "datasets/"
+    MODEL_PATH = "models/mineral_detector.h5"
+    MODEL_BUNDLE_PATH = "models/mineral_bundle"
+    IMAGE_SIZE = (150, 150)
+    CONFIDENCE_THRESHOLD = 0.7
+    
+    # Telemetría (ring buffer en memoria)
+    TELEMETRY_RATE_HZ = 50     # Muestras por segundo
+    TELEMETRY_SECONDS = 600    # Historia retenida (10 min)
+    
+    # Ventana de fusión de actualizaciones de sliders
+    INGEST_WINDOW_MS = 20
+    
+    # Estado compartido UI web <-> controlador ("local" o "shm")
+    STATE_BACKEND = "local"
+    STATE_SHM_NAME = "biped_state"
+    
+    # Modelo de servo para simulación y auto-ajuste PID (control/servo_model.py)
+    SERVO_SPEED = 350.0          # Grados/s con PWM a fondo
+    SERVO_TIME_CONSTANT = 0.03   # Segundos
+    CONTROL_RATE_HZ = 200        # Frecuencia del lazo PID simulado
+    
+    # Registro de detecciones (ai/detection_store.py)
+    DETECTIONS_PATH = "detections/"
@@ -0,0 +1,5 @@
+"""Módulo de control del bípedo (cinemática, marcha y servos)"""
+from .kinematics import LegIK, GaitGenerator, IKTable
+from .servo_model import ServoModel, ServoSimulator
+
+__all__ = ['LegIK', 'GaitGenerator', 'IKTable', 'ServoModel', 'ServoSimulator']
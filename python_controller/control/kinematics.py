@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Cinemática inversa vectorizada y generador de marcha
+
+Modelo plano (sagital) de cada pierna con las dimensiones de
+esp32_biped_cam/constants.h:
+
+    cadera ──L1── rodilla ──L2── tobillo
+
+Coordenadas del pie relativas a la cadera en mm: x hacia delante, z hacia
+abajo (z = STEP_HEIGHT con el pie en el suelo). Los ángulos se expresan en
+grados respecto a la posición neutra del servo (90°), que corresponde a la
+postura de pie del firmware (comando "stand": pie bajo la cadera a
+STEP_HEIGHT):
+
+    hip:   inclinación del muslo (+ hacia delante)
+    knee:  flexión de la rodilla (+ más flexionada)
+    ankle: compensación para mantener el pie paralelo al suelo
+
+Benchmark:
+    python control/kinematics.py --poses 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+
+JOINTS = ("hip", "knee", "ankle")
+SERVO_NEUTRAL = 90.0
+
+
+def _leg_limits(side):
+    """Límites (3, 2) en grados de una pierna según Config.SERVO_LIMITS"""
+    return np.array([Config.SERVO_LIMITS[Config.SERVO_MAP[f"{side}_{joint}"]]
+                     for joint in JOINTS], dtype=np.float64)
+
+
+class LegIK:
+    """
+    Cinemática inversa de una pierna de 2 eslabones + tobillo
+
+    Args:
+        l1: longitud cadera-rodilla (mm)
+        l2: longitud rodilla-tobillo (mm)
+        limits: array (3, 2) de límites [min, max] por articulación (grados)
+        home: posición (x, z) del pie con todos los servos en neutro
+    """
+
+    def __init__(self, l1=Config.LEG_L1, l2=Config.LEG_L2, limits=None,
+                 home=(0.0, Config.STEP_HEIGHT)):
+        self.l1 = float(l1)
+        self.l2 = float(l2)
+        self.limits = np.asarray(limits if limits is not None
+                                 else _leg_limits("left"), dtype=np.float64)
+        self.home = np.zeros(3)
+        if home is not None:
+            self.home = self._solve_absolute(*home)[0]
+
+    def _solve_absolute(self, x, z):
+        """Ángulos absolutos (muslo desde la vertical, flexión, tobillo)"""
+        x = np.asarray(x, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        r2 = x * x + z * z
+
+        cos_knee = (r2 - self.l1 ** 2 - self.l2 ** 2) / (2 * self.l1 * self.l2)
+        unreachable = np.abs(cos_knee) > 1.0
+        knee = np.arccos(np.clip(cos_knee, -1.0, 1.0))
+
+        hip = np.arctan2(x, z) + np.arctan2(self.l2 * np.sin(knee),
+                                            self.l1 + self.l2 * np.cos(knee))
+        ankle = knee - hip
+        return np.degrees(np.stack((hip, knee, ankle), axis=-1)), unreachable
+
+    def solve(self, x, z, clamp=True):
+        """
+        Resolver ángulos para uno o muchos puntos del pie
+
+        Args:
+            x, z: escalares o arrays de igual forma (mm)
+            clamp: recortar a los límites de los servos
+
+        Returns:
+            (angles, infeasible): angles (..., 3) en grados [hip, knee, ankle];
+            infeasible (...) True si el punto está fuera de alcance o requiere
+            ángulos fuera de límites
+        """
+        angles, unreachable = self._solve_absolute(x, z)
+        angles -= self.home
+        out_of_limits = ((angles < self.limits[:, 0])
+                         | (angles > self.limits[:, 1])).any(axis=-1)
+        if clamp:
+            np.clip(angles, self.limits[:, 0], self.limits[:, 1], out=angles)
+
+        return angles, unreachable | out_of_limits
+
+    def forward(self, angles):
+        """Posición (x, z) del tobillo para ángulos (..., 3) en grados"""
+        absolute = np.asarray(angles) + self.home
+        hip = np.radians(absolute[..., 0])
+        shin = hip - np.radians(absolute[..., 1])
+        x = self.l1 * np.sin(hip) + self.l2 * np.sin(shin)
+        z = self.l1 * np.cos(hip) + self.l2 * np.cos(shin)
+        return x, z
+
+
+def to_servo(angles):
+    """Ángulos articulares (grados, 0 = neutro) -> comandos de servo 0-180"""
+    return np.clip(SERVO_NEUTRAL + np.asarray(angles), 0.0, 180.0)
+
+
+class IKTable:
+    """
+    Tabla precalculada de IK sobre una rejilla (x, z) del espacio de trabajo
+
+    La consulta toma la celda más cercana con aritmética entera: un
+    producto-suma por eje, un índice plano y un gather, sin trigonometría
+    ni interpolación. Con la resolución por defecto (0.25 mm) el error
+    frente a LegIK.solve queda por debajo de 0.4° en el 99 % de los puntos,
+    menos que la resolución de 1° de los servos.
+
+    La rejilla lleva un borde de celdas no factibles, así que los puntos
+    fuera del rango caen en él sin comparaciones adicionales.
+    """
+
+    def __init__(self, leg_ik, x_range=(-60.0, 60.0), z_range=(40.0, 100.0),
+                 resolution=0.25):
+        self.leg_ik = leg_ik
+        self.resolution = r = float(resolution)
+        x0, x1 = x_range
+        z0, z1 = z_range
+
+        xs = np.arange(x0 - r, x1 + 1.5 * r, r)
+        zs = np.arange(z0 - r, z1 + 1.5 * r, r)
+        grid_x, grid_z = np.meshgrid(xs, zs)
+        angles, infeasible = leg_ik.solve(grid_x, grid_z)
+        infeasible[0, :] = infeasible[-1, :] = True
+        infeasible[:, 0] = infeasible[:, -1] = True
+        self.shape = grid_x.shape
+
+        # Tablas planas: un único índice entero por celda
+        self._angles = angles.reshape(-1, 3).astype(np.float32)
+        self._infeasible = infeasible.ravel()
+        # índice = floor(v * scale + offset) redondea a la celda más cercana
+        self._scale = 1.0 / r
+        self._x_offset = (r - x0) / r + 0.5
+        self._z_offset = (r - z0) / r + 0.5
+
+    def lookup(self, x, z):
+        """
+        Ángulos de la celda más cercana para puntos (x, z)
+
+        Returns:
+            (angles (..., 3) float32, infeasible (...)); los puntos fuera de
+            la rejilla se marcan como no factibles
+        """
+        rows, cols = self.shape
+        ix = np.clip((np.asarray(x) * self._scale + self._x_offset).astype(np.intp),
+                     0, cols - 1)
+        iz = np.clip((np.asarray(z) * self._scale + self._z_offset).astype(np.intp),
+                     0, rows - 1)
+        idx = iz * cols + ix
+        return self._angles[idx], self._infeasible[idx]
+
+
+class GaitGenerator:
+    """
+    Trayectorias de pie y ángulos de servo para la marcha
+
+    Ciclo completo = 2 pasos (uno por pierna) de STEP_DURATION ms. Cada pie
+    pasa medio ciclo en apoyo (se desplaza hacia atrás a ras de suelo) y
+    medio en vuelo (avanza levantándose STEP_CLEARANCE mm).
+    """
+
+    def __init__(self, step_length=Config.STEP_LENGTH,
+                 clearance=Config.STEP_CLEARANCE, height=Config.STEP_HEIGHT,
+                 step_duration_ms=Config.STEP_DURATION):
+        self.step_length = float(step_length)
+        self.clearance = float(clearance)
+        self.height = float(height)
+        self.cycle_ms = 2.0 * step_duration_ms
+        self.legs = {side: LegIK(limits=_leg_limits(side))
+                     for side in ("left", "right")}
+
+    def foot_trajectory(self, phase):
+        """Posición (x, z) del pie para fases en [0, 1)"""
+        phase = np.mod(np.asarray(phase, dtype=np.float64), 1.0)
+        stance = phase < 0.5
+        s = np.where(stance, phase, phase - 0.5) * 2.0
+        half = self.step_length / 2.0
+
+        x = np.where(stance, half - self.step_length * s,
+                     -half + self.step_length * s)
+        z = np.where(stance, self.height,
+                     self.height - self.clearance * np.sin(np.pi * s))
+        return x, z
+
+    def phases(self, t_ms):
+        """Fases (izquierda, derecha) en el instante t_ms"""
+        left = np.mod(np.asarray(t_ms, dtype=np.float64) / self.cycle_ms, 1.0)
+        return left, np.mod(left + 0.5, 1.0)
+
+    def servo_angles(self, t_ms):
+        """
+        Comandos de servo para uno o muchos instantes
+
+        Returns:
+            (servos (..., 6) en el orden de Config.SERVO_MAP,
+             infeasible (..., 2) por pierna [izquierda, derecha])
+        """
+        t_ms = np.asarray(t_ms, dtype=np.float64)
+        servos = np.empty(t_ms.shape + (6,))
+        infeasible = np.empty(t_ms.shape + (2,), dtype=bool)
+
+        for leg_index, (side, phase) in enumerate(zip(("left", "right"),
+                                                      self.phases(t_ms))):
+            angles, bad = self.legs[side].solve(*self.foot_trajectory(phase))
+            for j, joint in enumerate(JOINTS):
+                servos[..., Config.SERVO_MAP[f"{side}_{joint}"]] = angles[..., j]
+            infeasible[..., leg_index] = bad
+
+        return to_servo(servos), infeasible
+
+    def build_table(self, samples=400):
+        """Precalcular un ciclo completo para evaluación rápida"""
+        return GaitTable(self, samples)
+
+
+class GaitTable:
+    """Ciclo de marcha precalculado con interpolación lineal por fase"""
+
+    def __init__(self, gait, samples=400):
+        self.cycle_ms = gait.cycle_ms
+        self.samples = samples
+        t = np.arange(samples + 1) * (gait.cycle_ms / samples)
+        self.servos, self.infeasible = gait.servo_angles(t)
+
+    def angles_at(self, t_ms):
+        """Comandos de servo (..., 6) para instantes t_ms"""
+        pos = np.mod(np.asarray(t_ms, dtype=np.float64), self.cycle_ms)
+        pos *= self.samples / self.cycle_ms
+        i = np.minimum(pos.astype(np.intp), self.samples - 1)
+        frac = (pos - i)[..., None]
+        return self.servos[i] * (1 - frac) + self.servos[i + 1] * frac
+
+
+def benchmark(poses=100_000, repeats=5):
+    """
+    Medir poses/ms de cada método
+
+    Returns:
+        dict {método: poses por milisegundo}
+    """
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-40, 40, poses)
+    z = rng.uniform(50, 95, poses)
+    t = rng.uniform(0, 10_000, poses)
+
+    leg = LegIK()
+    table = IKTable(leg)
+    gait = GaitGenerator()
+    gait_table = gait.build_table()
+
+    def rate(fn):
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        elapsed_ms = (time.perf_counter() - start) * 1000 / repeats
+        return poses / elapsed_ms
+
+    return {
+        "leg_ik_solve": rate(lambda: leg.solve(x, z)),
+        "ik_table_lookup": rate(lambda: table.lookup(x, z)),
+        "gait_servo_angles": rate(lambda: gait.servo_angles(t)),
+        "gait_table_lookup": rate(lambda: gait_table.angles_at(t)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cinemática inversa")
+    parser.add_argument("--poses", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    gait = GaitGenerator()
+    _, infeasible = gait.servo_angles(np.linspace(0, gait.cycle_ms, 200,
+                                                  endpoint=False))
+    print(f"🦿 Piernas: L1={Config.LEG_L1} mm, L2={Config.LEG_L2} mm, "
+          f"altura={Config.STEP_HEIGHT} mm")
+    print(f"   Puntos de marcha fuera de límites: "
+          f"{infeasible.any(axis=-1).mean():.0%}")
+
+    print("=" * 60)
+    print(f"BENCHMARK IK ({args.poses} poses)")
+    print("=" * 60)
+    for name, value in benchmark(args.poses, args.repeats).items():
+        print(f"  {name:<20} {value:>12.0f} poses/ms")
+
+
+if __name__ == "__main__":
+    main()
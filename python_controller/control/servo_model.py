@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Modelo discreto de servo + PID, vectorizado con NumPy
+
+Planta por articulación (motor con lazo de velocidad de primer orden):
+
+    ω' = (SERVO_SPEED · u - ω) / SERVO_TIME_CONSTANT
+    θ' = ω
+
+con u ∈ [-1, 1] la salida del PID, enviada como PWM de 1000-2000 us
+(1500 = reposo). Todos los estados tienen forma (..., 6), así que un lote
+de N ganancias candidatas simula N x 6 respuestas al escalón a la vez.
+
+Auto-ajuste:
+    relay: ensayo de relé (Åström-Hägglund) + Ziegler-Nichols
+    cem:   método de entropía cruzada sobre (kp, ki, kd) en escala log
+
+    python control/servo_model.py --method cem --candidates 4096
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+
+NUM_SERVOS = 6
+PWM_CENTER = 1500.0
+PWM_SPAN = 500.0
+
+# Límites de búsqueda (log10) de kp, ki, kd
+GAIN_BOUNDS = np.array([[-2.0, 1.0], [-3.0, 1.0], [-4.0, -0.5]])
+
+
+def to_pwm(u):
+    """Salida del PID [-1, 1] -> ancho de pulso en us"""
+    return PWM_CENTER + PWM_SPAN * np.asarray(u)
+
+
+class ServoModel:
+    """
+    Planta + PID discretos para arrays de articulaciones
+
+    Args:
+        dt: periodo de control (s)
+        speed: velocidad máxima con u = 1 (grados/s)
+        time_constant: constante de tiempo del lazo de velocidad (s)
+    """
+
+    def __init__(self, dt=None, speed=Config.SERVO_SPEED,
+                 time_constant=Config.SERVO_TIME_CONSTANT):
+        self.dt = dt or 1.0 / Config.CONTROL_RATE_HZ
+        self.speed = np.asarray(speed, dtype=np.float64)
+        self.alpha = self.dt / float(time_constant)
+
+    def simulate(self, gains, setpoint, duration=1.0, start=0.0, record=False):
+        """
+        Respuesta al escalón start -> setpoint para lotes de ganancias
+
+        Args:
+            gains: array (..., 3) o (..., 6, 3) con [kp, ki, kd]
+            setpoint: escalar o array broadcastable a (..., 6) (grados)
+            duration: segundos simulados
+            record: devolver también la trayectoria de ángulos
+
+        Returns:
+            dict de arrays (..., 6): itae, overshoot (fracción del escalón),
+            settling (s, banda del 2 %), effort, final_error, y opcionalmente
+            angles (pasos, ..., 6)
+        """
+        gains = np.asarray(gains, dtype=np.float64)
+        if gains.ndim == 1 or gains.shape[-2] != NUM_SERVOS:
+            gains = gains[..., None, :]
+        kp, ki, kd = gains[..., 0], gains[..., 1], gains[..., 2]
+        shape = np.broadcast_shapes(kp.shape, np.shape(setpoint), (NUM_SERVOS,))
+
+        setpoint = np.broadcast_to(np.asarray(setpoint, dtype=np.float64), shape)
+        step = np.where(np.abs(setpoint - start) > 1e-9, np.abs(setpoint - start), 1.0)
+        band = 0.02 * step
+
+        theta = np.full(shape, float(start))
+        omega = np.zeros(shape)
+        integral = np.zeros(shape)
+        itae = np.zeros(shape)
+        effort = np.zeros(shape)
+        peak = np.zeros(shape)
+        last_outside = np.zeros(shape)
+        direction = np.sign(setpoint - start)
+
+        steps = int(round(duration / self.dt))
+        trace = np.empty((steps,) + shape) if record else None
+        dt, alpha, speed = self.dt, self.alpha, self.speed
+
+        for k in range(steps):
+            error = setpoint - theta
+            # Derivada sobre la medida (sin pico al cambiar la consigna)
+            u = kp * error + ki * integral - kd * omega
+            saturated = np.abs(u) >= 1.0
+            np.clip(u, -1.0, 1.0, out=u)
+            # Anti-windup: no integrar mientras la salida está saturada
+            integral += np.where(saturated, 0.0, error * dt)
+
+            omega += alpha * (speed * u - omega)
+            theta += omega * dt
+
+            t = (k + 1) * dt
+            abs_error = np.abs(setpoint - theta)
+            itae += t * abs_error * dt
+            effort += u * u * dt
+            np.maximum(peak, (theta - setpoint) * direction, out=peak)
+            last_outside = np.where(abs_error > band, t, last_outside)
+            if record:
+                trace[k] = theta
+
+        result = {
+            "itae": itae / step,
+            "overshoot": peak / step,
+            "settling": last_outside,
+            "effort": effort,
+            "final_error": np.abs(setpoint - theta),
+        }
+        if record:
+            result["angles"] = trace
+        return result
+
+    def relay_test(self, amplitude=0.5, setpoint=20.0, duration=2.0):
+        """
+        Ensayo de relé: u = ±amplitude según el signo del error
+
+        Returns:
+            (ku, pu) ganancia y periodo críticos (6,)
+        """
+        theta = np.zeros(NUM_SERVOS)
+        omega = np.zeros(NUM_SERVOS)
+        steps = int(round(duration / self.dt))
+        errors = np.empty((steps, NUM_SERVOS))
+        for k in range(steps):
+            error = setpoint - theta
+            u = amplitude * np.sign(error)
+            omega += self.alpha * (self.speed * u - omega)
+            theta += omega * self.dt
+            errors[k] = error
+
+        # Descartar el transitorio y medir el ciclo límite
+        tail = errors[steps // 2:]
+        a = (tail.max(axis=0) - tail.min(axis=0)) / 2
+        ku = 4 * amplitude / (np.pi * np.maximum(a, 1e-9))
+
+        signs = np.signbit(tail)
+        pu = np.empty(NUM_SERVOS)
+        for j in range(NUM_SERVOS):
+            crossings = np.flatnonzero(signs[1:, j] != signs[:-1, j])
+            pu[j] = (2 * np.mean(np.diff(crossings)) * self.dt
+                     if len(crossings) > 2 else np.nan)
+        return ku, pu
+
+
+def cost(metrics):
+    """Coste escalar por respuesta: ITAE + sobrepaso + esfuerzo"""
+    return (metrics["itae"] + 2.0 * metrics["overshoot"]
+            + 0.5 * metrics["settling"] + 0.01 * metrics["effort"]
+            + 10.0 * (metrics["final_error"] > 0.5))
+
+
+def relay_tune(model=None, amplitude=0.5, setpoint=20.0):
+    """
+    Ganancias Ziegler-Nichols (PID clásico) desde el ensayo de relé
+
+    Returns:
+        array (6, 3) con [kp, ki, kd] por articulación
+    """
+    model = model or ServoModel()
+    ku, pu = model.relay_test(amplitude, setpoint)
+    return np.stack((0.6 * ku, 1.2 * ku / pu, 0.075 * ku * pu), axis=-1)
+
+
+def cem_tune(model=None, setpoint=20.0, candidates=4096, iterations=8,
+             elite_fraction=0.05, duration=0.6, seed=0):
+    """
+    Búsqueda por entropía cruzada de [kp, ki, kd] en escala log10
+
+    Cada iteración simula `candidates` x 6 respuestas al escalón en paralelo.
+
+    Returns:
+        (gains (6, 3), info) con coste, métricas y respuestas/seg
+    """
+    model = model or ServoModel()
+    rng = np.random.default_rng(seed)
+    low, high = GAIN_BOUNDS[:, 0], GAIN_BOUNDS[:, 1]
+    mean = np.tile((low + high) / 2, (NUM_SERVOS, 1))
+    std = np.tile((high - low) / 2, (NUM_SERVOS, 1))
+    n_elite = max(2, int(candidates * elite_fraction))
+    # Con menos candidatos que élite la media saldría vacía (NaN)
+    candidates = max(int(candidates), n_elite)
+
+    simulated = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        samples = np.clip(rng.normal(mean, std, (candidates, NUM_SERVOS, 3)),
+                          low, high)
+        costs = cost(model.simulate(10.0 ** samples, setpoint, duration))
+        simulated += costs.size
+
+        elite = np.take_along_axis(samples, np.argsort(costs, axis=0)[:n_elite, :, None],
+                                   axis=0)
+        mean = elite.mean(axis=0)
+        std = elite.std(axis=0) + 1e-3
+    elapsed = time.perf_counter() - start
+
+    gains = 10.0 ** mean
+    metrics = model.simulate(gains, setpoint, duration)
+    return gains, {
+        "cost": cost(metrics).tolist(),
+        "metrics": {k: v.tolist() for k, v in metrics.items()},
+        "responses": simulated,
+        "responses_per_sec": simulated / elapsed,
+    }
+
+
+class ServoSimulator:
+    """
+    Estado continuo de las 6 articulaciones para la telemetría sin robot
+
+    advance() integra el lazo PID con las consignas y ganancias actuales y
+    devuelve ángulos, errores de seguimiento y PWM.
+    """
+
+    def __init__(self, model=None, initial=90.0):
+        self.model = model or ServoModel()
+        self.theta = np.full(NUM_SERVOS, float(initial))
+        self.omega = np.zeros(NUM_SERVOS)
+        self.integral = np.zeros(NUM_SERVOS)
+        self.u = np.zeros(NUM_SERVOS)
+        self.setpoints = self.theta.copy()
+
+    def advance(self, setpoints, gains, duration):
+        """
+        Simular `duration` segundos
+
+        Args:
+            setpoints: (6,) grados
+            gains: (6, 3) [kp, ki, kd]
+        """
+        m = self.model
+        self.setpoints = np.asarray(setpoints, dtype=np.float64)
+        gains = np.asarray(gains, dtype=np.float64)
+        kp, ki, kd = gains[:, 0], gains[:, 1], gains[:, 2]
+
+        for _ in range(max(1, int(round(duration / m.dt)))):
+            error = self.setpoints - self.theta
+            u = kp * error + ki * self.integral - kd * self.omega
+            saturated = np.abs(u) >= 1.0
+            self.u = np.clip(u, -1.0, 1.0)
+            self.integral += np.where(saturated, 0.0, error * m.dt)
+            self.omega += m.alpha * (m.speed * self.u - self.omega)
+            self.theta += self.omega * m.dt
+        return self.sample()
+
+    def sample(self):
+        """Último estado en el formato de /api/telemetry"""
+        return {
+            "angles": self.theta.tolist(),
+            "errors": (self.setpoints - self.theta).tolist(),
+            "pwm": to_pwm(self.u).tolist(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auto-ajuste PID de los servos")
+    parser.add_argument("--method", choices=("cem", "relay"), default="cem")
+    parser.add_argument("--candidates", type=int, default=4096)
+    parser.add_argument("--iterations", type=int, default=8)
+    parser.add_argument("--setpoint", type=float, default=20.0,
+                        help="amplitud del escalón (grados)")
+    args = parser.parse_args()
+
+    model = ServoModel()
+    print(f"⚙️  Planta: {Config.SERVO_SPEED}°/s, tau={Config.SERVO_TIME_CONSTANT} s, "
+          f"dt={model.dt * 1000:.1f} ms")
+
+    if args.method == "relay":
+        gains = relay_tune(model, setpoint=args.setpoint)
+        info = None
+    else:
+        gains, info = cem_tune(model, args.setpoint, args.candidates, args.iterations)
+
+    metrics = model.simulate(gains, args.setpoint, duration=1.0)
+    print("=" * 60)
+    print(f"GANANCIAS ({args.method})")
+    print("=" * 60)
+    for i, (kp, ki, kd) in enumerate(gains):
+        print(f"  servo{i + 1}: kp={kp:.4f} ki={ki:.4f} kd={kd:.5f}  "
+              f"sobrepaso={metrics['overshoot'][i]:.1%} "
+              f"establecimiento={metrics['settling'][i] * 1000:.0f} ms")
+    if info:
+        print(f"\n  {info['responses']} respuestas simuladas, "
+              f"{info['responses_per_sec']:.0f} respuestas/seg")
+
+
+if __name__ == "__main__":
+    main()
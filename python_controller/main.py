@@ -1,71 +1,163 @@
 from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
+import atexit
 import json
 import time
-from threading import Lock
-import random
+from threading import Thread
+import os
+
+import numpy as np
+
+from config.settings import Config
+from camera_relay import CameraRelay
+from biped_controller import BipedController
+from shared_state import open_backend
+from control.servo_model import ServoSimulator, cem_tune, relay_tune
+from state_store import ServoStateStore, SetpointIngestor, etag
+from telemetry_store import TelemetryStore, CHANNELS
 
 app = Flask(__name__)
-CORS(app)
+# ETag visible para la UI y preflight cacheado (If-None-Match no es simple)
+CORS(app, expose_headers=['ETag'], max_age=600)
 
-# Estado global de los servos (6 servos)
-servo_state = {
+# Estado global de los servos (6 servos), versionado
+servo_state = ServoStateStore({
     'servo1': {'angle': 90, 'kp': 1.0, 'ki': 0.0, 'kd': 0.0},
     'servo2': {'angle': 90, 'kp': 1.0, 'ki': 0.0, 'kd': 0.0},
     'servo3': {'angle': 90, 'kp': 1.0, 'ki': 0.0, 'kd': 0.0},
     'servo4': {'angle': 90, 'kp': 1.0, 'ki': 0.0, 'kd': 0.0},
     'servo5': {'angle': 90, 'kp': 1.0, 'ki': 0.0, 'kd': 0.0},
     'servo6': {'angle': 90, 'kp': 1.0, 'ki': 0.0, 'kd': 0.0}
-}
+})
+
+# Backend compartido con BipedController (shared_state.py); se crea al
+# arrancar el servidor
+state_backend = None
+robot = None
+
+def publish_setpoints(changes):
+    """
+    Enviar los ángulos actuales al ESP32 si el diff cambia alguno
+
+    Returns:
+        diff {servo_id: {'angle': valor}} realmente enviado (vacío si no hay
+        backend o el diff solo cambia ganancias)
+    """
+    sent = {servo_id: {'angle': values['angle']}
+            for servo_id, values in changes.items() if 'angle' in values}
+    if state_backend is None or not sent:
+        return {}
+    state_backend.write_setpoints(servo_state.angles(), servo_state.version)
+    return sent
+
+# Actualizaciones de sliders fusionadas por ventana
+ingestor = SetpointIngestor(servo_state, window=Config.INGEST_WINDOW_MS / 1000,
+                            forward=publish_setpoints)
 
 # Variables para la cámara WebSocket
 camera_available = False
 camera_url = "ws://localhost:8765"  # URL del WebSocket de Python
 
-state_lock = Lock()
+# Relay que comparte la única conexión MJPEG del ESP32-CAM
+camera_relay = None
+
+DEBUG = True
+
+# Historia de telemetría a frecuencia de control
+telemetry = TelemetryStore(capacity=Config.TELEMETRY_RATE_HZ * Config.TELEMETRY_SECONDS)
+
+# Lazo PID simulado con las ganancias de la UI mientras no hay robot
+servo_sim = ServoSimulator()
+
+def angle_to_pwm(angle):
+    """Ancho de pulso (us) del comando de servo, 0-180° -> 1000-2000"""
+    return 1000 + angle / 180.0 * 1000
+
+def read_feedback():
+    """Realimentación del ESP32, o None si no hay conexión"""
+    if state_backend is None:
+        return None
+    feedback = state_backend.read_feedback()
+    return feedback if feedback['connected'] else None
+
+def telemetry_sample(dt=None):
+    """
+    Ángulos, error de seguimiento (consigna - real) y PWM
+
+    Sin realimentación del ESP32 los valores salen del modelo de servo
+    (control/servo_model.py), avanzado dt segundos con las ganancias actuales.
+    """
+    setpoints = servo_state.angles()
+    feedback = read_feedback()
+    if feedback is None:
+        if dt is None:
+            return servo_sim.sample()
+        return servo_sim.advance(setpoints, servo_state.gains(), dt)
+
+    angles = feedback['angles']
+    return {
+        'angles': angles,
+        'errors': [s - a for s, a in zip(setpoints, angles)],
+        'pwm': [angle_to_pwm(a) for a in angles]
+    }
+
+def telemetry_loop():
+    """Muestrear el estado de los servos a TELEMETRY_RATE_HZ"""
+    period = 1.0 / Config.TELEMETRY_RATE_HZ
+    next_sample = time.time()
+    while True:
+        telemetry.append(next_sample, **telemetry_sample(period))
+        next_sample += period
+        time.sleep(max(0.0, next_sample - time.time()))
+
+def changes_response(version, changes):
+    return jsonify({'version': servo_state.token(version), 'changes': changes})
 
 # Endpoint para obtener el estado de todos los servos
+# ?since=<época>-<versión> devuelve solo el diff desde esa versión; con un
+# token de otro arranque del servidor se devuelve el estado completo
 @app.route('/api/servos', methods=['GET'])
 def get_servos():
-    with state_lock:
-        return jsonify(servo_state)
+    since = request.args.get('since')
+    if since is not None:
+        token, changes = servo_state.changes_since(since)
+        if changes is not None:
+            return jsonify({'version': token, 'changes': changes})
+
+    version, body = servo_state.snapshot_json()
+    tag = etag(servo_state.token(version))
+    if tag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers={'ETag': tag})
+    return Response(body, mimetype='application/json', headers={'ETag': tag})
 
 # Endpoint para actualizar un servo específico
+# Se encola y se aplica junto con el resto de sliders en la siguiente ventana
 @app.route('/api/servo/<servo_id>', methods=['POST'])
 def update_servo(servo_id):
     if servo_id not in servo_state:
         return jsonify({'error': 'Servo no encontrado'}), 404
     
-    data = request.json
-    with state_lock:
-        if 'angle' in data:
-            servo_state[servo_id]['angle'] = max(0, min(180, data['angle']))
-        if 'kp' in data:
-            servo_state[servo_id]['kp'] = data['kp']
-        if 'ki' in data:
-            servo_state[servo_id]['ki'] = data['ki']
-        if 'kd' in data:
-            servo_state[servo_id]['kd'] = data['kd']
-    
-    return jsonify(servo_state[servo_id])
+    try:
+        ingestor.submit(servo_id, request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'status': 'queued'}), 202
+
+# Contadores de la ingesta de sliders
+@app.route('/api/servos/ingest', methods=['GET'])
+def ingest_stats():
+    return jsonify(ingestor.stats())
 
 # Endpoint para actualizar múltiples servos (movimiento de piernas)
+# Acepta un diff {servo_id: {campo: valor}} y devuelve el diff efectivo
 @app.route('/api/servos/batch', methods=['POST'])
 def update_servos_batch():
-    data = request.json
-    with state_lock:
-        for servo_id, values in data.items():
-            if servo_id in servo_state:
-                if 'angle' in values:
-                    servo_state[servo_id]['angle'] = max(0, min(180, values['angle']))
-                if 'kp' in values:
-                    servo_state[servo_id]['kp'] = values['kp']
-                if 'ki' in values:
-                    servo_state[servo_id]['ki'] = values['ki']
-                if 'kd' in values:
-                    servo_state[servo_id]['kd'] = values['kd']
-    
-    return jsonify(servo_state)
+    try:
+        version, changes = servo_state.apply(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    publish_setpoints(changes)
+    return changes_response(version, changes)
 
 # Comando de movimiento (W, S, A, D, etc.)
 @app.route('/api/command', methods=['POST'])
@@ -103,28 +195,86 @@ def command():
     }
     
     if cmd in movements:
-        with state_lock:
-            for servo_id, values in movements[cmd].items():
-                servo_state[servo_id].update(values)
-        return jsonify({'status': 'ok', 'command': cmd, 'servos': servo_state})
+        version, changes = servo_state.apply(movements[cmd])
+        publish_setpoints(changes)
+        return jsonify({'status': 'ok', 'command': cmd,
+                        'version': servo_state.token(version), 'changes': changes})
     
     return jsonify({'error': 'Comando no válido'}), 400
 
 # Endpoint para obtener datos de telemetría (para gráficas)
 @app.route('/api/telemetry', methods=['GET'])
 def get_telemetry():
-    # Datos simulados para las gráficas
-    telemetry = {
-        'timestamp': time.time(),
-        'angles': [servo_state[f'servo{i}']['angle'] for i in range(1, 7)],
-        'errors': [random.uniform(-5, 5) for _ in range(6)],
-        'pwm': [random.randint(1000, 2000) for _ in range(6)]
-    }
-    return jsonify(telemetry)
+    sample = telemetry.latest()
+    if 'angles' not in sample:
+        sample.update(telemetry_sample())
+    return jsonify(sample)
+
+# Auto-ajuste de kp/ki/kd sobre el modelo de servo: {"method": "cem"|"relay"}
+@app.route('/api/servos/autotune', methods=['POST'])
+def autotune():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    method = data.get('method', 'cem')
+    if method == 'relay':
+        gains, info = relay_tune(), {}
+    elif method == 'cem':
+        try:
+            candidates = int(data.get('candidates', 1024))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'candidates debe ser un entero'}), 400
+        # cem_tune necesita al menos 2 candidatos élite por iteración
+        gains, info = cem_tune(candidates=min(max(candidates, 2), 8192))
+    else:
+        return jsonify({'error': 'Método no válido'}), 400
+
+    # El ensayo de relé da NaN si no llega a oscilar
+    if not np.all(np.isfinite(gains)):
+        return jsonify({'error': 'El auto-ajuste no encontró ganancias válidas',
+                        'method': method}), 422
+
+    updates = {f'servo{i + 1}': {'kp': round(float(kp), 4), 'ki': round(float(ki), 4),
+                                 'kd': round(float(kd), 5)}
+               for i, (kp, ki, kd) in enumerate(gains)}
+    version, changes = servo_state.apply(updates)
+    return jsonify({'version': servo_state.token(version), 'changes': changes,
+                    'method': method,
+                    'responses_per_sec': info.get('responses_per_sec')})
+
+# Historia diezmada para las gráficas: ?channel=angles&seconds=60&points=300
+@app.route('/api/telemetry/range', methods=['GET'])
+def get_telemetry_range():
+    channel = request.args.get('channel', 'angles')
+    if channel not in CHANNELS:
+        return jsonify({'error': 'Canal no válido'}), 400
+
+    try:
+        end = request.args.get('end', type=float) or time.time()
+        start = request.args.get('start', type=float)
+        if start is None:
+            start = end - request.args.get('seconds', 60.0, type=float)
+        points = min(max(request.args.get('points', 300, type=int), 2), 5000)
+        result = telemetry.query(channel, start, end, points,
+                                 request.args.get('method', 'minmax'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(result)
 
 # Endpoint para verificar disponibilidad de cámara WebSocket
 @app.route('/api/camera/status', methods=['GET'])
 def camera_status():
+    if camera_relay is not None:
+        relay = camera_relay.status()
+        return jsonify({
+            'available': relay['upstream_connected'],
+            'url': relay['ws_url'],
+            'mjpeg_url': relay['mjpeg_url'],
+            'upstream_fps': relay['upstream_fps'],
+            'clients': relay['clients']
+        })
+    
     return jsonify({
         'available': camera_available,
         'url': camera_url if camera_available else None
@@ -135,15 +285,30 @@ def camera_status():
 def stream():
     def generate():
         while True:
-            with state_lock:
-                data = {
-                    'servos': servo_state,
-                    'timestamp': time.time()
-                }
-            yield f"data: {json.dumps(data)}\n\n"
+            version, body = servo_state.snapshot_json()
+            feedback = read_feedback()
+            yield (f'data: {{"servos": {body.decode()}, '
+                   f'"version": "{servo_state.token(version)}", '
+                   f'"feedback": {json.dumps(feedback)}, '
+                   f'"timestamp": {time.time()}}}\n\n')
             time.sleep(0.1)  # 10Hz
     
     return Response(generate(), mimetype='text/event-stream')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Con el recargador de Flask solo el proceso hijo arranca el relay
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # "local": el enlace con el ESP32 corre en este proceso;
+        # "shm": lo lleva biped_controller.py --shared-state en otro proceso
+        state_backend = open_backend(Config.STATE_BACKEND, Config.STATE_SHM_NAME,
+                                     create=True)
+        atexit.register(state_backend.close)
+        state_backend.write_setpoints(servo_state.angles(), servo_state.version)
+        if Config.STATE_BACKEND == 'local':
+            robot = BipedController(Config.ESP32_IP, state=state_backend,
+                                    start_video=False)
+        Thread(target=telemetry_loop, daemon=True).start()
+        camera_relay = CameraRelay(
+            f"http://{Config.ESP32_IP}/", port=Config.CAMERA_RELAY_PORT
+        ).start()
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Pipeline de visión en varios procesos
+
+    captura ──frames──> inferencia ──resultados──> visualización
+        └──────────────────frames─────────────────────┘
+
+Cada etapa corre en su propio proceso (sin GIL compartido y con los hilos
+de TensorFlow aislados en la inferencia). Los frames viajan por un anillo
+de slots en multiprocessing.shared_memory: el escritor marca el slot con
+-seq mientras copia y con seq al terminar, y el lector comprueba el número
+de secuencia antes y después de copiar, sin pickling. Las etapas lentas
+siempre toman el frame más reciente.
+
+El supervisor reinicia las etapas que terminan o dejan de dar señales y
+publica fps y uso de CPU de cada una.
+
+Uso:
+    python pipeline.py --stream-url http://localhost:8081/stream.mjpg
+    python pipeline.py --stream-url http://<esp32>/ --no-display
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ("capture", "inference", "display")
+FRAME_SHAPE = (480, 640, 3)
+
+# Estadísticas por etapa en un mp.Array de doubles
+_FRAMES, _CPU, _HEARTBEAT, _FPS, _CPU_PCT = range(5)
+_STATS_WIDTH = 5
+
+# Resultado de inferencia: [seq, frame_seq, detectado, confianza, x, y, w, h, t]
+_RESULT_FIELDS = 9
+_LABEL_BYTES = 64
+
+# Reintentos de lectura mientras una escritura está en curso
+_READ_RETRIES = 50
+
+
+def _open_shm(name, size, create):
+    if not create:
+        shm = shared_memory.SharedMemory(name=name)
+        # Solo el supervisor elimina el bloque al terminar
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        # Bloque huérfano de una ejecución anterior
+        shared_memory.SharedMemory(name=name).unlink()
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+
+class FrameRing:
+    """
+    Anillo de frames de tamaño fijo en memoria compartida
+
+    Args:
+        name: nombre del bloque
+        shape: forma de cada frame (alto, ancho, canales), uint8
+        slots: número de slots del anillo
+        create: True en el supervisor
+    """
+
+    def __init__(self, name, shape=FRAME_SHAPE, slots=4, create=False):
+        self.name = name
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.create = create
+        header = 8 * (1 + slots)
+        self.shm = _open_shm(name, header + slots * int(np.prod(shape)), create)
+
+        self.latest = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf,
+                                   offset=8)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8,
+                                 buffer=self.shm.buf, offset=header)
+        if create:
+            self.latest[0] = 0
+            self.slot_seq[:] = 0
+
+    def write(self, frame):
+        """Publicar un frame (un solo escritor); devuelve su secuencia"""
+        seq = int(self.latest[0]) + 1
+        slot = seq % self.slots
+        self.slot_seq[slot] = -seq          # slot en escritura
+        self.frames[slot] = frame
+        self.slot_seq[slot] = seq
+        self.latest[0] = seq
+        return seq
+
+    def read(self, last_seq, out):
+        """
+        Copiar en `out` el frame más reciente si es posterior a last_seq
+
+        Returns:
+            secuencia copiada, o None si no hay frame nuevo o el slot sigue
+            en escritura tras _READ_RETRIES intentos
+        """
+        for attempt in range(_READ_RETRIES):
+            seq = int(self.latest[0])
+            if seq <= last_seq:
+                return None
+            slot = seq % self.slots
+            if self.slot_seq[slot] == seq:
+                np.copyto(out, self.frames[slot])
+                if self.slot_seq[slot] == seq:
+                    return seq
+            time.sleep(0 if attempt < 20 else 0.0005)
+        return None
+
+    def wait(self, last_seq, out, timeout=0.5, poll=0.002):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            seq = self.read(last_seq, out)
+            if seq is not None:
+                return seq
+            time.sleep(poll)
+        return None
+
+    def close(self):
+        self.latest = self.slot_seq = self.frames = None
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+class ResultBoard:
+    """Último resultado de inferencia en memoria compartida (seqlock)"""
+
+    def __init__(self, name, create=False):
+        self.name = name
+        self.create = create
+        self.shm = _open_shm(name, 8 * (1 + _RESULT_FIELDS) + _LABEL_BYTES, create)
+        self.seq = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.values = np.ndarray((_RESULT_FIELDS,), dtype=np.float64,
+                                 buffer=self.shm.buf, offset=8)
+        self.label = np.ndarray((_LABEL_BYTES,), dtype=np.uint8, buffer=self.shm.buf,
+                                offset=8 * (1 + _RESULT_FIELDS))
+        self._last = None
+        if create:
+            self.seq[0] = 0
+            self.values[:] = 0
+
+    def write(self, frame_seq, detection):
+        bbox = detection['bbox'] or (0, 0, 0, 0)
+        label = (detection['class'] or "").encode()[:_LABEL_BYTES]
+        # Impar antes de empezar: la inferencia anterior murió (terminate del
+        # supervisor) a mitad de una escritura; se redondea a par
+        if self.seq[0] % 2:
+            self.seq[0] += 1
+        self.seq[0] += 1                    # impar: escritura en curso
+        self.values[:] = (self.values[0] + 1, frame_seq, detection['detected'],
+                          detection['confidence'], *bbox, time.time())
+        self.label[:] = 0
+        self.label[:len(label)] = np.frombuffer(label, dtype=np.uint8)
+        self.seq[0] += 1
+
+    def read(self):
+        """
+        Último resultado en el formato de MineralDetector.predict(), o None
+
+        Si la secuencia sigue impar tras _READ_RETRIES intentos (escritor
+        caído) se devuelve el último resultado leído.
+        """
+        for attempt in range(_READ_RETRIES):
+            seq = int(self.seq[0])
+            if not seq % 2:
+                values = self.values.copy()
+                label = self.label.tobytes().rstrip(b"\0").decode(errors="replace")
+                if int(self.seq[0]) == seq:
+                    break
+            time.sleep(0 if attempt < 20 else 0.0005)
+        else:
+            return self._last
+        if values[0] == 0:
+            return None
+        bbox = tuple(int(v) for v in values[4:8])
+        self._last = {
+            'detected': bool(values[2]),
+            'class': label or None,
+            'confidence': float(values[3]),
+            'bbox': bbox if bbox[2] and bbox[3] else None,
+            'frame_seq': int(values[1]),
+            'timestamp': float(values[8]),
+        }
+        return self._last
+
+    def close(self):
+        self.seq = self.values = self.label = None
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+class _StageMeter:
+    """Contadores de una etapa en el mp.Array compartido"""
+
+    def __init__(self, stats, index):
+        self.stats = stats
+        self.base = index * _STATS_WIDTH
+
+    def beat(self, frames=0):
+        self.stats[self.base + _FRAMES] += frames
+        self.stats[self.base + _CPU] = time.process_time()
+        self.stats[self.base + _HEARTBEAT] = time.time()
+
+
+def _setup_stage(core):
+    # Ctrl+C lo gestiona el supervisor, que para las etapas con stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+
+
+def capture_stage(stop, stats, index, ring_name, shape, slots, stream_url, core=None):
+    """Leer el stream MJPEG y publicar frames redimensionados al anillo"""
+    import cv2
+
+    _setup_stage(core)
+    ring = FrameRing(ring_name, shape, slots)
+    meter = _StageMeter(stats, index)
+    height, width = shape[:2]
+    try:
+        while not stop.is_set():
+            cap = cv2.VideoCapture(stream_url)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if not cap.isOpened():
+                print("❌ Captura: stream no disponible, reintentando...")
+                meter.beat()
+                stop.wait(2)
+                continue
+
+            print("✅ Captura: stream abierto")
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    meter.beat()
+                    break
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                ring.write(frame)
+                meter.beat(1)
+            cap.release()
+    finally:
+        ring.close()
+
+
+def inference_stage(stop, stats, index, ring_name, shape, slots, results_name,
+                    model_path=None, threads=None, core=None, detections_path=None,
+                    state_name=None, session=None):
+    """
+    Clasificar siempre el frame más reciente con MineralDetector
+
+    Con detections_path las detecciones se añaden al DetectionStore junto
+    con el seq del frame y, si hay state_name, el modo y los servos leídos
+    del estado compartido del controlador. Cada fila se vuelca a disco al
+    registrarla (el supervisor puede terminar la etapa sin aviso) y la
+    `session` del supervisor mantiene la misma ejecución entre reinicios.
+    """
+    _setup_stage(core)
+    if threads:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from ai.mineral_detector import MineralDetector
+    from ai.detection_store import DetectionStore
+    from shared_state import SharedStateBackend
+
+    detector = MineralDetector()
+    if not detector.load_model(model_path):
+        print("⚠️  Inferencia sin modelo: solo se reportan frames sin detección")
+
+    ring = FrameRing(ring_name, shape, slots)
+    board = ResultBoard(results_name)
+    meter = _StageMeter(stats, index)
+    store = (DetectionStore(detections_path, session=session, flush_every=1)
+             if detections_path else None)
+    state = None
+    if store and state_name:
+        try:
+            state = SharedStateBackend(state_name)
+        except FileNotFoundError:
+            print(f"⚠️  Estado compartido '{state_name}' no encontrado: "
+                  "detecciones sin modo ni servos")
+    frame = np.empty(shape, dtype=np.uint8)
+    last_seq = 0
+    try:
+        while not stop.is_set():
+            seq = ring.wait(last_seq, frame)
+            if seq is None:
+                meter.beat()
+                continue
+            last_seq = seq
+            detection = detector.predict(frame)
+            board.write(seq, detection)
+            if store and detection['detected']:
+                feedback = state.read_feedback() if state else {}
+                store.record(detection, frame_ref=seq,
+                             mode=feedback.get("mode", "idle"),
+                             servos=feedback.get("angles"))
+            meter.beat(1)
+    finally:
+        ring.close()
+        board.close()
+        if store:
+            store.close()
+        if state:
+            state.close()
+
+
+def _draw_result(frame, detection):
+    """Mismo estilo que MineralDetector.draw_detection, sin importar TensorFlow"""
+    import cv2
+
+    if detection and detection['detected']:
+        if detection['bbox']:
+            x, y, w, h = detection['bbox']
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(frame, f"{detection['class']}: {detection['confidence']:.2%}",
+                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    else:
+        cv2.putText(frame, "Buscando minerales...", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+
+
+def display_stage(stop, stats, index, ring_name, shape, slots, results_name,
+                  core=None):
+    """Mostrar el último frame con la última detección y los fps por etapa"""
+    import cv2
+
+    _setup_stage(core)
+    ring = FrameRing(ring_name, shape, slots)
+    board = ResultBoard(results_name)
+    meter = _StageMeter(stats, index)
+    frame = np.zeros(shape, dtype=np.uint8)
+    window_name = "Biped Pipeline"
+    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    last_seq = 0
+    try:
+        while not stop.is_set():
+            seq = ring.read(last_seq, frame)
+            if seq is not None:
+                last_seq = seq
+                _draw_result(frame, board.read())
+                for i, name in enumerate(STAGES):
+                    base = i * _STATS_WIDTH
+                    cv2.putText(frame, f"{name}: {stats[base + _FPS]:.1f} fps "
+                                       f"{stats[base + _CPU_PCT]:.0f}% CPU",
+                                (10, shape[0] - 70 + 22 * i),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+                cv2.imshow(window_name, frame)
+                meter.beat(1)
+            else:
+                meter.beat()
+
+            if cv2.waitKey(10) & 0xFF == ord('q'):
+                stop.set()
+    finally:
+        cv2.destroyAllWindows()
+        ring.close()
+        board.close()
+
+
+class Pipeline:
+    """
+    Supervisor de las etapas captura / inferencia / visualización
+
+    Args:
+        stream_url: URL MJPEG (ESP32 o camera_relay.py)
+        model_path: bundle o .h5 para MineralDetector (None = por defecto)
+        display: incluir la etapa de visualización
+        pin: fijar cada etapa a un núcleo distinto
+        threads: hilos intra-op de TensorFlow en la inferencia
+        hang_timeout: segundos sin señales antes de reiniciar una etapa
+        detections_path: directorio del DetectionStore (None = no registrar)
+        state_name: bloque de shared_state.py del que leer modo y servos
+    """
+
+    def __init__(self, stream_url, model_path=None, display=True,
+                 shape=FRAME_SHAPE, slots=4, pin=False, threads=None,
+                 hang_timeout=15.0, detections_path=None, state_name=None):
+        self.stream_url = stream_url
+        self.model_path = model_path
+        self.detections_path = detections_path
+        self.state_name = state_name
+        self.stages = STAGES if display else STAGES[:2]
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.threads = threads
+        self.hang_timeout = hang_timeout
+        self.ctx = mp.get_context("spawn")
+        self.stop_event = self.ctx.Event()
+        self.stats = self.ctx.Array('d', len(STAGES) * _STATS_WIDTH, lock=False)
+        self.processes = {}
+        self.restarts = {name: 0 for name in self.stages}
+        self._last = {}
+        # Espera creciente entre reinicios de una etapa que falla en bucle
+        self._backoff = {name: 1.0 for name in self.stages}
+        self._next_restart = {name: 0.0 for name in self.stages}
+        self._started = {}
+        # Las etapas de inferencia reiniciadas continúan la misma ejecución
+        self.session = f"{os.getpid()}-{time.time_ns()}"
+
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") \
+            else list(range(os.cpu_count() or 1))
+        self.cores = {name: cores[i % len(cores)] if pin else None
+                      for i, name in enumerate(self.stages)}
+
+        suffix = os.getpid()
+        self.ring = FrameRing(f"biped_frames_{suffix}", self.shape, slots, create=True)
+        self.board = ResultBoard(f"biped_results_{suffix}", create=True)
+
+    def _args(self, name):
+        index = STAGES.index(name)
+        common = (self.stop_event, self.stats, index, self.ring.name, self.shape,
+                  self.slots)
+        if name == "capture":
+            return capture_stage, common + (self.stream_url, self.cores[name])
+        if name == "inference":
+            return inference_stage, common + (self.board.name, self.model_path,
+                                              self.threads, self.cores[name],
+                                              self.detections_path, self.state_name,
+                                              self.session)
+        return display_stage, common + (self.board.name, self.cores[name])
+
+    def _spawn(self, name):
+        base = STAGES.index(name) * _STATS_WIDTH
+        for field in (_FRAMES, _CPU, _HEARTBEAT):
+            self.stats[base + field] = 0.0
+        target, args = self._args(name)
+        process = self.ctx.Process(target=target, args=args, name=name, daemon=True)
+        process.start()
+        self.processes[name] = process
+        self._started[name] = time.monotonic()
+        self._last[name] = (time.monotonic(), 0.0, 0.0)
+
+    def start(self):
+        for name in self.stages:
+            self._spawn(name)
+        print(f"🚀 Pipeline iniciado: {', '.join(self.stages)}")
+        return self
+
+    def check(self):
+        """Reiniciar etapas caídas o colgadas; devuelve las reiniciadas"""
+        restarted = []
+        now = time.time()
+        for name, process in self.processes.items():
+            heartbeat = self.stats[STAGES.index(name) * _STATS_WIDTH + _HEARTBEAT]
+            hung = heartbeat > 0 and now - heartbeat > self.hang_timeout
+            if process.is_alive() and not hung:
+                continue
+            if time.monotonic() < self._next_restart[name]:
+                continue
+
+            reason = "colgada" if hung else f"terminó (código {process.exitcode})"
+            print(f"⚠️  Etapa {name} {reason}: reiniciando")
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=5)
+
+            if time.monotonic() - self._started[name] > 60:
+                self._backoff[name] = 1.0
+            else:
+                self._backoff[name] = min(self._backoff[name] * 2, 30.0)
+            self._next_restart[name] = time.monotonic() + self._backoff[name]
+
+            self.restarts[name] += 1
+            self._spawn(name)
+            restarted.append(name)
+        return restarted
+
+    def report(self):
+        """
+        fps y % de CPU de cada etapa desde la llamada anterior
+
+        Returns:
+            {etapa: {fps, cpu_percent, restarts, alive}}
+        """
+        report = {}
+        now = time.monotonic()
+        for name in self.stages:
+            base = STAGES.index(name) * _STATS_WIDTH
+            frames, cpu = self.stats[base + _FRAMES], self.stats[base + _CPU]
+            last_time, last_frames, last_cpu = self._last[name]
+            elapsed = max(now - last_time, 1e-6)
+            fps = max(frames - last_frames, 0) / elapsed
+            cpu_percent = max(cpu - last_cpu, 0) / elapsed * 100
+            self._last[name] = (now, frames, cpu)
+            self.stats[base + _FPS] = fps
+            self.stats[base + _CPU_PCT] = cpu_percent
+            report[name] = {
+                "fps": round(fps, 1),
+                "cpu_percent": round(cpu_percent, 1),
+                "restarts": self.restarts[name],
+                "alive": self.processes[name].is_alive(),
+            }
+        return report
+
+    def supervise(self, interval=2.0, verbose=True):
+        """Vigilar las etapas hasta que se pida parar (tecla q o Ctrl+C)"""
+        try:
+            while not self.stop_event.wait(interval):
+                self.check()
+                report = self.report()
+                if verbose:
+                    print("📊 " + " | ".join(
+                        f"{name}: {r['fps']} fps {r['cpu_percent']}% CPU"
+                        + (f" ({r['restarts']} reinicios)" if r['restarts'] else "")
+                        for name, r in report.items()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.processes = {}
+        if self.ring is not None:
+            self.ring.close()
+            self.board.close()
+            self.ring = self.board = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline de visión multiproceso")
+    parser.add_argument("--stream-url", required=True)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--no-display", action="store_true")
+    parser.add_argument("--pin", action="store_true",
+                        help="fijar cada etapa a un núcleo")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="hilos intra-op de TensorFlow en la inferencia")
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--detections", default=None,
+                        help="directorio donde registrar las detecciones")
+    parser.add_argument("--shared-state", default=None,
+                        help="bloque de estado compartido (modo y servos)")
+    args = parser.parse_args()
+
+    Pipeline(args.stream_url, args.model, display=not args.no_display,
+             pin=args.pin, threads=args.threads, detections_path=args.detections,
+             state_name=args.shared_state).start().supervise(args.interval)
+
+
+if __name__ == "__main__":
+    main()
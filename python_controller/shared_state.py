@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Estado compartido entre la app web (main.py) y BipedController
+
+Dos sentidos, cada uno con un único escritor:
+
+    consignas:      UI web -> ESP32   (write_setpoints / read_setpoints)
+    realimentación: ESP32 -> UI web   (write_feedback / read_feedback)
+
+LocalStateBackend sirve cuando ambos corren en el mismo proceso.
+SharedStateBackend guarda lo mismo en un bloque de
+multiprocessing.shared_memory: los arrays NumPy son vistas directas sobre
+la memoria compartida (sin copias ni pickling) y cada sentido usa un
+seqlock para que el lector nunca vea una escritura a medias.
+
+    python main.py                          # crea el bloque (STATE_BACKEND = "shm")
+    python biped_controller.py --shared-state biped_state
+"""
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+NUM_SERVOS = 6
+MODES = ("idle", "walk", "manual", "stand")
+
+# Cabecera int64: [seq consignas, versión consignas, seq realimentación, reservado]
+_HEADER = 4
+# Datos float64
+_SETPOINTS = slice(0, NUM_SERVOS)
+_FEEDBACK = slice(NUM_SERVOS, 2 * NUM_SERVOS)
+_FEEDBACK_TIME = 2 * NUM_SERVOS
+_CONNECTED = _FEEDBACK_TIME + 1
+_ENABLED = _FEEDBACK_TIME + 2
+_MODE = _FEEDBACK_TIME + 3
+_DATA = _FEEDBACK_TIME + 4
+SHM_SIZE = 8 * (_HEADER + _DATA)
+
+# Reintentos de lectura mientras una escritura está en curso
+_READ_RETRIES = 50
+
+
+def _mode_code(mode):
+    return float(MODES.index(mode)) if mode in MODES else -1.0
+
+
+def _mode_name(code):
+    code = int(code)
+    return MODES[code] if 0 <= code < len(MODES) else "idle"
+
+
+class LocalStateBackend:
+    """Estado en memoria del proceso, protegido por un Condition"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.setpoints = np.full(NUM_SERVOS, 90.0)
+        self.setpoint_version = 0
+        self.feedback = {"angles": [90.0] * NUM_SERVOS, "timestamp": 0.0,
+                         "connected": False, "servos_enabled": True,
+                         "mode": "idle"}
+
+    def write_setpoints(self, angles, version):
+        with self.condition:
+            self.setpoints[:] = angles
+            self.setpoint_version = version
+            self.condition.notify_all()
+
+    def read_setpoints(self):
+        """(versión, ángulos (6,))"""
+        with self.condition:
+            return self.setpoint_version, self.setpoints.copy()
+
+    def wait_setpoints(self, last_version, timeout=0.5):
+        """Esperar consignas con versión distinta de last_version"""
+        with self.condition:
+            if self.setpoint_version == last_version:
+                self.condition.wait(timeout)
+            return self.setpoint_version, self.setpoints.copy()
+
+    def write_feedback(self, angles, mode, servos_enabled, connected):
+        with self.condition:
+            self.feedback = {"angles": [float(a) for a in angles],
+                             "timestamp": time.time(),
+                             "connected": bool(connected),
+                             "servos_enabled": bool(servos_enabled),
+                             "mode": mode}
+
+    def read_feedback(self):
+        with self.condition:
+            return dict(self.feedback)
+
+    def close(self):
+        pass
+
+
+class SharedStateBackend:
+    """
+    Estado en multiprocessing.shared_memory
+
+    Args:
+        name: nombre del bloque compartido
+        create: True en el proceso que lo crea (y lo elimina al cerrar)
+    """
+
+    def __init__(self, name="biped_state", create=False):
+        self.name = name
+        self.create = create
+        self._write_lock = threading.Lock()
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                      size=SHM_SIZE)
+            except FileExistsError:
+                # Bloque huérfano de una ejecución anterior
+                shared_memory.SharedMemory(name=name).unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                      size=SHM_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Solo el creador elimina el bloque: sin esto el resource_tracker
+            # de este proceso lo borra al salir aunque main.py siga usándolo
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        self.header = np.ndarray((_HEADER,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((_DATA,), dtype=np.float64, buffer=self.shm.buf,
+                               offset=8 * _HEADER)
+        # Vistas sin copia sobre la memoria compartida
+        self.setpoints = self.data[_SETPOINTS]
+        self.feedback_angles = self.data[_FEEDBACK]
+        self._last_read = {}
+
+        if create:
+            self.header[:] = 0
+            self.setpoints[:] = 90.0
+            self.feedback_angles[:] = 90.0
+            self.data[_ENABLED] = 1.0
+
+    def _write(self, seq_index, fn):
+        # Un solo escritor por sentido; el lock ordena los hilos del proceso
+        with self._write_lock:
+            # Impar antes de empezar: el escritor anterior murió a mitad de
+            # una escritura; se redondea a par para recuperar la paridad
+            if self.header[seq_index] % 2:
+                self.header[seq_index] += 1
+            self.header[seq_index] += 1     # impar: escritura en curso
+            fn()
+            self.header[seq_index] += 1
+
+    def _read(self, seq_index, fn):
+        for attempt in range(_READ_RETRIES):
+            seq = self.header[seq_index]
+            if seq % 2:
+                time.sleep(0 if attempt < 20 else 0.0005)
+                continue
+            value = fn()
+            if self.header[seq_index] == seq:
+                self._last_read[seq_index] = value
+                return value
+        # Secuencia atascada (escritor caído): último valor bueno o, si no
+        # lo hay, lo que haya en memoria, que ya nadie está modificando
+        if seq_index in self._last_read:
+            return self._last_read[seq_index]
+        return fn()
+
+    def write_setpoints(self, angles, version):
+        def write():
+            self.setpoints[:] = angles
+            self.header[1] = version
+        self._write(0, write)
+
+    def read_setpoints(self):
+        return self._read(0, lambda: (int(self.header[1]), self.setpoints.copy()))
+
+    def wait_setpoints(self, last_version, timeout=0.5, poll=0.005):
+        deadline = time.monotonic() + timeout
+        while self.header[1] == last_version and time.monotonic() < deadline:
+            time.sleep(poll)
+        return self.read_setpoints()
+
+    def write_feedback(self, angles, mode, servos_enabled, connected):
+        def write():
+            self.feedback_angles[:] = angles
+            self.data[_FEEDBACK_TIME] = time.time()
+            self.data[_CONNECTED] = float(connected)
+            self.data[_ENABLED] = float(servos_enabled)
+            self.data[_MODE] = _mode_code(mode)
+        self._write(2, write)
+
+    def read_feedback(self):
+        def read():
+            return {"angles": self.feedback_angles.tolist(),
+                    "timestamp": float(self.data[_FEEDBACK_TIME]),
+                    "connected": bool(self.data[_CONNECTED]),
+                    "servos_enabled": bool(self.data[_ENABLED]),
+                    "mode": _mode_name(self.data[_MODE])}
+        return self._read(2, read)
+
+    def close(self):
+        # Soltar las vistas antes de cerrar el bloque
+        self.header = self.data = self.setpoints = self.feedback_angles = None
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+def open_backend(kind="local", name="biped_state", create=False):
+    """Crear el backend indicado por Config.STATE_BACKEND ('local' o 'shm')"""
+    if kind == "shm":
+        return SharedStateBackend(name, create=create)
+    if kind == "local":
+        return LocalStateBackend()
+    raise ValueError(f"Backend de estado desconocido: {kind}")
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Estado de los servos con número de versión y JSON memoizado
+
+Cada cambio efectivo incrementa la versión. El cuerpo JSON del estado
+completo se serializa una sola vez por versión y se sirve con
+ETag = "<época>-<versión>", de modo que el polling de la UI cuesta un 304
+cuando el robot está quieto. La época cambia en cada arranque del servidor
+para que un cliente con una versión de la ejecución anterior no reciba un
+304 ni un diff vacío por error. Los cambios se guardan como diffs compactos:
+
+    {"servo1": {"angle": 100}, "servo4": {"kp": 1.2}}
+
+SetpointIngestor agrupa las actualizaciones de alta frecuencia de los
+sliders y las aplica como un único diff por ventana.
+
+Benchmark (peticiones/seg antes y después):
+    python state_store.py --requests 5000
+"""
+import argparse
+import json
+import math
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+
+FIELDS = ('angle', 'kp', 'ki', 'kd')
+
+
+def etag(token):
+    return f'"{token}"'
+
+
+def clean_values(values):
+    """
+    Validar {campo: valor} de un servo
+
+    Los campos desconocidos se descartan y los valores se convierten a
+    número ("100" -> 100.0).
+
+    Raises:
+        ValueError: si no es un objeto o algún valor no es un número finito
+    """
+    if not isinstance(values, dict):
+        raise ValueError("Se esperaba un objeto {campo: valor}")
+    clean = {}
+    for field, value in values.items():
+        if field not in FIELDS:
+            continue
+        if isinstance(value, bool) or value is None:
+            raise ValueError(f"Valor no numérico para '{field}': {value!r}")
+        if not isinstance(value, int):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Valor no numérico para '{field}': {value!r}")
+            if not math.isfinite(value):
+                raise ValueError(f"Valor no finito para '{field}'")
+        clean[field] = value
+    return clean
+
+
+def clean_updates(updates):
+    """Validar un diff {servo_id: {campo: valor}} (ValueError si no es válido)"""
+    if not isinstance(updates, dict):
+        raise ValueError("Se esperaba un objeto {servo_id: {campo: valor}}")
+    return {servo_id: clean_values(values) for servo_id, values in updates.items()}
+
+
+class ServoStateStore:
+    """
+    Estado {servo_id: {angle, kp, ki, kd}} compartido por los endpoints
+
+    Args:
+        initial: estado inicial
+        history: número de diffs recientes que se guardan para ?since=
+        epoch: identificador de la ejecución (por defecto, el instante de
+            arranque en hexadecimal)
+    """
+
+    def __init__(self, initial, history=256, epoch=None):
+        self.lock = Lock()
+        self.state = {servo_id: dict(values) for servo_id, values in initial.items()}
+        self.epoch = epoch or f"{time.time_ns() // 1000:x}"
+        self.version = 0
+        self._changes = deque(maxlen=history)
+        self._body = None
+        self._body_version = -1
+
+    def __contains__(self, servo_id):
+        return servo_id in self.state
+
+    def token(self, version=None):
+        """Versión que ve el cliente: <época>-<versión>"""
+        return f"{self.epoch}-{self.version if version is None else version}"
+
+    def parse_token(self, token):
+        """Versión de un token de esta época, o None si es de otra o no es válido"""
+        epoch, _, version = str(token).rpartition('-')
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def apply(self, updates):
+        """
+        Aplicar un diff {servo_id: {campo: valor}}
+
+        Los servos y campos desconocidos se ignoran y los ángulos se recortan
+        a 0-180. La versión solo cambia si algún valor cambia.
+
+        Returns:
+            (versión, diff efectivo)
+
+        Raises:
+            ValueError: si algún valor no es numérico (no se aplica nada)
+        """
+        updates = clean_updates(updates)
+        diff = {}
+        with self.lock:
+            for servo_id, values in updates.items():
+                current = self.state.get(servo_id)
+                if current is None:
+                    continue
+                for field, value in values.items():
+                    if field not in FIELDS:
+                        continue
+                    if field == 'angle':
+                        value = max(0, min(180, value))
+                    if current[field] != value:
+                        current[field] = value
+                        diff.setdefault(servo_id, {})[field] = value
+
+            if diff:
+                self.version += 1
+                self._changes.append((self.version, diff))
+            return self.version, diff
+
+    def snapshot_json(self):
+        """(versión, cuerpo JSON en bytes) del estado completo, memoizado"""
+        with self.lock:
+            if self._body_version != self.version:
+                self._body = json.dumps(self.state, separators=(',', ':')).encode()
+                self._body_version = self.version
+            return self.version, self._body
+
+    def changes_since(self, token):
+        """
+        Diff acumulado desde un token conocido por el cliente
+
+        Returns:
+            (token actual, diff) o (token actual, None) si el token es de otra
+            época o demasiado antiguo y hay que pedir el estado completo
+        """
+        version = self.parse_token(token)
+        with self.lock:
+            current = self.token()
+            if version is None or version > self.version:
+                return current, None
+            if version == self.version:
+                return current, {}
+            if not self._changes or self._changes[0][0] > version + 1:
+                return current, None
+
+            merged = {}
+            for change_version, diff in self._changes:
+                if change_version > version:
+                    for servo_id, values in diff.items():
+                        merged.setdefault(servo_id, {}).update(values)
+            return current, merged
+
+    def get(self, servo_id):
+        with self.lock:
+            return dict(self.state[servo_id])
+
+    def angles(self):
+        """Ángulos en orden servo1..servo6"""
+        with self.lock:
+            return [values['angle'] for values in self.state.values()]
+
+    def gains(self):
+        """[kp, ki, kd] en orden servo1..servo6"""
+        with self.lock:
+            return [[values['kp'], values['ki'], values['kd']]
+                    for values in self.state.values()]
+
+
+class SetpointIngestor:
+    """
+    Fusiona actualizaciones por servo dentro de una ventana corta
+
+    submit() solo toma un lock propio y sobrescribe el valor pendiente; un
+    hilo aplica lo acumulado al store cada `window` segundos como un único
+    diff (una sola subida de versión) y reenvía al robot únicamente los
+    valores que cambiaron.
+
+    Args:
+        store: ServoStateStore destino
+        window: segundos entre aplicaciones
+        forward: función opcional que recibe el diff efectivo y devuelve el
+            diff que realmente envió (solo ese cuenta en 'forwarded')
+    """
+
+    def __init__(self, store, window=0.02, forward=None):
+        self.store = store
+        self.window = window
+        self.forward = forward
+        self.lock = Lock()
+        self.pending = {}
+        self.accepted = 0
+        self.merged = 0
+        self.batches = 0
+        self.forwarded = 0
+        self._wake = Event()
+        self._thread = None
+
+    def submit(self, servo_id, values):
+        """
+        Encolar {campo: valor} para un servo
+
+        Raises:
+            ValueError: si los valores no son válidos (ver clean_values)
+        """
+        values = clean_values(values)
+        with self.lock:
+            pending = self.pending.setdefault(servo_id, {})
+            for field, value in values.items():
+                if field in pending:
+                    self.merged += 1
+                pending[field] = value
+                self.accepted += 1
+
+            if self._thread is None:
+                self._thread = Thread(target=self._loop, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def flush(self):
+        """
+        Aplicar lo pendiente ahora
+
+        Returns:
+            (versión, diff efectivo)
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return self.store.version, {}
+
+        version, diff = self.store.apply(pending)
+        with self.lock:
+            self.batches += 1
+        if diff and self.forward is not None:
+            try:
+                sent = self.forward(diff) or {}
+                with self.lock:
+                    self.forwarded += sum(len(values) for values in sent.values())
+            except Exception as e:
+                print(f"❌ Error reenviando consignas: {e}")
+        return version, diff
+
+    def _loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            time.sleep(self.window)
+            # Un lote con errores no debe detener la ingesta
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Error aplicando consignas: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'accepted': self.accepted,
+                'merged': self.merged,
+                'batches': self.batches,
+                'forwarded': self.forwarded,
+                'pending': sum(len(values) for values in self.pending.values()),
+                'window_ms': self.window * 1000,
+            }
+
+
+def benchmark(requests=5000):
+    """
+    Peticiones/seg de GET /api/servos con el cliente de pruebas de Flask
+
+    El cliente de pruebas incluye todo el coste WSGI de Flask; la
+    serialización se mide también por separado.
+
+    Returns:
+        dict {caso: operaciones por segundo}
+    """
+    from flask import Flask, Response, jsonify, request
+
+    initial = {f'servo{i}': {'angle': 90, 'kp': 1.0, 'ki': 0.0, 'kd': 0.0}
+               for i in range(1, 7)}
+    legacy_state = {k: dict(v) for k, v in initial.items()}
+    legacy_lock = Lock()
+    store = ServoStateStore(initial)
+
+    app = Flask(__name__)
+
+    @app.route('/legacy')
+    def legacy():
+        with legacy_lock:
+            return jsonify(legacy_state)
+
+    @app.route('/cached')
+    def cached():
+        version, body = store.snapshot_json()
+        tag = etag(store.token(version))
+        if tag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers={'ETag': tag})
+        return Response(body, mimetype='application/json', headers={'ETag': tag})
+
+    client = app.test_client()
+
+    def rate(path, headers=None):
+        for _ in range(50):
+            client.get(path, headers=headers)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(path, headers=headers)
+        return requests / (time.perf_counter() - start)
+
+    def serialize_rate(fn):
+        start = time.perf_counter()
+        for _ in range(requests):
+            fn()
+        return requests / (time.perf_counter() - start)
+
+    with app.app_context():
+        return {
+            'GET jsonify (antes)': rate('/legacy'),
+            'GET json memoizado': rate('/cached'),
+            'GET If-None-Match -> 304': rate('/cached',
+                                             {'If-None-Match': etag(store.token())}),
+            'serializar jsonify': serialize_rate(lambda: jsonify(legacy_state)),
+            'serializar memoizado': serialize_rate(store.snapshot_json),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de GET /api/servos")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"BENCHMARK /api/servos ({args.requests} peticiones)")
+    print("=" * 60)
+    for name, value in benchmark(args.requests).items():
+        print(f"  {name:<26} {value:>10.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
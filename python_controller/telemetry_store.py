@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Almacén de telemetría en memoria fija (ring buffers NumPy por canal)
+
+Cada canal (angles, errors, pwm) guarda muestras de los 6 servos a la
+frecuencia de control. Las consultas por rango devuelven ventanas
+diezmadas al ancho de la gráfica:
+
+    minmax: min/max/media por intervalo de tiempo (preserva picos)
+    lttb:   Largest-Triangle-Three-Buckets por servo (forma visual)
+"""
+import threading
+import time
+
+import numpy as np
+
+CHANNELS = ("angles", "errors", "pwm")
+METHODS = ("minmax", "lttb")
+NUM_SERVOS = 6
+
+
+class RingBuffer:
+    """
+    Buffer circular de (timestamp, valores[width]) con capacidad fija
+
+    Las marcas de tiempo deben llegar en orden creciente.
+    """
+
+    def __init__(self, capacity, width=NUM_SERVOS, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        self.values = np.zeros((self.capacity, width), dtype=dtype)
+        self.head = 0     # siguiente posición de escritura
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, values):
+        with self.lock:
+            self.times[self.head] = timestamp
+            self.values[self.head] = values
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def extend(self, timestamps, values):
+        """Añadir un bloque de muestras (N,) y (N, width) de una vez"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values)
+        n = len(timestamps)
+        if n >= self.capacity:
+            timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+
+        with self.lock:
+            first = min(n, self.capacity - self.head)
+            self.times[self.head:self.head + first] = timestamps[:first]
+            self.values[self.head:self.head + first] = values[:first]
+            rest = n - first
+            if rest:
+                self.times[:rest] = timestamps[first:]
+                self.values[:rest] = values[first:]
+            self.head = (self.head + n) % self.capacity
+            self.count = min(self.count + n, self.capacity)
+
+    def latest(self):
+        with self.lock:
+            if not self.count:
+                return None, None
+            i = (self.head - 1) % self.capacity
+            return float(self.times[i]), self.values[i].copy()
+
+    def range(self, start, end):
+        """
+        Copia ordenada de las muestras con start <= t <= end
+
+        Returns:
+            (times (N,), values (N, width))
+        """
+        with self.lock:
+            if self.count < self.capacity:
+                segments = [(0, self.count)]
+            else:
+                segments = [(self.head, self.capacity), (0, self.head)]
+
+            times, values = [], []
+            for lo, hi in segments:
+                t = self.times[lo:hi]
+                a = lo + np.searchsorted(t, start, side="left")
+                b = lo + np.searchsorted(t, end, side="right")
+                if b > a:
+                    times.append(self.times[a:b].copy())
+                    values.append(self.values[a:b].copy())
+
+        if not times:
+            return (np.zeros(0), np.zeros((0, self.values.shape[1]),
+                                          dtype=self.values.dtype))
+        return np.concatenate(times), np.concatenate(values)
+
+
+def decimate_minmax(times, values, points, start, end):
+    """
+    Agrupar por intervalos de tiempo iguales
+
+    Returns:
+        dict con t (centro del intervalo), min, max y mean (points, width);
+        los intervalos vacíos se omiten
+    """
+    edges = np.linspace(start, end, points + 1)
+    bucket = np.clip(np.searchsorted(edges, times, side="right") - 1,
+                     0, points - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    counts = np.diff(np.r_[starts, len(times)])
+
+    return {
+        "t": ((edges[bucket[starts]] + edges[bucket[starts] + 1]) / 2).tolist(),
+        "min": np.minimum.reduceat(values, starts).tolist(),
+        "max": np.maximum.reduceat(values, starts).tolist(),
+        "mean": (np.add.reduceat(values.astype(np.float64), starts)
+                 / counts[:, None]).tolist(),
+    }
+
+
+def lttb(times, series, points):
+    """
+    Largest-Triangle-Three-Buckets sobre una serie 1D
+
+    Returns:
+        índices de las muestras seleccionadas (points,)
+    """
+    n = len(series)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    selected = np.empty(points, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, points - 1).astype(np.intp)
+
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_lo, next_hi = hi, min(max(edges[min(i + 2, points - 2)], hi + 1), n)
+        avg_t = times[next_lo:next_hi].mean()
+        avg_v = series[next_lo:next_hi].mean()
+
+        area = np.abs((times[a] - avg_t) * (series[lo:hi] - series[a])
+                      - (times[a] - times[lo:hi]) * (avg_v - series[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+class TelemetryStore:
+    """
+    Telemetría de los servos con un ring buffer por canal
+
+    Args:
+        capacity: muestras por canal (p.ej. 50 Hz x 10 min = 30000)
+    """
+
+    def __init__(self, capacity=30000, channels=CHANNELS):
+        self.buffers = {name: RingBuffer(capacity) for name in channels}
+
+    def append(self, timestamp=None, **channels):
+        """Registrar una muestra: append(angles=[...], errors=[...], pwm=[...])"""
+        timestamp = time.time() if timestamp is None else timestamp
+        for name, values in channels.items():
+            self.buffers[name].append(timestamp, values)
+
+    def latest(self):
+        """Última muestra de cada canal, en el formato de /api/telemetry"""
+        sample = {}
+        timestamp = None
+        for name, buffer in self.buffers.items():
+            t, values = buffer.latest()
+            if t is not None:
+                timestamp = max(timestamp or t, t)
+                sample[name] = values.tolist()
+        sample["timestamp"] = timestamp or time.time()
+        return sample
+
+    def query(self, channel, start=None, end=None, points=500,
+              method="minmax"):
+        """
+        Ventana diezmada de un canal
+
+        Args:
+            channel: nombre del canal
+            start, end: rango en segundos epoch (por defecto últimos 60 s)
+            points: número de puntos deseado (ancho de la gráfica)
+            method: 'minmax' o 'lttb'
+        """
+        if channel not in self.buffers:
+            raise KeyError(channel)
+        if method not in METHODS:
+            raise ValueError(f"Método desconocido: {method}")
+        end = time.time() if end is None else end
+        start = end - 60.0 if start is None else start
+        points = max(1, int(points))
+
+        times, values = self.buffers[channel].range(start, end)
+        result = {"channel": channel, "start": start, "end": end,
+                  "method": method, "samples": int(len(times))}
+
+        if len(times) <= points:
+            result.update(t=times.tolist(), values=values.tolist())
+        elif method == "lttb":
+            # Índices por servo; se devuelve una serie (t, v) por servo
+            series = []
+            for i in range(values.shape[1]):
+                idx = lttb(times, values[:, i].astype(np.float64), points)
+                series.append({"t": times[idx].tolist(),
+                               "v": values[idx, i].tolist()})
+            result["series"] = series
+        else:
+            result.update(decimate_minmax(times, values, points, start, end))
+        return result
@@ -2,6 +2,7 @@ const API_URL = 'http://localhost:5000/api';
 let scene, camera, renderer, servos = [];
 let anglesChart, errorChart;
 let servoData = {};
+let servoETag = null;
 
 // Inicializar escena 3D
 function init3DScene() {
@@ -145,7 +146,15 @@ async function initCamera() {
         const cameraStatus = await fetch(`${API_URL}/camera/status`).then(r => r.json());
         
         if (cameraStatus.available) {
-            // Usar WebSocket de Python (implementar según tu servidor)
+            // Usar el relay MJPEG de Python (una sola conexión al ESP32-CAM)
+            if (cameraStatus.mjpeg_url) {
+                const video = document.getElementById('camera-feed');
+                const img = document.createElement('img');
+                img.id = 'camera-feed';
+                img.className = video.className;
+                img.src = cameraStatus.mjpeg_url;
+                video.replaceWith(img);
+            }
             document.getElementById('camera-status').textContent = 'Cámara WebSocket';
             document.getElementById('camera-status').className = 'camera-status camera-active';
         } else {
@@ -223,21 +232,22 @@ async function sendCommand(command) {
             body: JSON.stringify({ command })
         });
         const data = await response.json();
-        updateServoData(data.servos);
+        updateServoData(data.changes);
     } catch (err) {
         console.error('Error al enviar comando:', err);
     }
 }
 
-// Actualizar datos de servos
+// Actualizar datos de servos (estado completo o diff {servoId: {campo: valor}})
 function updateServoData(data) {
-    servoData = data;
-    let totalAngle = 0;
     for (const [servoId, values] of Object.entries(data)) {
-        totalAngle += values.angle;
-        document.getElementById(`${servoId}-angle`).value = values.angle;
-        document.getElementById(`${servoId}-angle-val`).textContent = `${values.angle}°`;
+        servoData[servoId] = { ...servoData[servoId], ...values };
+        if ('angle' in values) {
+            document.getElementById(`${servoId}-angle`).value = values.angle;
+            document.getElementById(`${servoId}-angle-val`).textContent = `${values.angle}°`;
+        }
     }
+    const totalAngle = Object.values(servoData).reduce((sum, s) => sum + s.angle, 0);
     document.getElementById('total-angle').textContent = `${Math.round(totalAngle)}°`;
 }
 
@@ -282,19 +292,23 @@ function initCharts() {
 }
 
 // Actualizar gráficas
+const CHART_SECONDS = 60;
+
 async function updateCharts() {
     try {
-        const telemetry = await fetch(`${API_URL}/telemetry`).then(r => r.json());
-        
-        // Actualizar gráfica de ángulos
-        if (anglesChart.data.labels.length > 20) {
-            anglesChart.data.labels.shift();
-            anglesChart.data.datasets.forEach(ds => ds.data.shift());
-        }
-        
-        anglesChart.data.labels.push(new Date().toLocaleTimeString());
+        // Un punto cada ~4 px del ancho de la gráfica, diezmado en el servidor
+        const points = Math.max(20, Math.floor(anglesChart.width / 4));
+        const [history, telemetry] = await Promise.all([
+            fetch(`${API_URL}/telemetry/range?channel=angles&seconds=${CHART_SECONDS}&points=${points}`)
+                .then(r => r.json()),
+            fetch(`${API_URL}/telemetry`).then(r => r.json())
+        ]);
+
+        // Actualizar gráfica de ángulos (media por intervalo)
+        const values = history.mean || history.values || [];
+        anglesChart.data.labels = history.t.map(t => new Date(t * 1000).toLocaleTimeString());
         anglesChart.data.datasets.forEach((ds, i) => {
-            ds.data.push(telemetry.angles[i]);
+            ds.data = values.map(row => row[i]);
         });
         anglesChart.update('none');
 
@@ -309,8 +323,13 @@ async function updateCharts() {
 // Polling de datos
 async function pollData() {
     try {
-        const data = await fetch(`${API_URL}/servos`).then(r => r.json());
-        updateServoData(data);
+        // 304 si el estado no cambió desde la última respuesta
+        const headers = servoETag ? { 'If-None-Match': servoETag } : {};
+        const response = await fetch(`${API_URL}/servos`, { headers, cache: 'no-store' });
+        if (response.status === 200) {
+            servoETag = response.headers.get('ETag');
+            updateServoData(await response.json());
+        }
         document.getElementById('status-indicator').className = 'status-indicator status-connected';
         document.getElementById('connection-status').textContent = 'Conectado';
     } catch (err) {